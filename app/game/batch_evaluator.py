@@ -0,0 +1,46 @@
+import numpy as np
+from app.game.lookup_evaluator import FLUSH_TABLE, RANK_TABLE, RANK_PRIMES
+
+# the lookup tables of LookupHandEvaluator as arrays, rank table keys are sorted for searchsorted
+_FLUSH_SCORES = np.array(FLUSH_TABLE, dtype=np.int32)
+_RANK_KEYS = np.array(sorted(RANK_TABLE), dtype=np.int64)
+_RANK_SCORES = np.array([RANK_TABLE[key] for key in sorted(RANK_TABLE)], dtype=np.int32)
+_PRIMES = np.array(RANK_PRIMES, dtype=np.int64)
+
+def rank_hands(cards: np.ndarray, chunk_size: int = 1 << 16) -> np.ndarray:
+    """
+    Scores every row of an (n, 5..7) array of Card codes at once,
+    same scores as the showdown evaluator (lookup_evaluator.evaluate_codes) row by row
+    """
+    cards = np.asarray(cards)
+    if cards.ndim != 2 or not 5 <= cards.shape[1] <= 7:
+        raise ValueError("Hands must be an (n, 5..7) array of card codes")
+    if cards.size and (cards.min() < 0 or cards.max() > 51):
+        raise ValueError("Card codes must be between 0 and 51")
+    if (np.diff(np.sort(cards, axis=1), axis=1) == 0).any():
+        raise ValueError("The same card is used twice in a hand")
+
+    scores = np.empty(len(cards), dtype=np.int32)
+    for start in range(0, len(cards), chunk_size):
+        scores[start:start + chunk_size] = _rank_chunk(cards[start:start + chunk_size].astype(np.int64))
+    return scores
+
+def _rank_chunk(cards: np.ndarray) -> np.ndarray:
+    ranks = cards >> 2
+    suits = cards & 3
+
+    products = _PRIMES[ranks].prod(axis=1)
+    scores = _RANK_SCORES[np.searchsorted(_RANK_KEYS, products)]
+
+    # cards per suit packed one byte each, only rows with 5 of a suit need the flush table
+    suit_counts = np.left_shift(1, suits * 8).sum(axis=1)
+    flush_suits = np.full(len(cards), -1)
+    for suit in range(4):
+        flush_suits[((suit_counts >> (suit * 8)) & 0xFF) >= 5] = suit
+    flush_rows = np.nonzero(flush_suits >= 0)[0]
+    if len(flush_rows):
+        # rank bits of one suit never repeat, so summing them is the same as or-ing
+        in_suit = suits[flush_rows] == flush_suits[flush_rows, None]
+        masks = np.where(in_suit, np.left_shift(1, ranks[flush_rows]), 0).sum(axis=1)
+        scores[flush_rows] = _FLUSH_SCORES[masks]
+    return scores
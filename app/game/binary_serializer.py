@@ -0,0 +1,130 @@
+from typing import Any, Callable, Dict, List, Tuple
+import msgpack
+from app.game.game_schema import GamePhase, PlayerAction
+from app.game.models import DECK
+
+# WebSocket subprotocol a client offers to get MessagePack frames, clients that do not offer it get JSON
+BINARY_SUBPROTOCOL = "poker.msgpack"
+
+# pair of functions turning a value of the JSON message into its compact form and back
+Codec = Tuple[Callable[[Any], Any], Callable[[Any], Any]]
+
+def _same(value):
+    return value
+
+def _encode_amount(amount):
+    # whole amounts are packed as ints of 1 to 5 bytes instead of 9 bytes floats
+    whole = int(amount)
+    return whole if whole == amount else amount
+
+_CARD_DICTS: List[dict] = [c.to_dict() for c in DECK]
+_CARD_CODES: Dict[Tuple[str, str], int] = {(c.rank, c.suit): c.code for c in DECK}
+_ACTIONS: List[str] = [a.value for a in PlayerAction]
+_ACTION_CODES: Dict[str, int] = {a: i for i, a in enumerate(_ACTIONS)}
+
+VALUE: Codec = (_same, _same)
+AMOUNT: Codec = (_encode_amount, _same)
+# a card is a single byte, its code
+CARDS: Codec = (lambda cards: bytes([_CARD_CODES[(c["rank"], c["suit"])] for c in cards]),
+                lambda codes: [_CARD_DICTS[code] for code in codes])
+ACTION: Codec = (_ACTION_CODES.__getitem__, _ACTIONS.__getitem__)
+
+def optional(codec: Codec) -> Codec:
+    encode, decode = codec
+    return (lambda value: None if value is None else encode(value),
+            lambda value: None if value is None else decode(value))
+
+def list_of(codec: Codec) -> Codec:
+    encode, decode = codec
+    return (lambda values: [encode(v) for v in values], lambda values: [decode(v) for v in values])
+
+def record(*fields: Tuple[str, Codec]) -> Codec:
+    """
+    Dict with known keys packed as the list of its values
+    """
+    def encode(value: dict) -> list:
+        return [field_encode(value[name]) for name, (field_encode, _) in fields]
+
+    def decode(values: list) -> dict:
+        return {name: field_decode(v) for (name, (_, field_decode)), v in zip(fields, values)}
+    return encode, decode
+
+PLAYER = record(("id", VALUE), ("name", VALUE), ("balance", AMOUNT), ("bet", AMOUNT), ("is_ready", VALUE))
+TURN_REQUEST = record(("player_bet", AMOUNT), ("prev_bet", AMOUNT), ("prev_raise", AMOUNT),
+                      ("options", list_of(ACTION)), ("time_to_act", optional(AMOUNT)),
+                      ("time_bank", optional(AMOUNT)))
+SHOWDOWN_WINNER = record(("winner", PLAYER), ("won_pot", AMOUNT), ("hand", VALUE), ("pocket_cards", CARDS))
+SHOWDOWN_LOSER = record(("player", PLAYER), ("hand", VALUE), ("pocket_cards", CARDS))
+
+# message types by code, new types are only ever appended so codes stay stable
+MESSAGES: List[Tuple[str, Codec]] = [
+    (GamePhase.NEW_PLAYER.value, record(("player", PLAYER))),
+    (GamePhase.PRE_START.value, record(("prev_dealer", PLAYER), ("curr_dealer", PLAYER),
+                                       ("ordered_player_ids", VALUE))),
+    (GamePhase.POCKET_CARDS.value, record(("pocket_cards", CARDS))),
+    (GamePhase.PRE_FLOP_SB.value, record(("sb_amount", AMOUNT), ("player", PLAYER))),
+    (GamePhase.PRE_FLOP_BB.value, record(("bb_amount", AMOUNT), ("player", PLAYER))),
+    (GamePhase.COMMUNITY_CARDS.value, record(("cards", CARDS))),
+    (GamePhase.TURN_REQUEST.value, TURN_REQUEST),
+    (GamePhase.TURN_HIGHLIGHT.value, record(("prev_player", PLAYER), ("curr_player", optional(PLAYER)))),
+    (GamePhase.TURN_RESULT.value, record(("player", PLAYER), ("action", ACTION), ("amount", AMOUNT))),
+    (GamePhase.SHOWDOWN_WINNERS.value, record(("winners", list_of(SHOWDOWN_WINNER)))),
+    (GamePhase.SHOWDOWN_LOSERS.value, record(("losers", list_of(SHOWDOWN_LOSER)))),
+    (GamePhase.POT.value, record(("pot", AMOUNT))),
+    (GamePhase.IS_READY.value, record(("player_id", VALUE), ("is_ready", VALUE))),
+    (GamePhase.PLAY_AGAIN.value, record(("pot", AMOUNT))),
+    (GamePhase.HAND_STRENGTH.value, record(("hand", VALUE))),
+    (GamePhase.TABLE_STATE.value, record(("players", list_of(PLAYER)), ("away_player_ids", VALUE),
+                                         ("folded_player_ids", VALUE), ("is_game_started", VALUE),
+                                         ("pot", AMOUNT), ("cards", CARDS), ("pocket_cards", CARDS),
+                                         ("hand", VALUE), ("dealer_id", VALUE), ("curr_player_id", VALUE),
+                                         ("turn_request", optional(TURN_REQUEST)))),
+    ("LOG", VALUE),
+    ("STATE_FULL", VALUE),
+    ("STATE_DELTA", VALUE),
+    # sent by clients
+    ("TURN_RESPONSE", record(("action", ACTION), ("amount", AMOUNT))),
+    ("STATE_SYNC", VALUE),
+]
+_MESSAGE_CODES: Dict[str, int] = {name: code for code, (name, _) in enumerate(MESSAGES)}
+
+_packer = msgpack.Packer()
+
+def encode_binary_message(json_dict: dict) -> bytes:
+    """
+    Packs a message of the JSON protocol as [type code, compact payload],
+    a type without a code keeps its name and payload as they are
+    """
+    (name, payload), = json_dict.items()
+    code = _MESSAGE_CODES.get(name)
+    if code is None:
+        return _packer.pack([name, payload])
+    return _packer.pack([code, MESSAGES[code][1][0](payload)])
+
+def encode_binary_batch(frames: List[bytes]) -> bytes:
+    """
+    Array of already packed messages, the binary form of a batch of JSON frames
+    """
+    return _packer.pack_array_header(len(frames)) + b"".join(frames)
+
+def _decode_message(message: list) -> dict:
+    code, payload = message
+    if isinstance(code, str):
+        return {code: payload}
+    name, (_, decode) = MESSAGES[code]
+    return {name: decode(payload)}
+
+def decode_binary_frame(frame: bytes) -> List[dict]:
+    """
+    Messages of a binary frame in the shape of the JSON protocol, a frame holds one message or a batch of them.
+    Raises ValueError for any frame that is not one, clients are not trusted to send well-formed ones
+    """
+    try:
+        messages = msgpack.unpackb(frame)
+        if not isinstance(messages, list) or not messages:
+            raise ValueError("not a message or a batch of them")
+        if isinstance(messages[0], list):
+            return [_decode_message(m) for m in messages]
+        return [_decode_message(messages)]
+    except (msgpack.UnpackException, ValueError, LookupError, TypeError) as e:
+        raise ValueError(f"Invalid binary frame: {e}") from e
@@ -12,10 +12,10 @@ class ConcreteGameHandler(AbsGameHandler):
         self.connection_manager = connection_manager
 
     async def broadcast(self, game_phase: GamePhase, abs_game_phase_args: AbsGamePhaseArgs)->None:
-        await self.connection_manager.broadcast({game_phase.value: abs_game_phase_args.dict()})
+        self.connection_manager.broadcast_event(game_phase, abs_game_phase_args)
 
     async def send_personal(self, game_phase: GamePhase, player_id: int, abs_game_phase_args: AbsGamePhaseArgs)->None:
-        await self.connection_manager.send_personal(player_id, {game_phase.value: abs_game_phase_args.dict()})
+        self.connection_manager.send_event(player_id, game_phase, abs_game_phase_args)
 
     async def turn(self, player: Player, turn_request_args: TurnRequestArgs)->TurnResponse:
         """
@@ -1,34 +1,346 @@
 import asyncio
-from typing import Dict
+import enum
+import json
+import logging
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from pydantic.v1 import BaseModel
 from starlette.websockets import WebSocket
+from app.game.binary_serializer import BINARY_SUBPROTOCOL, encode_binary_batch, encode_binary_message
 from app.game.game_schema import TurnResponse, PlayerAction, GamePhase, TurnRequestArgs
+from app.game.game_serializer import encode_args, encode_frame
+from app.game.payload_compression import DEFLATE_SUBPROTOCOL, PayloadCompressor
+from app.game.spectator_feed import SpectatorFeed
+from app.game.table_state import TableStateTracker, STATE_PREFIXES
+from app.game.turn_clock import TableTurnClock
+
+logger = logging.getLogger(__name__)
+
+WS_REPLACED = 4000 # close code of a connection taken over by a newer one of the same client
+
+class SlowConnectionPolicy(enum.Enum):
+    DROP = "DROP" # disconnect the client once its send queue is full
+    FLAG = "FLAG" # keep the client, mark it as slow and skip frames until its queue drains
+
+class ClientConnection:
+    """
+    Subscriber with its own bounded send queue, frames are written by a dedicated task
+    so a slow client never blocks the publisher
+    """
+    def __init__(self, id: int, websocket: WebSocket, max_queue_size: int, subprotocol: Optional[str] = None,
+                 on_caught_up: Optional[Callable[['ClientConnection'], None]] = None):
+        self.id = id
+        self.websocket = websocket
+        self.binary = subprotocol == BINARY_SUBPROTOCOL # frames are MessagePack bytes
+        self.deflate = subprotocol == DEFLATE_SUBPROTOCOL # long JSON frames are sent deflated as bytes
+        self.queue: asyncio.Queue[Union[str, bytes]] = asyncio.Queue(max_queue_size)
+        self.is_slow = False
+        self.is_closed = False
+        self.skipped_frames = 0
+        self.pending_frames: List[Union[str, bytes]] = [] # frames of the current step when events are batched
+        self.wants_deltas = False # gets state deltas instead of the events they replace
+        self.writer_task: Optional[asyncio.Task] = None
+        self.on_caught_up = on_caught_up # called when a slow connection drained its queue
+
+    def start(self):
+        self.writer_task = asyncio.create_task(self._write_loop())
+
+    def stop(self):
+        self.is_closed = True
+        if self.writer_task is not None:
+            self.writer_task.cancel()
+
+    def enqueue(self, frame: Union[str, bytes]) -> bool:
+        if self.is_closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                if isinstance(frame, bytes):
+                    await self.websocket.send_bytes(frame)
+                else:
+                    await self.websocket.send_text(frame)
+                if self.is_slow and self.queue.empty():
+                    # caught up with the table, but frames were skipped on the way
+                    self.is_slow = False
+                    if self.on_caught_up is not None:
+                        self.on_caught_up(self)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"Connection {self.id} is dead: {e}")
+            self.is_closed = True
 
 class ConnectionManager:
     """
     Manages WebSocket connections and turn requests for players in a game
     Similar to Observer pattern, but with concrete subscribers (WebSockets)
     """
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+    def __init__(self, max_queue_size: int = 256, slow_policy: SlowConnectionPolicy = SlowConnectionPolicy.DROP,
+                 batch_events: bool = False, turn_clock: Optional[TableTurnClock] = None,
+                 reconnect_grace: float = 0, spectator_feed: Optional[SpectatorFeed] = None,
+                 state_tracker: Optional[TableStateTracker] = None,
+                 compressor: Optional[PayloadCompressor] = None,
+                 table_state: Optional[Callable[[int], BaseModel]] = None):
+        if reconnect_grace < 0:
+            raise ValueError("Reconnect grace cannot be negative")
+        self.active_connections: Dict[int, ClientConnection] = {}
         self.pending_turns: Dict[int, asyncio.Future[TurnResponse]] = {}
+        self.turn_requests: Dict[int, TurnRequestArgs] = {} # pending requests, sent again to a reconnecting player
+        self.max_queue_size = max_queue_size
+        self.slow_policy = slow_policy
+        self.batch_events = batch_events
+        self.turn_clock = turn_clock # without a clock turns wait for the player indefinitely
+        self.reconnect_grace = reconnect_grace # seconds a dropped player keeps the seat and a pending turn
+        self.away: Dict[int, asyncio.TimerHandle] = {}
+        self.spectator_feed = spectator_feed # spectators are not connections of the manager, they read the feed
+        self.state_tracker = state_tracker
+        self.compressor = compressor # without one connections cannot negotiate compression
+        self.table_state = table_state # TABLE_STATE args of a player, sent again to a slow one that caught up
+        self.delta_ids: Set[int] = set() # connections that subscribed to the state deltas
+        self._delta_scheduled = False
+        self._batched_connections: Set[ClientConnection] = set()
 
-    async def connect(self, websocket: WebSocket, id):
-        await websocket.accept()
-        self.active_connections[id] = websocket
+    @property
+    def subprotocols(self) -> List[str]:
+        if self.compressor is None:
+            return [BINARY_SUBPROTOCOL]
+        return [BINARY_SUBPROTOCOL, DEFLATE_SUBPROTOCOL]
+
+    async def connect(self, websocket: WebSocket, id, subprotocol: Optional[str] = None):
+        if subprotocol is not None and subprotocol not in self.subprotocols:
+            raise ValueError(f"Unsupported subprotocol {subprotocol}")
+        if subprotocol is None:
+            await websocket.accept()
+        else:
+            await websocket.accept(subprotocol=subprotocol)
+        connection = ClientConnection(id, websocket, self.max_queue_size, subprotocol, self._resync)
+        connection.start()
+        replaced = self.active_connections.get(id)
+        self.active_connections[id] = connection
+        self.delta_ids.discard(id) # a new connection subscribes again
+        if replaced is not None:
+            # the client opened a new connection before the old one was noticed as dead
+            replaced.stop()
+            asyncio.create_task(self._close(replaced, WS_REPLACED))
+
+    async def reconnect(self, websocket: WebSocket, id, subprotocol: Optional[str] = None):
+        """
+        Connects a player who is away, the seat and a pending turn are theirs again
+        """
+        away = self.away.pop(id, None)
+        if away is not None:
+            away.cancel()
+        await self.connect(websocket, id, subprotocol)
+
+    def is_replaced(self, id, websocket: WebSocket) -> bool:
+        connection = self.active_connections.get(id)
+        return connection is not None and connection.websocket is not websocket
+
+    def hold_seat(self, id, on_expire: Callable[[], None], grace: Optional[float] = None):
+        """
+        Connection is gone, but the player keeps the seat and a pending turn until reconnecting,
+        after the grace the pending turn is folded and on_expire is called
+        """
+        connection = self.active_connections.pop(id, None)
+        if connection is not None:
+            connection.stop()
+        self.delta_ids.discard(id)
+        away = self.away.pop(id, None)
+        if away is not None:
+            away.cancel()
+        grace = self.reconnect_grace if grace is None else grace
+        self.away[id] = asyncio.get_running_loop().call_later(grace, self._expire_away, id, on_expire)
+
+    def _expire_away(self, id, on_expire: Callable[[], None]):
+        self.away.pop(id, None)
+        self.disconnect(id)
+        on_expire()
+
+    def pending_turn_request(self, id) -> Optional[TurnRequestArgs]:
+        """
+        Turn request the player has not answered yet, with the time they have left
+        """
+        turn_request_args = self.turn_requests.get(id)
+        if turn_request_args is None or self.turn_clock is None:
+            return turn_request_args
+        time_left = self.turn_clock.time_left(id)
+        if time_left is None:
+            return turn_request_args
+        return turn_request_args.copy(update={"time_to_act": time_left[0], "time_bank": time_left[1]})
 
     def disconnect(self, id):
+        away = self.away.pop(id, None)
+        if away is not None:
+            away.cancel()
         if id in self.pending_turns:
             if not self.pending_turns[id].done():
                 self.pending_turns[id].set_result(TurnResponse(action=PlayerAction.FOLD, amount=0))
             del self.pending_turns[id]
-        self.active_connections.pop(id)
+        connection = self.active_connections.pop(id, None)
+        if connection is not None:
+            connection.stop()
+        self.delta_ids.discard(id)
 
     async def send_personal(self, id, json_dict: dict):
-        await self.active_connections[id].send_json(json_dict)
+        self.send_message(id, json_dict)
 
     async def broadcast(self, json_dict: dict):
-        for connection in self.active_connections.values():
-            await connection.send_json(json_dict)
+        self.broadcast_frame(encode_frame(json_dict), json_dict)
+
+    def send_event(self, id, game_phase: GamePhase, args: BaseModel):
+        self.send_message(id, {game_phase.value: encode_args(args)})
+
+    def broadcast_event(self, game_phase: GamePhase, args: BaseModel):
+        message = {game_phase.value: encode_args(args)}
+        self.broadcast_frame(encode_frame(message), message)
+
+    def send_message(self, id, json_dict: dict):
+        """
+        Encodes the message only in the wire format of the receiving connection
+        """
+        connection = self.active_connections.get(id)
+        if connection is not None:
+            self._send(connection, encode_binary_message(json_dict) if connection.binary else encode_frame(json_dict))
+
+    def send_frame(self, id, frame: str):
+        connection = self.active_connections.get(id)
+        if connection is not None:
+            self._send(connection, encode_binary_message(json.loads(frame)) if connection.binary else frame)
+
+    def broadcast_frame(self, frame: str, message: Optional[dict] = None):
+        """
+        Frame is encoded once by the caller and queued for every subscriber without waiting for any of them.
+        Binary subscribers share one packing of the message, parsed back from the frame when not given
+        """
+        is_state_frame = bool(self.delta_ids) and frame.startswith(STATE_PREFIXES)
+        binary_frame = None
+        for connection in list(self.active_connections.values()):
+            if is_state_frame and connection.wants_deltas:
+                continue
+            if connection.binary:
+                if binary_frame is None:
+                    binary_frame = encode_binary_message(json.loads(frame) if message is None else message)
+                self._send(connection, binary_frame)
+            else:
+                self._send(connection, frame)
+        # every public event may change the state, the events of one step make a single delta
+        if self.delta_ids and not self._delta_scheduled:
+            self._delta_scheduled = True
+            asyncio.get_running_loop().call_soon(self.broadcast_delta)
+        if self.spectator_feed is not None:
+            self.spectator_feed.publish(frame)
+
+    def subscribe_deltas(self, id, version: Optional[int] = None):
+        """
+        The connection gets state deltas from now on, starting with what it needs to catch up from its version.
+        Also answers a client that noticed a gap in the versions it received
+        """
+        connection = self.active_connections.get(id)
+        if connection is None or self.state_tracker is None:
+            return
+        if self.delta_ids:
+            # the other subscribers get the pending change first so all of them stay on the same version
+            self.broadcast_delta()
+        else:
+            # the tracker is idle without subscribers, the first one starts from the current state
+            self.state_tracker.update()
+        connection.wants_deltas = True
+        self.delta_ids.add(id)
+        for frame in self.state_tracker.sync(version):
+            self._send(connection, encode_binary_message(json.loads(frame)) if connection.binary else frame)
+
+    def broadcast_delta(self):
+        self._delta_scheduled = False
+        if not self.delta_ids:
+            return
+        frame = self.state_tracker.update()
+        if frame is None:
+            return
+        binary_frame = None
+        for id in list(self.delta_ids):
+            connection = self.active_connections.get(id)
+            if connection is None:
+                continue
+            if connection.binary:
+                if binary_frame is None:
+                    binary_frame = encode_binary_message(json.loads(frame))
+                self._send(connection, binary_frame)
+            else:
+                self._send(connection, frame)
+
+    def _send(self, connection: ClientConnection, frame: Union[str, bytes]):
+        if not self.batch_events:
+            self._enqueue(connection, frame)
+            return
+        # frames emitted before the game yields to the event loop are flushed together
+        if not self._batched_connections:
+            asyncio.get_running_loop().call_soon(self.flush_batches)
+        connection.pending_frames.append(frame)
+        self._batched_connections.add(connection)
+
+    def flush_batches(self):
+        """
+        Sends every connection's pending frames as a single JSON array frame, or MessagePack array for binary ones
+        """
+        connections, self._batched_connections = self._batched_connections, set()
+        # connections that got the same frames share one batch, so a broadcast is packed and compressed once
+        groups: Dict[tuple, Tuple[list, List[ClientConnection]]] = {}
+        for connection in connections:
+            frames, connection.pending_frames = connection.pending_frames, []
+            if self.active_connections.get(connection.id) is not connection:
+                continue # closed, or replaced by a newer connection of the client
+            key = (connection.binary, *map(id, frames))
+            if key not in groups:
+                groups[key] = (frames, [])
+            groups[key][1].append(connection)
+        for frames, group in groups.values():
+            if len(frames) == 1:
+                batch = frames[0]
+            elif group[0].binary:
+                batch = encode_binary_batch(frames)
+            else:
+                batch = "[" + ",".join(frames) + "]"
+            for connection in group:
+                self._enqueue(connection, batch)
+
+    def _enqueue(self, connection: ClientConnection, frame: Union[str, bytes]):
+        if connection.deflate:
+            frame = self.compressor.compress(frame)
+        if connection.enqueue(frame):
+            return
+        if connection.is_closed or self.slow_policy == SlowConnectionPolicy.DROP:
+            logger.warning(f"Dropping slow or dead connection {connection.id}")
+            # a newer connection of the same client keeps its seat and pending turn
+            if self.active_connections.get(connection.id) is connection:
+                self.disconnect(connection.id)
+            asyncio.create_task(self._close(connection))
+        else:
+            connection.is_slow = True
+            connection.skipped_frames += 1
+
+    def _resync(self, connection: ClientConnection):
+        """
+        A flagged connection skipped frames while it was slow, it gets the whole table again
+        """
+        if self.active_connections.get(connection.id) is not connection:
+            return
+        if connection.wants_deltas:
+            self.subscribe_deltas(connection.id)
+        if self.table_state is not None:
+            self.send_event(connection.id, GamePhase.TABLE_STATE, self.table_state(connection.id))
+
+    async def _close(self, connection: ClientConnection, code: int = 1000):
+        try:
+            await connection.websocket.close(code)
+        except Exception:
+            pass
 
     async def log(self, msg):
         await self.broadcast({"LOG": msg})
@@ -37,11 +349,16 @@ class ConnectionManager:
         """
         Sends a turn request to a player and waits for their response
         """
-        if player_id not in self.active_connections:
+        if player_id not in self.active_connections and player_id not in self.away:
             return TurnResponse(action=PlayerAction.FOLD, amount=0)
 
-        await self.send_personal(player_id, {
-            GamePhase.TURN_REQUEST.value: turn_request_args.dict()})
+        if self.turn_clock is not None:
+            turn_request_args = turn_request_args.copy(update={
+                "time_to_act": self.turn_clock.action_timeout,
+                "time_bank": self.turn_clock.time_bank_of(player_id)})
+        # an away player gets the request with the table state when reconnecting
+        self.turn_requests[player_id] = turn_request_args
+        self.send_event(player_id, GamePhase.TURN_REQUEST, turn_request_args)
 
         # Wait for the player's response
         try:
@@ -49,10 +366,24 @@ class ConnectionManager:
             if player_id not in self.pending_turns or self.pending_turns[player_id].done():
                 self.pending_turns[player_id] = asyncio.Future()
 
+            if self.turn_clock is not None:
+                self.turn_clock.start_turn(player_id, lambda: self._expire_turn(player_id, turn_request_args))
             result = await self.pending_turns[player_id]
             return result
         except asyncio.CancelledError:
             return TurnResponse(action=PlayerAction.FOLD, amount=0)
+        finally:
+            self.turn_requests.pop(player_id, None)
+            if self.turn_clock is not None:
+                self.turn_clock.stop_turn(player_id)
+
+    def _expire_turn(self, player_id: int, turn_request_args: TurnRequestArgs):
+        """
+        Auto-checks when checking is allowed, otherwise auto-folds
+        """
+        action = PlayerAction.CHECK if PlayerAction.CHECK in turn_request_args.options else PlayerAction.FOLD
+        logger.info(f"Turn of player {player_id} timed out, auto {action.value}")
+        self.process_turn_response(player_id, TurnResponse(action=action, amount=0))
 
     def process_turn_response(self, player_id: int, turn_response: TurnResponse):
         """
@@ -60,4 +391,4 @@ class ConnectionManager:
         """
         if player_id in self.pending_turns and not self.pending_turns[player_id].done():
             turn_result = TurnResponse(action=turn_response.action, amount=turn_response.amount)
-            self.pending_turns[player_id].set_result(turn_result)
\ No newline at end of file
+            self.pending_turns[player_id].set_result(turn_result)
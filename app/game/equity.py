@@ -0,0 +1,262 @@
+import asyncio
+import math
+import os
+import random
+from abc import ABC, abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import combinations
+from typing import List, Optional, Sequence, Tuple
+from app.game.game_schema import EquityResult
+from app.game.lookup_evaluator import FLUSH_TABLE, RANK_TABLE, RANK_PRIMES
+from app.game.models import Card
+
+# (suit of 1st card, rank bit of 1st card, suit of 2nd card, rank bit of 2nd card, product of rank primes)
+PreparedPocket = Tuple[int, int, int, int, int]
+
+def prepare_pockets(pockets_codes: Sequence[Sequence[int]]) -> List[PreparedPocket]:
+    prepared = []
+    for c1, c2 in pockets_codes:
+        prepared.append((c1 & 3, 1 << (c1 >> 2), c2 & 3, 1 << (c2 >> 2),
+                         RANK_PRIMES[c1 >> 2] * RANK_PRIMES[c2 >> 2]))
+    return prepared
+
+def score_runout(board_codes: Sequence[int], pockets: List[PreparedPocket]) -> List[int]:
+    """
+    Scores every pocket against a complete 5 card board, the board is only processed once
+    """
+    suit_masks = [0, 0, 0, 0]
+    suit_counts = [0, 0, 0, 0]
+    product = 1
+    for code in board_codes:
+        suit_masks[code & 3] |= 1 << (code >> 2)
+        suit_counts[code & 3] += 1
+        product *= RANK_PRIMES[code >> 2]
+
+    # a flush needs at least 3 board cards of one suit and only one suit can have them
+    flush_suit = -1
+    for suit in range(4):
+        if suit_counts[suit] >= 3:
+            flush_suit = suit
+
+    scores = []
+    for suit_1, bit_1, suit_2, bit_2, pocket_product in pockets:
+        score = 0
+        if flush_suit >= 0:
+            mask = suit_masks[flush_suit]
+            if suit_1 == flush_suit:
+                mask |= bit_1
+            if suit_2 == flush_suit:
+                mask |= bit_2
+            score = FLUSH_TABLE[mask]
+        if not score:
+            score = RANK_TABLE[product * pocket_product]
+        scores.append(score)
+    return scores
+
+class EquityTally:
+    """
+    Accumulates wins, ties and equity shares over scored runouts
+    """
+    def __init__(self, players_count: int):
+        self.samples = 0
+        self.wins = [0] * players_count
+        self.ties = [0] * players_count
+        self.shares = [0.0] * players_count
+        self.share_squares = [0.0] * players_count
+
+    def add(self, scores: List[int]):
+        self.samples += 1
+        best = max(scores)
+        winners = [i for i, s in enumerate(scores) if s == best]
+        if len(winners) == 1:
+            self.wins[winners[0]] += 1
+            self.shares[winners[0]] += 1
+            self.share_squares[winners[0]] += 1
+            return
+        share = 1 / len(winners)
+        for i in winners:
+            self.ties[i] += 1
+            self.shares[i] += share
+            self.share_squares[i] += share * share
+
+    def merge(self, other: 'EquityTally'):
+        self.samples += other.samples
+        for i in range(len(self.wins)):
+            self.wins[i] += other.wins[i]
+            self.ties[i] += other.ties[i]
+            self.shares[i] += other.shares[i]
+            self.share_squares[i] += other.share_squares[i]
+
+    def margin(self, z: float) -> float:
+        """
+        Widest confidence interval half-width over all players' equities
+        """
+        if self.samples < 2:
+            return math.inf
+        widest = 0.0
+        for shares, squares in zip(self.shares, self.share_squares):
+            mean = shares / self.samples
+            variance = max(squares / self.samples - mean * mean, 0.0)
+            widest = max(widest, z * math.sqrt(variance / self.samples))
+        return widest
+
+    def to_result(self, margin: float = 0) -> EquityResult:
+        return EquityResult(
+            wins=[w / self.samples for w in self.wins],
+            ties=[t / self.samples for t in self.ties],
+            equities=[s / self.samples for s in self.shares],
+            samples=self.samples,
+            margin=margin)
+
+def tally_runouts(pockets_codes: List[List[int]], board_codes: List[int],
+                  runouts: List[Tuple[int, ...]]) -> EquityTally:
+    """
+    Scores a chunk of runouts, module level so it can be sent to worker processes
+    """
+    pockets = prepare_pockets(pockets_codes)
+    tally = EquityTally(len(pockets))
+    for runout in runouts:
+        tally.add(score_runout(board_codes + list(runout), pockets))
+    return tally
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Process pool shared by all exhaustive calculations, created on first use
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _process_pool
+
+class AbsEquityCalculator(ABC):
+    """
+    Strategy pattern for estimating players' chances to win the pot
+    """
+    def calculate(self, pockets: List[List[Card]], board: List[Card] = None,
+                  dead: List[Card] = None) -> EquityResult:
+        return self._calculate(*self._prepare(pockets, board, dead))
+
+    async def calculate_async(self, pockets: List[List[Card]], board: List[Card] = None,
+                              dead: List[Card] = None) -> EquityResult:
+        """
+        Runs the calculation off the event loop thread
+        """
+        return await asyncio.to_thread(self.calculate, pockets, board, dead)
+
+    def _prepare(self, pockets: List[List[Card]], board: Optional[List[Card]],
+                 dead: Optional[List[Card]]) -> Tuple[List[List[int]], List[int], List[int]]:
+        board = board or []
+        dead = dead or []
+        if len(pockets) < 2:
+            raise ValueError("Equity needs at least two players")
+        if any(len(pocket) != 2 for pocket in pockets):
+            raise ValueError("Every player must hold two pocket cards")
+        if len(board) > 5:
+            raise ValueError("Board cannot have more than 5 cards")
+
+        pockets_codes = [[c.code for c in pocket] for pocket in pockets]
+        board_codes = [c.code for c in board]
+        used = [code for pocket in pockets_codes for code in pocket] + board_codes + [c.code for c in dead]
+        if len(set(used)) != len(used):
+            raise ValueError("The same card is used twice")
+
+        used = set(used)
+        deck_codes = [code for code in range(52) if code not in used]
+        if len(deck_codes) < 5 - len(board_codes):
+            raise ValueError("Not enough cards left to complete the board")
+        return pockets_codes, board_codes, deck_codes
+
+    @abstractmethod
+    def _calculate(self, pockets_codes: List[List[int]], board_codes: List[int],
+                   deck_codes: List[int]) -> EquityResult:
+        pass
+
+class MonteCarloEquityCalculator(AbsEquityCalculator):
+    """
+    Samples random runouts, stops early once every player's equity is known within the margin
+    """
+    def __init__(self, samples: int = 20000, seed: Optional[int] = None, margin: float = 0.01,
+                 z: float = 1.96, batch_size: int = 500):
+        if samples <= 0:
+            raise ValueError("Samples count must be positive")
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+        self.samples = samples
+        self.seed = seed
+        self.margin = margin
+        self.z = z
+        self.batch_size = batch_size
+
+    def _calculate(self, pockets_codes: List[List[int]], board_codes: List[int],
+                   deck_codes: List[int]) -> EquityResult:
+        rng = random.Random(self.seed)
+        pockets = prepare_pockets(pockets_codes)
+        tally = EquityTally(len(pockets))
+        missing = 5 - len(board_codes)
+
+        if missing == 0:
+            tally.add(score_runout(board_codes, pockets))
+            return tally.to_result()
+
+        deck = list(deck_codes)
+        deck_size = len(deck)
+        rand = rng.random
+        while tally.samples < self.samples:
+            for _ in range(min(self.batch_size, self.samples - tally.samples)):
+                # partial Fisher-Yates shuffle, only the missing board cards are drawn
+                for i in range(missing):
+                    j = i + int(rand() * (deck_size - i))
+                    deck[i], deck[j] = deck[j], deck[i]
+                tally.add(score_runout(board_codes + deck[:missing], pockets))
+            margin = tally.margin(self.z)
+            if margin <= self.margin:
+                return tally.to_result(margin)
+        return tally.to_result(tally.margin(self.z))
+
+class ExhaustiveEquityCalculator(AbsEquityCalculator):
+    """
+    Enumerates every remaining runout from the flop on, chunks of runouts are scored in worker processes
+    """
+    def __init__(self, executor: Optional[Executor] = None, chunk_size: int = 250):
+        if chunk_size <= 0:
+            raise ValueError("Chunk size must be positive")
+        self.executor = executor
+        self.chunk_size = chunk_size
+
+    def _chunks(self, board_codes: List[int], deck_codes: List[int]) -> List[List[Tuple[int, ...]]]:
+        if len(board_codes) < 3:
+            raise ValueError("Exhaustive equity needs at least the flop")
+        runouts = list(combinations(deck_codes, 5 - len(board_codes)))
+        return [runouts[i:i + self.chunk_size] for i in range(0, len(runouts), self.chunk_size)]
+
+    def _calculate(self, pockets_codes: List[List[int]], board_codes: List[int],
+                   deck_codes: List[int]) -> EquityResult:
+        chunks = self._chunks(board_codes, deck_codes)
+        if len(chunks) == 1:
+            return tally_runouts(pockets_codes, board_codes, chunks[0]).to_result()
+
+        executor = self.executor or get_process_pool()
+        futures = [executor.submit(tally_runouts, pockets_codes, board_codes, chunk) for chunk in chunks]
+        tally = EquityTally(len(pockets_codes))
+        for future in futures:
+            tally.merge(future.result())
+        return tally.to_result()
+
+    async def calculate_async(self, pockets: List[List[Card]], board: List[Card] = None,
+                              dead: List[Card] = None) -> EquityResult:
+        """
+        Awaits the worker processes without blocking the event loop, a single chunk is scored by a worker too
+        """
+        pockets_codes, board_codes, deck_codes = self._prepare(pockets, board, dead)
+        chunks = self._chunks(board_codes, deck_codes)
+        loop = asyncio.get_running_loop()
+        executor = self.executor or get_process_pool()
+        tallies = await asyncio.gather(*[
+            loop.run_in_executor(executor, tally_runouts, pockets_codes, board_codes, chunk)
+            for chunk in chunks])
+        tally = EquityTally(len(pockets_codes))
+        for chunk_tally in tallies:
+            tally.merge(chunk_tally)
+        return tally.to_result()
@@ -1,9 +1,18 @@
+import random
+from typing import TYPE_CHECKING
 from abc import abstractmethod
 from app.game.game_schema import *
-from app.game.game_states import PreFlopState, AbsGameState
+from app.game.game_states import PreFlopState, AbsGameState, BettingRound
+from app.game.hand_history import HandHistoryWriter, HandRecord
+from app.game.lookup_evaluator import IncrementalHandEvaluator
 from app.game.models import Player
+from app.game.pot_ledger import PotLedger
+from app.game.seat_map import SeatMap
 from app.game.table import Table
 
+if TYPE_CHECKING:
+    from app.game.game_snapshot import GameSnapshotter
+
 class AbsGameHandler(ABC):
     """
     Implementation for Bridge pattern between game and game handler
@@ -48,6 +57,14 @@ class AbsGameBuilder(ABC):
     def set_min_raise_amount(self, min_raise: float)->None:
         pass
 
+    @abstractmethod
+    def set_hand_history(self, hand_history: HandHistoryWriter, table_id: str)->None:
+        pass
+
+    @abstractmethod
+    def set_snapshotter(self, snapshotter: 'GameSnapshotter')->None:
+        pass
+
     @abstractmethod
     def get_built_game(self)->'Game':
         pass
@@ -65,8 +82,7 @@ class ConcreteGameBuilder(AbsGameBuilder):
 
     def set_table(self, table: Table) -> None:
         self._game.table = table
-        self._game.players = table.players
-        self._game.folded = []
+        self._game.seats = SeatMap(table.players)
 
     def set_small_blind_amount(self, sb_amount: float) -> None:
         if sb_amount <= 0:
@@ -85,6 +101,13 @@ class ConcreteGameBuilder(AbsGameBuilder):
             raise ValueError("Minimum raise amount must be positive")
         self._game.min_raise = min_raise
 
+    def set_hand_history(self, hand_history: HandHistoryWriter, table_id: str) -> None:
+        self._game.hand_history = hand_history
+        self._game.table_id = table_id
+
+    def set_snapshotter(self, snapshotter: 'GameSnapshotter') -> None:
+        self._game.snapshotter = snapshotter
+
     def get_built_game(self) -> 'Game':
         return self._game
 
@@ -99,29 +122,74 @@ class Game:
         self.curr_dealer_pos: int = -1
         self.prev_dealer_pos: int = 0
         self.pot: float = 0
+        self.pot_ledger: PotLedger = PotLedger()
         self.sb_amount: float = 0
         self.bb_amount: float = 0
         self.min_raise: float = 0
-        self.players: List[Player] = []
-        self.folded: List[Player] = []
+        self.seats: SeatMap = SeatMap() # seats of the hand in play, kept for players who leave during it
         self.sb_pos: int = -1
         self.bb_pos: int = -1
         self.is_game_started: bool = False
         self.game_state: AbsGameState = None
+        self.hand_evaluators: Dict[int, IncrementalHandEvaluator] = {}
+        self.table_id: str = ""
+        self.hand_history: Optional[HandHistoryWriter] = None
+        self.hand_record: Optional[HandRecord] = None # hand being played, only when history is kept
+        self.deck_seed: Optional[int] = None # seed of the current hand's deck, replays deal the same cards
+        self.betting_round: Optional[BettingRound] = None
+        self.last_action: Optional[Tuple[int, PlayerAction]] = None # player id and action of the latest turn
+        self.snapshotter: Optional['GameSnapshotter'] = None
 
     def set_game_state(self, game_state: AbsGameState):
         self.game_state = game_state
 
-    async def start_game(self):
+    @property
+    def players(self) -> List[Player]:
+        return self.seats.players
+
+    def put_in_pot(self, player: Player, amount: float) -> float:
+        """
+        Moves chips from the player's balance to the pot, a player who cannot cover the amount goes all-in
+        """
+        amount = max(0, min(amount, player.balance))
+        player.balance -= amount
+        player.bet += amount
+        self.pot += amount
+        self.pot_ledger.add(player.id, amount)
+        if player.balance <= 0:
+            self.seats.set_all_in(self.seats.seat_of(player.id))
+        return amount
+
+    def save_snapshot(self):
+        if self.snapshotter is not None:
+            self.snapshotter.save(self.table, self)
+
+    async def start_game(self, deck_seed: Optional[int] = None):
+        if sum(1 for p in self.table.players if p.balance > 0) < 2:
+            raise ValueError("At least 2 players with chips are needed to start a hand")
         self.is_game_started = True
-        self.players = self.table.players
-        self.prev_dealer_pos = self.curr_dealer_pos
-        self.curr_dealer_pos = (self.curr_dealer_pos + 1) % len(self.players)
+        for player in self.table.players:
+            player.bet = 0
+        prev_dealer = self.players[self.curr_dealer_pos] if 0 <= self.curr_dealer_pos < len(self.players) else None
+        dealer = self._next_dealer(prev_dealer)
+        # busted players sit out the hand, they are not dealt in and do not take the button or the blinds
+        self.seats = SeatMap(p for p in self.table.players if p.balance > 0)
+        self.curr_dealer_pos = self.seats.seat_of(dealer.id)
+        if prev_dealer is not None and prev_dealer.id in self.seats:
+            self.prev_dealer_pos = self.seats.seat_of(prev_dealer.id)
+        else:
+            self.prev_dealer_pos = (self.curr_dealer_pos - 1) % len(self.players)
         self.pot = 0
-        self.folded = []
+        self.pot_ledger = PotLedger()
+        self.last_action = None
+        self.hand_evaluators = {}
         self.table.community_cards = []
-        self.table.reset_deck()
+        self.deck_seed = random.getrandbits(63) if deck_seed is None else deck_seed
+        self.table.reset_deck(self.deck_seed)
         ordered_ids = [p.id for p in self.players]
+        if self.hand_history is not None:
+            self.hand_record = HandRecord.start(self.table_id, self.curr_dealer_pos, self.sb_amount, self.bb_amount,
+                                                self.players, self.deck_seed)
 
         await self.game_handler.broadcast(GamePhase.PRE_START, PreStartArgs(
             prev_dealer=self.players[self.prev_dealer_pos],
@@ -130,7 +198,39 @@ class Game:
 
         self.set_game_state(PreFlopState(self))
         await self.game_state.start_flow()
+        self.record_hand()
+        await self.reset_players_ready()
+        self.save_snapshot()
+
+    def _next_dealer(self, prev_dealer: Optional[Player]) -> Player:
+        """
+        First player with chips after the previous dealer in table order,
+        after the previous dealer's seat number when that player left the table
+        """
+        players = self.table.players
+        if prev_dealer is not None and prev_dealer.id in self.table.seats:
+            start = self.table.seats.seat_of(prev_dealer.id) + 1
+        else:
+            start = self.curr_dealer_pos + 1
+        seats = ((start + i) % len(players) for i in range(len(players)))
+        return next(players[seat] for seat in seats if players[seat].balance > 0)
+
+    async def resume_game(self):
+        """
+        Finishes a hand restored from a snapshot, the restored state continues its betting round
+        """
+        self.is_game_started = True
+        await self.game_state.resume_flow()
+        self.record_hand()
         await self.reset_players_ready()
+        self.save_snapshot()
+
+    def record_hand(self):
+        if self.hand_record is None:
+            return
+        self.hand_record.board = [c.code for c in self.table.community_cards]
+        self.hand_history.append(self.hand_record)
+        self.hand_record = None
 
     async def reset_players_ready(self):
         for player in self.table.players:
@@ -22,6 +22,8 @@ class GamePhase(enum.Enum):
     POT = "POT"
     IS_READY = "IS_READY"
     PLAY_AGAIN = "PLAY_AGAIN"
+    HAND_STRENGTH = "HAND_STRENGTH"
+    TABLE_STATE = "TABLE_STATE"
 
 class PlayerAction(enum.Enum):
     CALL = "CALL"
@@ -113,6 +115,27 @@ class TurnRequestArgs(AbsGamePhaseArgs):
     prev_bet: float
     prev_raise: float
     options: List[PlayerAction]
+    time_to_act: Optional[float] = None # seconds before the time bank is used, None without a turn clock
+    time_bank: Optional[float] = None
+
+class HandStrengthArgs(AbsGamePhaseArgs):
+    hand: HandValue
+
+class TableStateArgs(AbsGamePhaseArgs):
+    """
+    Everything a reconnecting player needs to redraw the table, sent instead of the events they missed
+    """
+    players: List[Player]
+    away_player_ids: List[int]
+    folded_player_ids: List[int]
+    is_game_started: bool
+    pot: float
+    cards: List[Card]
+    pocket_cards: List[Card]
+    hand: Optional[HandValue] = None
+    dealer_id: Optional[int] = None
+    curr_player_id: Optional[int] = None
+    turn_request: Optional[TurnRequestArgs] = None # the player's own pending turn
 
 class ShowdownWinnerArgs(AbsGamePhaseArgs):
     winner: Player
@@ -136,6 +159,7 @@ class EvaluatedHand(ArbitraryType):
     highest_in_hand_value: int
     highest_in_hand_value_2: Optional[int] = None
     kicker_value: int
+    score: Optional[int] = None
 
     def __gt__(self, other)->Optional[bool]:
         """
@@ -144,6 +168,12 @@ class EvaluatedHand(ArbitraryType):
         if not isinstance(other, EvaluatedHand):
             return False
 
+        # hands scored by the lookup evaluator are compared by a single number
+        if self.score is not None and other.score is not None:
+            if self.score == other.score:
+                return None
+            return self.score > other.score
+
         if self.hand_value.value > other.hand_value.value:
             return True
         elif self.hand_value.value < other.hand_value.value:
@@ -175,6 +205,8 @@ class EvaluatedHand(ArbitraryType):
     def __eq__(self, other):
         if not isinstance(other, EvaluatedHand):
             return False
+        if self.score is not None and other.score is not None:
+            return self.score == other.score
         return self.hand_value == other.hand_value and \
                self.highest_in_hand_value == other.highest_in_hand_value and \
                self.highest_in_hand_value_2 == other.highest_in_hand_value_2 and \
@@ -184,6 +216,16 @@ class EvaluatedHands(ArbitraryType):
     players_hands: Dict[Player, EvaluatedHand]
     leading_hands: List[Tuple[Player, EvaluatedHand]]
 
+class EquityResult(BaseModel):
+    """
+    Share of runouts each player wins outright, ties and the equity (wins plus split shares), in player order
+    """
+    wins: List[float]
+    ties: List[float]
+    equities: List[float]
+    samples: int
+    margin: float = 0
+
 class TurnResponse(BaseModel):
     action: PlayerAction
     amount: float
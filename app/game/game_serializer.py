@@ -0,0 +1,79 @@
+import json
+from typing import Callable, Dict, List, Type
+from pydantic.v1 import BaseModel
+from app.game.game_schema import *
+from app.game.models import Player, Card, DECK
+
+# wire form of every card is built once, cards never change
+_CARD_DICTS: List[dict] = [c.to_dict() for c in DECK]
+
+def encode_player(player: Player) -> dict:
+    return player.to_dict()
+
+def encode_card(card: Card) -> dict:
+    return _CARD_DICTS[card.code]
+
+def encode_cards(cards: List[Card]) -> List[dict]:
+    return [_CARD_DICTS[c.code] for c in cards]
+
+def _encode_showdown_winner(args: ShowdownWinnerArgs) -> dict:
+    return {"winner": encode_player(args.winner), "won_pot": args.won_pot,
+            "hand": args.hand.value, "pocket_cards": encode_cards(args.pocket_cards)}
+
+def _encode_showdown_loser(args: ShowdownLoserArgs) -> dict:
+    return {"player": encode_player(args.player), "hand": args.hand.value,
+            "pocket_cards": encode_cards(args.pocket_cards)}
+
+def _encode_turn_request(args: TurnRequestArgs) -> dict:
+    return {"player_bet": args.player_bet, "prev_bet": args.prev_bet, "prev_raise": args.prev_raise,
+            "options": [o.value for o in args.options], "time_to_act": args.time_to_act, "time_bank": args.time_bank}
+
+def _encode_table_state(args: TableStateArgs) -> dict:
+    return {"players": [encode_player(p) for p in args.players], "away_player_ids": args.away_player_ids,
+            "folded_player_ids": args.folded_player_ids, "is_game_started": args.is_game_started,
+            "pot": args.pot, "cards": encode_cards(args.cards), "pocket_cards": encode_cards(args.pocket_cards),
+            "hand": None if args.hand is None else args.hand.value, "dealer_id": args.dealer_id,
+            "curr_player_id": args.curr_player_id,
+            "turn_request": None if args.turn_request is None else _encode_turn_request(args.turn_request)}
+
+# hand-written encoders, produce the same dicts as AbsGamePhaseArgs.dict() without walking the model
+_ENCODERS: Dict[Type[BaseModel], Callable[[BaseModel], dict]] = {
+    NewPlayerArgs: lambda a: {"player": encode_player(a.player)},
+    PreStartArgs: lambda a: {"prev_dealer": encode_player(a.prev_dealer),
+                             "curr_dealer": encode_player(a.curr_dealer),
+                             "ordered_player_ids": a.ordered_player_ids},
+    PreFlopSBArgs: lambda a: {"sb_amount": a.sb_amount, "player": encode_player(a.player)},
+    PreFlopBBArgs: lambda a: {"bb_amount": a.bb_amount, "player": encode_player(a.player)},
+    CommunityCardsArgs: lambda a: {"cards": encode_cards(a.cards)},
+    PocketCardsArgs: lambda a: {"pocket_cards": a.pocket_cards},
+    TurnResultArgs: lambda a: {"player": encode_player(a.player), "action": a.action.value, "amount": a.amount},
+    TurnHighlightArgs: lambda a: {"prev_player": encode_player(a.prev_player),
+                                  "curr_player": None if a.curr_player is None else encode_player(a.curr_player)},
+    PotArgs: lambda a: {"pot": a.pot},
+    TurnRequestArgs: _encode_turn_request,
+    HandStrengthArgs: lambda a: {"hand": a.hand.value},
+    ShowdownWinnerArgs: _encode_showdown_winner,
+    ShowdownWinnerListArgs: lambda a: {"winners": [_encode_showdown_winner(w) for w in a.winners]},
+    ShowdownLoserArgs: _encode_showdown_loser,
+    ShowdownLoserListArgs: lambda a: {"losers": [_encode_showdown_loser(l) for l in a.losers]},
+    TableStateArgs: _encode_table_state,
+    IsReadyArgs: lambda a: {"player_id": a.player_id, "is_ready": a.is_ready},
+}
+
+def encode_args(args: BaseModel) -> dict:
+    encoder = _ENCODERS.get(type(args))
+    if encoder is None:
+        return args.dict()
+    return encoder(args)
+
+# same output as WebSocket.send_json, the encoder is built once instead of on every json.dumps call
+_encode_json = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
+
+def encode_frame(json_dict: dict) -> str:
+    return _encode_json(json_dict)
+
+def encode_event(game_phase: GamePhase, args: BaseModel) -> str:
+    """
+    Encodes an event into the frame that is sent as is to every subscriber
+    """
+    return encode_frame({game_phase.value: encode_args(args)})
@@ -0,0 +1,263 @@
+import argparse
+import logging
+import marshal
+import mmap
+import os
+import struct
+import zlib
+from typing import List, Optional, Tuple
+from app.game.game import Game
+from app.game.game_schema import PlayerAction
+from app.game.game_states import BettingRound, PreFlopState, FlopState, TurnState, RiverState
+from app.game.lookup_evaluator import IncrementalHandEvaluator
+from app.game.models import Player, DECK
+from app.game.pot_ledger import PotLedger
+from app.game.seat_map import SeatMap
+from app.game.table import Table
+
+logger = logging.getLogger(__name__)
+
+# a snapshot file has two slots of SLOT_SIZE bytes: <uint64 sequence><uint32 length><uint32 crc32><payload>,
+# the payload is a marshalled tuple, so snapshots are read back by the same Python version that wrote them
+VERSION = 3
+MARSHAL_VERSION = 2 # no shared object references, the cheapest format to write
+SLOT_HEADER = struct.Struct('<QII')
+SLOT_SIZE = 16384
+SUFFIX = '.snap'
+RESUMABLE_STATES = {cls.__name__: cls for cls in (PreFlopState, FlopState, TurnState, RiverState)}
+
+class SnapshotFile:
+    """
+    Latest snapshot of one table in a memory-mapped file, the two slots are written in turn
+    so a write torn by a crash leaves the previous snapshot readable
+    """
+    def __init__(self, path: str):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < 2 * SLOT_SIZE:
+                os.ftruncate(fd, 2 * SLOT_SIZE)
+            self._map = mmap.mmap(fd, 2 * SLOT_SIZE)
+        finally:
+            os.close(fd)
+        latest = self._latest()
+        self.sequence = 0 if latest is None else latest[0]
+
+    def save(self, payload: bytes):
+        """
+        Only copies into the page cache, the OS writes it out, so a killed process loses nothing
+        """
+        if len(payload) > SLOT_SIZE - SLOT_HEADER.size:
+            raise ValueError(f"Snapshot of {len(payload)} bytes does not fit in a slot")
+        self.sequence += 1
+        offset = (self.sequence % 2) * SLOT_SIZE
+        start = offset + SLOT_HEADER.size
+        self._map[start:start + len(payload)] = payload
+        SLOT_HEADER.pack_into(self._map, offset, self.sequence, len(payload), self._crc(self.sequence, payload))
+
+    def load(self) -> Optional[bytes]:
+        latest = self._latest()
+        return None if latest is None else latest[1]
+
+    def close(self):
+        self._map.close()
+
+    @staticmethod
+    def _crc(sequence: int, payload: bytes) -> int:
+        return zlib.crc32(payload, sequence & 0xffffffff)
+
+    def _latest(self) -> Optional[Tuple[int, bytes]]:
+        latest = None
+        for offset in (0, SLOT_SIZE):
+            sequence, length, crc = SLOT_HEADER.unpack_from(self._map, offset)
+            if sequence == 0 or length > SLOT_SIZE - SLOT_HEADER.size:
+                continue
+            start = offset + SLOT_HEADER.size
+            payload = self._map[start:start + length]
+            if self._crc(sequence, payload) != crc:
+                continue
+            if latest is None or sequence > latest[0]:
+                latest = (sequence, payload)
+        return latest
+
+class SnapshotStore:
+    """
+    Directory with one snapshot file per table
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def open(self, table_id: str) -> SnapshotFile:
+        return SnapshotFile(self._path(table_id))
+
+    def table_ids(self) -> List[str]:
+        return sorted(name[:-len(SUFFIX)] for name in os.listdir(self.directory) if name.endswith(SUFFIX))
+
+    def remove(self, table_id: str):
+        try:
+            os.remove(self._path(table_id))
+        except FileNotFoundError:
+            pass
+
+    def _path(self, table_id: str) -> str:
+        return os.path.join(self.directory, table_id + SUFFIX)
+
+class TableSnapshot:
+    """
+    Seats and the hand in flight of one table, decoded from a snapshot
+    """
+    def __init__(self, data: tuple):
+        version, table_info, dealer, players, seat_ids, left_players, hand = data
+        if version != VERSION:
+            raise ValueError(f'Unsupported snapshot version {version}')
+        self.table_id, self.name, self.sb_amount, self.bb_amount, self.min_raise, self.min_players = table_info
+        self.curr_dealer_pos, self.prev_dealer_pos = dealer
+        self.players = players # everyone seated at the table, busted players and those waiting for a hand too
+        self.seat_ids = seat_ids # seats of the latest hand, the dealer positions point into them
+        self.left_players = left_players # players of the latest hand who left the table since
+        self.hand = hand
+
+    @staticmethod
+    def decode(payload: bytes) -> 'TableSnapshot':
+        return TableSnapshot(marshal.loads(payload))
+
+    @property
+    def has_hand(self) -> bool:
+        return self.hand is not None
+
+    def restore_players(self, table: Table):
+        table.seats.clear()
+        for player in self.players:
+            table.seats.add(_decode_player(player))
+
+    def restore_game(self, game: Game):
+        """
+        Puts the game back at the action boundary of the snapshot, Game.resume_game continues from there
+        """
+        game.curr_dealer_pos = self.curr_dealer_pos
+        game.prev_dealer_pos = self.prev_dealer_pos
+        players = {p.id: p for p in game.table.players}
+        for player in self.left_players:
+            players[player[0]] = _decode_player(player)
+        game.seats = SeatMap(players[player_id] for player_id in self.seat_ids)
+        if self.hand is None:
+            return
+
+        state_name, pot, sb_pos, bb_pos, folded_ids, deck_seed, deck_pos, board, betting_round = self.hand[:9]
+        if state_name not in RESUMABLE_STATES:
+            raise ValueError(f'Cannot resume a hand in {state_name}')
+        curr_player_pos, prev_player_pos, curr_bet, last_raise_by, needs_to_act, action_opened, options = \
+            betting_round
+        game.pot = pot
+        game.sb_pos = sb_pos
+        game.bb_pos = bb_pos
+        for player_id in folded_ids:
+            game.seats.fold(game.seats.seat_of(player_id))
+        for seat, player in enumerate(game.players):
+            if player.balance <= 0:
+                game.seats.set_all_in(seat)
+        game.pot_ledger = PotLedger()
+        for player_id, amount in self.hand[9]:
+            game.pot_ledger.add(player_id, amount)
+        game.deck_seed = deck_seed
+        game.table.restore_deck(deck_seed, deck_pos)
+        game.table.community_cards = [DECK[code] for code in board]
+        game.hand_evaluators = {}
+        for player in game.players:
+            if player.pocket_cards:
+                hand_evaluator = IncrementalHandEvaluator(player.pocket_cards)
+                hand_evaluator.add_cards(game.table.community_cards)
+                game.hand_evaluators[player.id] = hand_evaluator
+        game.betting_round = BettingRound(curr_player_pos, prev_player_pos, curr_bet, last_raise_by,
+                                          game.seats.bits(needs_to_act), action_opened, [PlayerAction(o) for o in options])
+        game.set_game_state(RESUMABLE_STATES[state_name](game))
+        game.is_game_started = True
+
+def load_snapshot(file: SnapshotFile) -> Optional[TableSnapshot]:
+    payload = file.load()
+    if payload is None:
+        return None
+    try:
+        return TableSnapshot.decode(payload)
+    except (ValueError, EOFError, TypeError) as e:
+        logger.error(f"Snapshot {file.path} cannot be read: {e}")
+        return None
+
+def capture_snapshot(table_info: tuple, table: Table, game: Optional[Game]) -> tuple:
+    """
+    Plain tuples and lists of ints, floats and strings, marshal encodes them in a few microseconds
+    """
+    hand = None
+    dealer = (-1, 0)
+    hand_players: List[Player] = []
+    if game is not None:
+        dealer = (game.curr_dealer_pos, game.prev_dealer_pos)
+        # seats of players who left during the hand are kept until it is over
+        hand_players = game.players
+        betting_round = game.betting_round
+        if game.is_game_started and betting_round is not None:
+            hand = (type(game.game_state).__name__, game.pot, game.sb_pos, game.bb_pos,
+                    game.seats.ids(game.seats.folded), game.deck_seed, table.deck_pos,
+                    [c.code for c in table.community_cards],
+                    (betting_round.curr_player_pos, betting_round.prev_player_pos, betting_round.curr_bet,
+                     betting_round.last_raise_by, game.seats.ids(betting_round.needs_to_act), betting_round.action_opened,
+                     [o.value for o in betting_round.turn_options]),
+                    list(game.pot_ledger.contributions.items()))
+    return (VERSION, table_info, dealer, [_encode_player(p) for p in table.players],
+            [p.id for p in hand_players], [_encode_player(p) for p in hand_players if p.id not in table.seats],
+            hand)
+
+def _encode_player(player: Player) -> tuple:
+    return (player.id, player.name, player.balance, player.bet, [c.code for c in player.pocket_cards],
+            player.is_ready)
+
+def _decode_player(data: tuple) -> Player:
+    player_id, name, balance, bet, pocket_codes, is_ready = data
+    player = Player(player_id, name, balance)
+    player.bet = bet
+    player.pocket_cards = [DECK[code] for code in pocket_codes]
+    player.is_ready = is_ready
+    return player
+
+class GameSnapshotter:
+    """
+    Writes a table's snapshot at every action boundary, between hands and when seats change
+    """
+    def __init__(self, file: SnapshotFile, table_id: str, name: str, sb_amount: float, bb_amount: float,
+                 min_raise: float, min_players: int):
+        self.file = file
+        self.table_info = (table_id, name, sb_amount, bb_amount, min_raise, min_players)
+
+    def save(self, table: Table, game: Optional[Game]):
+        if game is not None and game.is_game_started and game.betting_round is None:
+            # cards are being dealt or the pot paid out, the last snapshot is still the one to resume from
+            return
+        try:
+            self.file.save(marshal.dumps(capture_snapshot(self.table_info, table, game), MARSHAL_VERSION))
+        except ValueError as e:
+            logger.error(f"Snapshot of table {self.table_info[0]} not saved: {e}")
+
+    def close(self):
+        self.file.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Shows the table snapshots of a directory')
+    parser.add_argument('directory')
+    args = parser.parse_args()
+
+    store = SnapshotStore(args.directory)
+    for table_id in store.table_ids():
+        file = store.open(table_id)
+        snapshot = load_snapshot(file)
+        if snapshot is None:
+            print(f'{table_id}: no readable snapshot')
+            file.close()
+            continue
+        hand = f'hand in {snapshot.hand[0]}, pot {snapshot.hand[1]}' if snapshot.has_hand else 'between hands'
+        print(f'{table_id} "{snapshot.name}": {len(snapshot.players)} players, {hand}, '
+              f'sequence {file.sequence}')
+        file.close()
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,26 @@
 from typing_extensions import override
 from app.game.game_schema import *
-from typing import TYPE_CHECKING, List, Set, Dict
-from app.game.hand_evaluator import RoyalFlushEvaluator
+from typing import TYPE_CHECKING, List, Dict, Optional
+from app.game.lookup_evaluator import IncrementalHandEvaluator
 from app.game.player_action_commands import *
 
 if TYPE_CHECKING:
     from app.game.game import Game
 
+class BettingRound:
+    """
+    Progress of the running betting round, kept on the game so a snapshot can resume it
+    """
+    def __init__(self, curr_player_pos: int, prev_player_pos: int, curr_bet: float, last_raise_by: float,
+                 needs_to_act: int, action_opened: bool, turn_options: List[PlayerAction]):
+        self.curr_player_pos = curr_player_pos
+        self.prev_player_pos = prev_player_pos
+        self.curr_bet = curr_bet
+        self.last_raise_by = last_raise_by
+        self.needs_to_act = needs_to_act # bit per seat of the game's SeatMap
+        self.action_opened = action_opened
+        self.turn_options = turn_options
+
 class AbsGameState(ABC):
     """
     State pattern for game flow
@@ -18,70 +32,86 @@ class AbsGameState(ABC):
     async def start_flow(self):
         pass
 
-    async def run_betting_round(self):
+    async def resume_flow(self):
         """
-        Template method for betting round
+        Continues a betting round restored from a snapshot, its cards were dealt before the snapshot was taken
         """
+        await self.run_betting_round(self.game.betting_round)
+        await self._start_next_state()
 
-        # setup defined by hooks
-        await self._before_betting_round_action()
-        turn_options = self._get_init_turn_options()
-        #last_raiser_pos = self._get_init_aggressor_pos()
-        curr_player_pos = self._get_starting_pos()
-        prev_player_pos = (curr_player_pos - 1 + len(self.game.players)) % len(self.game.players)
-        curr_bet = self._get_init_bet()
-        last_raise_by = self._get_min_raise()
-
-        active_players = [p for p in self.game.players if p not in self.game.folded]
-        if len(active_players) <= 1: return
-
-        needs_to_act: Set[int] = {p.id for p in active_players}
-        action_opened = False
-
-        while len(needs_to_act) > 0:
-            player_to_act = self.game.players[curr_player_pos]
+    async def _start_next_state(self):
+        """hook"""
+        pass
 
-            if player_to_act.id in self.game.folded or player_to_act.id not in needs_to_act:
-                curr_player_pos = (curr_player_pos + 1) % len(self.game.players)
+    async def run_betting_round(self, betting_round: Optional['BettingRound'] = None):
+        """
+        Template method for betting round, a restored round skips the setup
+        """
+        seats = self.game.seats
+        if betting_round is None:
+            # setup defined by hooks
+            await self._before_betting_round_action()
+            if seats.active_count <= 1: return
+            # all-in players have nothing left to bet
+            if seats.can_act_count == 0: return
+            if seats.can_act_count == 1:
+                last_to_act = seats.players[seats.first_to_act(0)]
+                if last_to_act.bet >= max(p.bet for p in seats.active_players()): return
+
+            curr_player_pos = self._get_starting_pos()
+            betting_round = BettingRound(
+                curr_player_pos=curr_player_pos,
+                prev_player_pos=(curr_player_pos - 1 + len(seats)) % len(seats),
+                curr_bet=self._get_init_bet(),
+                last_raise_by=self._get_min_raise(),
+                needs_to_act=seats.can_act_bits,
+                action_opened=False,
+                turn_options=self._get_init_turn_options())
+        self.game.betting_round = betting_round
+
+        while betting_round.needs_to_act:
+            if not betting_round.needs_to_act >> betting_round.curr_player_pos & 1:
+                betting_round.curr_player_pos = seats.next_to_act(betting_round.curr_player_pos)
                 continue # move to the next player
 
-            curr_turn_options = list(turn_options)
-            if not action_opened: # hook for pre-flop BB position
-                curr_turn_options = self._change_turn_options(curr_player_pos, turn_options)
+            curr_turn_options = list(betting_round.turn_options)
+            if not betting_round.action_opened: # hook for pre-flop BB position
+                curr_turn_options = self._change_turn_options(betting_round.curr_player_pos,
+                                                              betting_round.turn_options)
 
-            player_who_acted_pos = curr_player_pos
+            player_who_acted_pos = betting_round.curr_player_pos
 
+            # action boundary, everything needed to resume the hand is settled here
+            self.game.save_snapshot()
             processed_turn = await self._process_turn(
-                curr_player_pos=curr_player_pos,
-                prev_player_pos=prev_player_pos,
-                curr_bet=curr_bet,
-                prev_raise=last_raise_by,
+                curr_player_pos=betting_round.curr_player_pos,
+                prev_player_pos=betting_round.prev_player_pos,
+                curr_bet=betting_round.curr_bet,
+                prev_raise=betting_round.last_raise_by,
                 options=curr_turn_options)
 
-            player_who_acted = player_to_act
-            needs_to_act.remove(player_who_acted.id)
+            betting_round.needs_to_act &= ~(1 << player_who_acted_pos)
 
-            if player_who_acted in self.game.folded:
-                active_players = [p for p in self.game.players if p not in self.game.folded]
-                if len(active_players) <= 1:
-                    needs_to_act.clear()
+            if seats.is_folded(player_who_acted_pos):
+                if seats.active_count <= 1:
+                    betting_round.needs_to_act = 0
 
             elif processed_turn.action == PlayerAction.RAISE:
-                action_opened = True
-                curr_bet = processed_turn.curr_bet
-                last_raise_by = processed_turn.curr_raise
-                #last_raiser_pos = player_who_acted_pos
-                needs_to_act = {p.id for p in active_players if p.id != player_who_acted.id}
-                turn_options = [PlayerAction.CALL, PlayerAction.RAISE, PlayerAction.FOLD]
+                betting_round.action_opened = True
+                betting_round.curr_bet = processed_turn.curr_bet
+                betting_round.last_raise_by = processed_turn.curr_raise
+                betting_round.needs_to_act = seats.can_act_bits & ~(1 << player_who_acted_pos)
+                betting_round.turn_options = [PlayerAction.CALL, PlayerAction.RAISE, PlayerAction.FOLD]
 
             else:
                 pass
 
-            prev_player_pos = player_who_acted_pos
-            curr_player_pos = (curr_player_pos + 1) % len(self.game.players)
+            betting_round.prev_player_pos = player_who_acted_pos
+            betting_round.curr_player_pos = seats.next_to_act(player_who_acted_pos)
 
+        self.game.betting_round = None
         await self.game.game_handler.broadcast(GamePhase.TURN_HIGHLIGHT, TurnHighlightArgs(
-            prev_player=self.game.players[prev_player_pos]))
+            prev_player=self.game.players[betting_round.prev_player_pos]))
 
     @abstractmethod
     async def _before_betting_round_action(self):
@@ -151,13 +181,25 @@ class AbsGameState(ABC):
             case PlayerAction.CHECK:
                 command_invoker.set_player_action_command(CheckCommand(command_args))
 
-        return await command_invoker.player_action_command.process_turn()
+        processed_turn = await command_invoker.player_action_command.process_turn()
+        self.game.last_action = (player_acting.id, turn_response.action)
+        if self.game.hand_record is not None:
+            self.game.hand_record.add_action(len(self.game.table.community_cards), player_acting.id,
+                                             turn_response.action, processed_turn.curr_bet)
+        return processed_turn
 
     async def _deal_community_cards(self, number: int):
-        self.game.table.community_cards += self.game.table.get_cards(number)
+        new_cards = self.game.table.get_cards(number)
+        self.game.table.community_cards += new_cards
         await self.game.game_handler.broadcast(GamePhase.COMMUNITY_CARDS, CommunityCardsArgs(
             cards=self.game.table.community_cards))
 
+        for player in self.game.seats.active_players():
+            hand_evaluator = self.game.hand_evaluators[player.id]
+            hand_evaluator.add_cards(new_cards)
+            await self.game.game_handler.send_personal(GamePhase.HAND_STRENGTH, player.id, HandStrengthArgs(
+                hand=hand_evaluator.hand_value))
+
 class PreFlopState(AbsGameState):
     def _get_init_turn_options(self):
         return [PlayerAction.CALL, PlayerAction.FOLD, PlayerAction.RAISE]
@@ -181,7 +223,9 @@ class PreFlopState(AbsGameState):
     async def start_flow(self):
         await self.deal_player_cards()
         await self.run_betting_round()
+        await self._start_next_state()
 
+    async def _start_next_state(self):
         next_state = FlopState(self.game)
         self.game.set_game_state(next_state)
         await next_state.start_flow()
@@ -189,29 +233,33 @@ class PreFlopState(AbsGameState):
     async def deal_player_cards(self):
         for player in self.game.players:
             player.pocket_cards = self.game.table.get_cards(2)
+            self.game.hand_evaluators[player.id] = IncrementalHandEvaluator(player.pocket_cards)
+            if self.game.hand_record is not None:
+                self.game.hand_record.set_pocket_cards(player.id, player.pocket_cards)
             await self.game.game_handler.send_personal(GamePhase.POCKET_CARDS, player.id, PocketCardsArgs(
                 pocket_cards=player.get_poket_cards_dict()))
+            await self.game.game_handler.send_personal(GamePhase.HAND_STRENGTH, player.id, HandStrengthArgs(
+                hand=self.game.hand_evaluators[player.id].hand_value))
 
     async def _before_betting_round_action(self):
         # small blind
         self.game.sb_pos = (self.game.curr_dealer_pos + 1) % len(self.game.players)
-        self.game.players[self.game.sb_pos].balance -= self.game.sb_amount
-        self.game.players[self.game.sb_pos].bet = self.game.sb_amount
-        self.game.pot += self.game.sb_amount
+        sb_amount = self.game.put_in_pot(self.game.players[self.game.sb_pos], self.game.sb_amount)
         await self.game.game_handler.broadcast(GamePhase.PRE_FLOP_SB, PreFlopSBArgs(
-            sb_amount=self.game.sb_amount,
+            sb_amount=sb_amount,
             player=self.game.players[self.game.sb_pos]))
         await self.game.game_handler.broadcast(GamePhase.POT, PotArgs(pot=self.game.pot))
 
         # big blind
         self.game.bb_pos = (self.game.sb_pos + 1) % len(self.game.players)
-        self.game.players[self.game.bb_pos].balance -= self.game.bb_amount
-        self.game.players[self.game.bb_pos].bet = self.game.bb_amount
-        self.game.pot += self.game.bb_amount
+        bb_amount = self.game.put_in_pot(self.game.players[self.game.bb_pos], self.game.bb_amount)
         await self.game.game_handler.broadcast(GamePhase.PRE_FLOP_BB, PreFlopBBArgs(
-            bb_amount=self.game.bb_amount,
+            bb_amount=bb_amount,
             player=self.game.players[self.game.bb_pos]))
         await self.game.game_handler.broadcast(GamePhase.POT, PotArgs(pot=self.game.pot))
+        if self.game.hand_record is not None:
+            self.game.hand_record.sb_pos = self.game.sb_pos
+            self.game.hand_record.bb_pos = self.game.bb_pos
 
 class FlopState(AbsGameState):
     def _get_init_turn_options(self):
@@ -229,7 +277,9 @@ class FlopState(AbsGameState):
     async def start_flow(self):
         await self._deal_community_cards(3)
         await self.run_betting_round()
+        await self._start_next_state()
 
+    async def _start_next_state(self):
         next_state = TurnState(self.game)
         self.game.set_game_state(next_state)
         await next_state.start_flow()
@@ -239,7 +289,9 @@ class TurnState(FlopState):
     async def start_flow(self):
         await self._deal_community_cards(1)
         await self.run_betting_round()
+        await self._start_next_state()
 
+    async def _start_next_state(self):
         next_state = RiverState(self.game)
         self.game.set_game_state(next_state)
         await next_state.start_flow()
@@ -249,7 +301,9 @@ class RiverState(FlopState):
     async def start_flow(self):
         await self._deal_community_cards(1)
         await self.run_betting_round()
+        await self._start_next_state()
 
+    async def _start_next_state(self):
         next_state = ShowdownState(self.game)
         self.game.set_game_state(next_state)
         await next_state.start_flow()
@@ -258,16 +312,17 @@ class ShowdownState(AbsGameState):
     @override
     async def start_flow(self):
         (winners, losers) = self.process_showdown()
+        if self.game.hand_record is not None:
+            for winner in winners.winners:
+                self.game.hand_record.add_payout(winner.winner.id, winner.won_pot)
         await self.broadcast_showdown_results(winners, losers)
 
     def evaluate_hands(self)->EvaluatedHands:
         players_hands: Dict[Player, EvaluatedHand] = {}
         leading_hands: List[Tuple[Player, EvaluatedHand]] = [None]
-        active_players = [p for p in self.game.players if p not in self.game.folded]
-        for player in active_players:
-            evaluator = RoyalFlushEvaluator()
-            hand = evaluator.evaluate_hand(community_cards=self.game.table.community_cards,
-                                    pocket_cards=player.get_poket_cards())
+        for player in self.game.seats.active_players():
+            # hands were kept up to date street by street, nothing is evaluated from scratch
+            hand = self.game.hand_evaluators[player.id].evaluated_hand()
             if leading_hands[0] is None:
                 leading_hands = [(player, hand)]
             elif hand > leading_hands[0][1]:
@@ -280,50 +335,33 @@ class ShowdownState(AbsGameState):
             leading_hands=leading_hands)
 
     def process_showdown(self)->(ShowdownWinnerListArgs, ShowdownLoserListArgs):
-        evaluated_hands = self.evaluate_hands()
-        players_hands = evaluated_hands.players_hands
-        leading_hands = evaluated_hands.leading_hands
-        winning_players: List[Player] = [hand[0] for hand in leading_hands if hand[0] not in self.game.folded]
+        """
+        Main and side pots are paid out by the pot ledger, hands are ranked once for all of them
+        """
+        players_hands = self.evaluate_hands().players_hands
+        # odd chips of a split pot go to the first winner from the small blind on
+        live_players = self.game.seats.active_players(self.game.sb_pos)
+        payouts = self.game.pot_ledger.award([p.id for p in live_players],
+                                             {p.id: self.game.hand_evaluators[p.id].score for p in live_players})
 
         winners: List[ShowdownWinnerArgs] = []
-        if len(leading_hands) > 1:
-            divided_pot = self.game.pot // len(leading_hands)
-            remainder = self.game.pot % len(leading_hands)
-            winners_count = 0
-
-            curr_pos = self.game.sb_pos
-            while winners_count != len(leading_hands):
-                curr_player = self.game.players[curr_pos]
-                if curr_player in winning_players:
-                    won_pot = divided_pot
-                    if winners_count == 0:
-                        won_pot += remainder
-                    curr_player.balance += won_pot
-                    winners_count += 1
-                    winners.append(ShowdownWinnerArgs(
-                        winner=curr_player,
-                        won_pot=won_pot,
-                        hand=players_hands[curr_player].hand_value,
-                        pocket_cards=curr_player.get_poket_cards()
-                    ))
-        else:
-            winner = winning_players[0]
-            winner.balance += self.game.pot
-            winners.append(ShowdownWinnerArgs(
-                winner=winner,
-                won_pot=self.game.pot,
-                hand=players_hands[winner].hand_value,
-                pocket_cards=winner.get_poket_cards()
-            ))
-
         losers: List[ShowdownLoserArgs] = []
-        lost_players = [p for p in players_hands.keys() if p not in winning_players]
-        for player in lost_players:
-            losers.append(ShowdownLoserArgs(
-                player=player,
-                hand=players_hands[player].hand_value,
-                pocket_cards=player.get_poket_cards()
-            ))
+        for player in live_players:
+            won_pot = payouts.get(player.id, 0)
+            if won_pot > 0:
+                player.balance += won_pot
+                winners.append(ShowdownWinnerArgs(
+                    winner=player,
+                    won_pot=won_pot,
+                    hand=players_hands[player].hand_value,
+                    pocket_cards=player.get_poket_cards()
+                ))
+            else:
+                losers.append(ShowdownLoserArgs(
+                    player=player,
+                    hand=players_hands[player].hand_value,
+                    pocket_cards=player.get_poket_cards()
+                ))
 
         return ShowdownWinnerListArgs(winners=winners), ShowdownLoserListArgs(losers=losers)
 
@@ -0,0 +1,264 @@
+import argparse
+import enum
+import logging
+import os
+import queue
+import struct
+import threading
+import time
+import uuid
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional
+from app.game.game_schema import PlayerAction
+from app.game.models import Player, Card
+
+logger = logging.getLogger(__name__)
+
+# file layout: MAGIC, then records of <uint32 length><uint8 version><body>, all little-endian
+MAGIC = b'PKHH'
+VERSION = 2
+LENGTH = struct.Struct('<I')
+HAND_HEADER = struct.Struct('<BQdBBBddBQ') # version, hand id, started at, dealer, sb, bb seats, blinds, players, seed
+PLAYER = struct.Struct('<qdBBB')           # id, starting balance, pocket card codes, name length
+ACTION = struct.Struct('<BqBd')            # board cards count, player id, action, player's bet after the action
+PAYOUT = struct.Struct('<qd')              # player id, won amount
+NO_CARD = 255
+NO_SEED = 2 ** 64 - 1 # games draw 63 bits seeds, so a seed of 0 stays a seed
+
+ACTIONS: List[PlayerAction] = list(PlayerAction)
+_ACTION_CODES = {action: i for i, action in enumerate(ACTIONS)}
+
+class HandPlayer(NamedTuple):
+    id: int
+    name: str
+    balance: float  # at the start of the hand
+    pocket_cards: List[int]
+
+class HandAction(NamedTuple):
+    board_cards: int  # 0 preflop, 3 on the flop, 4 on the turn, 5 on the river
+    player_id: int
+    action: PlayerAction
+    bet: float
+
+class HandPayout(NamedTuple):
+    player_id: int
+    amount: float
+
+class HandRecord:
+    """
+    Everything needed to reconstruct one played hand
+    """
+    def __init__(self, table_id: str, hand_id: int, started_at: float, dealer_pos: int,
+                 sb_amount: float, bb_amount: float, players: List[HandPlayer], deck_seed: Optional[int] = None):
+        self.table_id = table_id
+        self.hand_id = hand_id
+        self.started_at = started_at
+        self.dealer_pos = dealer_pos
+        self.sb_pos = 0
+        self.bb_pos = 0
+        self.sb_amount = sb_amount
+        self.bb_amount = bb_amount
+        self.players = players
+        self.deck_seed = deck_seed # None when not known, such hands cannot be replayed
+        self.board: List[int] = []
+        self.actions: List[HandAction] = []
+        self.payouts: List[HandPayout] = []
+
+    @staticmethod
+    def start(table_id: str, dealer_pos: int, sb_amount: float, bb_amount: float,
+              players: List[Player], deck_seed: Optional[int] = None) -> 'HandRecord':
+        return HandRecord(table_id, uuid.uuid4().int >> 64, time.time(), dealer_pos, sb_amount, bb_amount,
+                          [HandPlayer(p.id, p.name, p.balance, []) for p in players], deck_seed)
+
+    def set_pocket_cards(self, player_id: int, cards: List[Card]):
+        for i, player in enumerate(self.players):
+            if player.id == player_id:
+                self.players[i] = player._replace(pocket_cards=[c.code for c in cards])
+
+    def add_action(self, board_cards: int, player_id: int, action: PlayerAction, bet: float):
+        self.actions.append(HandAction(board_cards, player_id, action, bet))
+
+    def add_payout(self, player_id: int, amount: float):
+        self.payouts.append(HandPayout(player_id, amount))
+
+def encode_record(record: HandRecord) -> bytes:
+    table_id = record.table_id.encode()
+    parts = [HAND_HEADER.pack(VERSION, record.hand_id, record.started_at, record.dealer_pos, record.sb_pos,
+                              record.bb_pos, record.sb_amount, record.bb_amount, len(record.players),
+                              NO_SEED if record.deck_seed is None else record.deck_seed),
+             bytes((len(table_id),)), table_id]
+    for player in record.players:
+        # cut on a character boundary, a suit emoji takes several bytes
+        name = player.name.encode()[:255].decode(errors='ignore').encode()
+        cards = player.pocket_cards + [NO_CARD] * (2 - len(player.pocket_cards))
+        parts.append(PLAYER.pack(player.id, player.balance, cards[0], cards[1], len(name)))
+        parts.append(name)
+    parts.append(bytes((len(record.board),)))
+    parts.append(bytes(record.board))
+    parts.append(struct.pack('<H', len(record.actions)))
+    for action in record.actions:
+        parts.append(ACTION.pack(action.board_cards, action.player_id, _ACTION_CODES[action.action], action.bet))
+    parts.append(bytes((len(record.payouts),)))
+    for payout in record.payouts:
+        parts.append(PAYOUT.pack(payout.player_id, payout.amount))
+    body = b''.join(parts)
+    return LENGTH.pack(len(body)) + body
+
+def decode_record(body: bytes) -> HandRecord:
+    version = body[0]
+    if version != VERSION:
+        raise ValueError(f'Unsupported hand record version {version}')
+    _, hand_id, started_at, dealer_pos, sb_pos, bb_pos, sb_amount, bb_amount, players_count, deck_seed = \
+        HAND_HEADER.unpack_from(body, 0)
+    offset = HAND_HEADER.size
+    if deck_seed == NO_SEED:
+        deck_seed = None
+    table_id = body[offset + 1:offset + 1 + body[offset]].decode()
+    offset += 1 + body[offset]
+
+    players = []
+    for _ in range(players_count):
+        player_id, balance, card_1, card_2, name_length = PLAYER.unpack_from(body, offset)
+        offset += PLAYER.size
+        name = body[offset:offset + name_length].decode()
+        offset += name_length
+        players.append(HandPlayer(player_id, name, balance, [c for c in (card_1, card_2) if c != NO_CARD]))
+    record = HandRecord(table_id, hand_id, started_at, dealer_pos, sb_amount, bb_amount, players, deck_seed)
+    record.sb_pos, record.bb_pos = sb_pos, bb_pos
+
+    record.board = list(body[offset + 1:offset + 1 + body[offset]])
+    offset += 1 + body[offset]
+    (actions_count,) = struct.unpack_from('<H', body, offset)
+    offset += 2
+    for _ in range(actions_count):
+        board_cards, player_id, action, bet = ACTION.unpack_from(body, offset)
+        offset += ACTION.size
+        record.actions.append(HandAction(board_cards, player_id, ACTIONS[action], bet))
+    payouts_count = body[offset]
+    offset += 1
+    for _ in range(payouts_count):
+        record.payouts.append(HandPayout(*PAYOUT.unpack_from(body, offset)))
+        offset += PAYOUT.size
+    return record
+
+def read_hands(path: str) -> Iterator[HandRecord]:
+    """
+    Streams the records of a log one by one, a record torn by a crash at the end of the file is skipped
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a hand history log')
+        while True:
+            header = file.read(LENGTH.size)
+            if len(header) < LENGTH.size:
+                return
+            (length,) = LENGTH.unpack(header)
+            body = file.read(length)
+            if len(body) < length:
+                return
+            yield decode_record(body)
+
+class FsyncPolicy(enum.Enum):
+    NEVER = "NEVER"   # leave flushing to the OS, fastest, hands written in the last seconds can be lost on power loss
+    BATCH = "BATCH"   # fsync after every written batch
+    ALWAYS = "ALWAYS" # fsync after every hand
+
+class HandHistoryWriter:
+    """
+    Appends hand records from a background thread, records queued while a batch is written go in the next batch
+    """
+    def __init__(self, path: str, fsync_policy: FsyncPolicy = FsyncPolicy.BATCH, batch_size: int = 256):
+        if batch_size <= 0:
+            raise ValueError("Batch size must be positive")
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self.batch_size = batch_size
+        self.written = 0
+        self._queue: queue.Queue = queue.Queue()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._truncate_torn_tail()
+        self._file: BinaryIO = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+            self._file.flush()
+        self._thread = threading.Thread(target=self._write_loop, name='hand-history-writer', daemon=True)
+        self._thread.start()
+
+    def _truncate_torn_tail(self):
+        """
+        Drops a record left half-written by a crash, new records would be unreadable after it
+        """
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        with open(self.path, 'r+b') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{self.path} is not a hand history log')
+            end = file.tell()
+            while end + LENGTH.size <= size:
+                (length,) = LENGTH.unpack(file.read(LENGTH.size))
+                if end + LENGTH.size + length > size:
+                    break
+                end = file.seek(length, os.SEEK_CUR)
+            if end != size:
+                logger.warning(f"Truncating a torn record at the end of {self.path}")
+                file.truncate(end)
+
+    def append(self, record: HandRecord):
+        self._queue.put(record)
+
+    def close(self):
+        """
+        Writes every queued record and closes the file
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def _write_loop(self):
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                closing = True
+                batch = [r for r in batch if r is not None]
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.exception(f"Error writing hand history to {self.path}: {e}")
+
+    def _write(self, batch: List[HandRecord]):
+        if not batch:
+            return
+        if self.fsync_policy == FsyncPolicy.ALWAYS:
+            for record in batch:
+                self._file.write(encode_record(record))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+        else:
+            self._file.write(b''.join(encode_record(record) for record in batch))
+            self._file.flush()
+            if self.fsync_policy == FsyncPolicy.BATCH:
+                os.fsync(self._file.fileno())
+        self.written += len(batch)
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarizes a hand history log')
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    hands, actions, paid = 0, 0, 0.0
+    started = time.perf_counter()
+    for record in read_hands(args.path):
+        hands += 1
+        actions += len(record.actions)
+        paid += sum(payout.amount for payout in record.payouts)
+    seconds = time.perf_counter() - started
+    print(f'{hands} hands, {actions} actions, {paid:.0f} chips paid out, read in {seconds:.2f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+from typing import List, Dict, Sequence
+from app.game.game_schema import EvaluatedHand, HandValue
+from app.game.hand_evaluator import AbsHandEvaluator
+from app.game.models import Card
+
+# indexed by Card.code >> 2
+RANK_PRIMES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+
+# score layout: hand value in the top bits, then up to 5 card values (2..14) as 4-bit nibbles
+SCORE_CATEGORY_SHIFT = 20
+
+WHEEL_MASK = (1 << 12) | 0b1111
+
+def pack_score(hand_value: HandValue, values: Sequence[int]) -> int:
+    score = hand_value.value
+    for v in values:
+        score = (score << 4) | v
+    return score << 4 * (5 - len(values))
+
+def score_hand_value(score: int) -> HandValue:
+    return HandValue(score >> SCORE_CATEGORY_SHIFT)
+
+def score_values(score: int) -> List[int]:
+    """
+    Card values packed into the score, most significant first
+    """
+    return [(score >> shift) & 0xF for shift in (16, 12, 8, 4, 0)]
+
+def _straight_top(rank_mask: int) -> int:
+    """
+    Value of the highest card of the best straight in the rank mask, 0 if there is none
+    """
+    for low in range(8, -1, -1):
+        if (rank_mask >> low) & 0b11111 == 0b11111:
+            return low + 6
+    if rank_mask & WHEEL_MASK == WHEEL_MASK:
+        return 5
+    return 0
+
+def _build_flush_table() -> List[int]:
+    """
+    Score of every 13-bit rank mask of a single suit, 0 for masks with less than 5 cards
+    """
+    table = [0] * (1 << 13)
+    for mask in range(1 << 13):
+        if mask.bit_count() < 5:
+            continue
+        top = _straight_top(mask)
+        if top == 14:
+            table[mask] = pack_score(HandValue.ROYAL_FLUSH, [14])
+        elif top:
+            table[mask] = pack_score(HandValue.STRAIGHT_FLUSH, [top])
+        else:
+            values = [r + 2 for r in range(12, -1, -1) if mask >> r & 1]
+            table[mask] = pack_score(HandValue.FLUSH, values[:5])
+    return table
+
+def _score_rank_groups(by_count: List[List[int]], rank_mask: int) -> int:
+    """
+    Best non-flush hand, by_count[n] holds values (highest first) of the ranks present n times
+    """
+    singles, pairs, trips, quads = by_count[1], by_count[2], by_count[3], by_count[4]
+
+    if quads:
+        return pack_score(HandValue.FOUR_OF_A_KIND, [quads[0], max(trips + pairs + singles)])
+
+    if trips and (len(trips) > 1 or pairs):
+        return pack_score(HandValue.FULL_HOUSE, [trips[0], max(trips[1:] + pairs)])
+
+    top = _straight_top(rank_mask)
+    if top:
+        return pack_score(HandValue.STRAIGHT, [top])
+
+    if trips:
+        return pack_score(HandValue.THREE_OF_A_KIND, trips + singles[:2])
+
+    if len(pairs) >= 2:
+        kickers = sorted(pairs[2:] + singles, reverse=True)
+        return pack_score(HandValue.TWO_PAIRS, pairs[:2] + kickers[:1])
+
+    if pairs:
+        return pack_score(HandValue.ONE_PAIR, pairs + singles[:3])
+
+    return pack_score(HandValue.HIGH_CARD, singles[:5])
+
+def _build_rank_table() -> Dict[int, int]:
+    """
+    Score of every 5, 6 and 7 card rank multiset, keyed by the product of rank primes
+    """
+    table: Dict[int, int] = {}
+    by_count: List[List[int]] = [[], [], [], [], []]
+
+    def walk(rank: int, cards_left: int, product: int, rank_mask: int):
+        if cards_left == 0:
+            table[product] = _score_rank_groups(by_count, rank_mask)
+            return
+        if rank < 0:
+            return
+        walk(rank - 1, cards_left, product, rank_mask)
+        for count in range(1, min(4, cards_left) + 1):
+            product *= RANK_PRIMES[rank]
+            by_count[count].append(rank + 2)
+            walk(rank - 1, cards_left - count, product, rank_mask | 1 << rank)
+            by_count[count].pop()
+
+    for cards_count in (5, 6, 7):
+        walk(12, cards_count, 1, 0)
+    return table
+
+FLUSH_TABLE: List[int] = _build_flush_table()
+RANK_TABLE: Dict[int, int] = _build_rank_table()
+
+def evaluate_codes(codes: Sequence[int]) -> int:
+    """
+    Scores 5, 6 or 7 integer-encoded cards, bigger score is a more valuable hand
+    """
+    suit_masks = [0, 0, 0, 0]
+    product = 1
+    for code in codes:
+        suit_masks[code & 3] |= 1 << (code >> 2)
+        product *= RANK_PRIMES[code >> 2]
+    for mask in suit_masks:
+        if FLUSH_TABLE[mask]:
+            return FLUSH_TABLE[mask]
+    return RANK_TABLE[product]
+
+def evaluate_cards(cards: Sequence[Card]) -> int:
+    if not 5 <= len(cards) <= 7:
+        raise ValueError("Hand must consist of 5 to 7 cards")
+    return evaluate_codes([c.code for c in cards])
+
+def evaluated_hand_from_score(score: int, pocket_cards: List[Card]) -> EvaluatedHand:
+    hand_value = score_hand_value(score)
+    values = score_values(score)
+
+    highest_in_hand_value_2 = None
+    if hand_value in (HandValue.FULL_HOUSE, HandValue.TWO_PAIRS):
+        highest_in_hand_value_2 = values[1]
+    kickers = [c.value for c in pocket_cards if c.value not in (values[0], highest_in_hand_value_2)]
+
+    return EvaluatedHand(
+        hand_value=hand_value,
+        highest_in_hand_value=values[0],
+        highest_in_hand_value_2=highest_in_hand_value_2,
+        kicker_value=max(kickers, default=0),
+        score=score)
+
+class LookupHandEvaluator(AbsHandEvaluator):
+    """
+    Lookup table evaluator, scores the whole hand at once instead of walking the chain of evaluators
+    """
+    def evaluate_hand(self, community_cards: List[Card], pocket_cards: List[Card]) -> EvaluatedHand:
+        return evaluated_hand_from_score(evaluate_cards(community_cards + pocket_cards), pocket_cards)
+
+class IncrementalHandEvaluator:
+    """
+    Keeps one player's hand up to date while the streets are dealt,
+    every street costs a single table lookup instead of evaluating all cards again
+    """
+    def __init__(self, pocket_cards: List[Card]):
+        self.pocket_cards: List[Card] = list(pocket_cards)
+        self.rank_counts: List[int] = [0] * 13
+        self.suit_masks: List[int] = [0, 0, 0, 0]
+        self.rank_product: int = 1
+        self.cards_count: int = 0
+        self.score: int = 0
+        self.add_cards(pocket_cards)
+
+    def add_cards(self, cards: List[Card]):
+        for card in cards:
+            rank = card.code >> 2
+            self.rank_counts[rank] += 1
+            self.suit_masks[card.code & 3] |= 1 << rank
+            self.rank_product *= RANK_PRIMES[rank]
+            self.cards_count += 1
+        if self.cards_count > 7:
+            raise ValueError("Hand cannot have more than 7 cards")
+        if self.cards_count >= 5:
+            self.score = RANK_TABLE[self.rank_product]
+            for mask in self.suit_masks:
+                if FLUSH_TABLE[mask]:
+                    self.score = FLUSH_TABLE[mask]
+
+    @property
+    def hand_value(self) -> HandValue:
+        if self.cards_count >= 5:
+            return score_hand_value(self.score)
+        # before the flop only the pocket cards are known
+        if max(self.rank_counts) >= 2:
+            return HandValue.ONE_PAIR
+        return HandValue.HIGH_CARD
+
+    def evaluated_hand(self) -> EvaluatedHand:
+        if self.cards_count < 5:
+            raise ValueError("Hand must consist of 5 to 7 cards")
+        return evaluated_hand_from_score(self.score, self.pocket_cards)
@@ -24,17 +24,49 @@ class Player:
             "is_ready": self.is_ready
         }
 
+SUITS = ['♥️', '♦️', '♠️', '♣️']
+RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A']
+_SUIT_INDEX = {s: i for i, s in enumerate(SUITS)}
+_RANK_INDEX = {r: i for i, r in enumerate(RANKS)}
+
 class Card:
+    """
+    Card packed into a single int 0..51: rank index ('2' is 0, 'A' is 12) * 4 + suit index
+    """
+    __slots__ = ('code',)
+
     def __init__(self, suit, rank):
-        self.suit = suit
-        self.rank = rank
-        self.value = self.__rank_value(rank)
+        if suit not in _SUIT_INDEX or rank not in _RANK_INDEX:
+            raise ValueError(f'Unknown card {rank}{suit}')
+        self.code: int = _RANK_INDEX[rank] * 4 + _SUIT_INDEX[suit]
+
+    @staticmethod
+    def from_code(code: int) -> 'Card':
+        return DECK[code]
+
+    @property
+    def suit(self) -> str:
+        return SUITS[self.code & 3]
+
+    @property
+    def rank(self) -> str:
+        return RANKS[self.code >> 2]
 
-    def __rank_value(self, rank) -> int:
-        rank_value_mapping = {'J': 11, 'Q': 12, 'K': 13, 'A': 14}
-        if rank in rank_value_mapping.keys():
-            return rank_value_mapping[rank]
-        return int(rank)
+    @property
+    def value(self) -> int:
+        return (self.code >> 2) + 2
+
+    def __eq__(self, other):
+        return isinstance(other, Card) and self.code == other.code
+
+    def __hash__(self):
+        return self.code
+
+    def __repr__(self):
+        return f'Card({self.rank}{self.suit})'
 
     def to_dict(self):
-        return {"suit": self.suit, "rank": self.rank, "value": self.value}
\ No newline at end of file
+        return {"suit": self.suit, "rank": self.rank, "value": self.value}
+
+# every card of the deck allocated once, shared by all tables
+DECK: List[Card] = [Card(SUITS[code & 3], RANKS[code >> 2]) for code in range(52)]
@@ -0,0 +1,90 @@
+import time
+import zlib
+from typing import List, Optional, Tuple, Union
+from app.game.models import SUITS
+
+# WebSocket subprotocol of JSON clients that accept deflated frames, the dictionary below is part of it
+DEFLATE_SUBPROTOCOL = "poker.json.deflate"
+
+def _build_dictionary() -> bytes:
+    """
+    Preset dictionary of the JSON frames, deflate finds matches at the end of it more cheaply,
+    so the most frequent fragments come last
+    """
+    fragments: List[str] = [
+        '{"STATE_FULL":{"version":', '"state":{"seats":[', '"away":[', '"folded":[', '"last_action":',
+        '{"STATE_DELTA":{"version":', '"patch":{',
+        '{"TABLE_STATE":{"players":[', '"away_player_ids":[', '"folded_player_ids":[', '"is_game_started":',
+        '"dealer_id":', '"curr_player_id":', '"turn_request":',
+        '{"PRE_START":{"prev_dealer":', '"curr_dealer":', '"ordered_player_ids":[',
+        '{"PRE_FLOP_SB":{"sb_amount":', '{"PRE_FLOP_BB":{"bb_amount":', '{"PLAY_AGAIN":{"pot":',
+        '{"HAND_STRENGTH":{"hand":', '{"IS_READY":{"player_id":', '{"NEW_PLAYER":{"player":',
+        '{"SHOWDOWN_LOSERS":{"losers":[', '{"SHOWDOWN_WINNERS":{"winners":[{"winner":', '"won_pot":', '"hand":',
+        '{"TURN_REQUEST":{"player_bet":', '"prev_bet":', '"prev_raise":', '"options":["CALL","CHECK","RAISE","FOLD"]',
+        '"time_to_act":', '"time_bank":', '{"COMMUNITY_CARDS":{"cards":[', '"pocket_cards":[',
+        '{"LOG":"Player ', '{"POT":{"pot":', '{"TURN_RESULT":{"player":', '"action":"', '"amount":',
+        '{"TURN_HIGHLIGHT":{"prev_player":', '"curr_player":',
+    ]
+    fragments += [f'{{"suit":"{suit}","rank":"' for suit in SUITS]
+    fragments += ['","value":', '{"id":', ',"name":"', '","balance":', ',"bet":', ',"is_ready":false}']
+    return "".join(fragments).encode()
+
+DICTIONARY = _build_dictionary()
+
+class PayloadCompressor:
+    """
+    Deflates frames of at least threshold bytes with the preset dictionary, shared by the tables
+    of a process and keeping what compression cost and saved
+    """
+    def __init__(self, level: int = 6, threshold: int = 256, dictionary: bytes = DICTIONARY):
+        if not 1 <= level <= 9:
+            raise ValueError("Compression level must be between 1 and 9")
+        if threshold < 0:
+            raise ValueError("Compression threshold cannot be negative")
+        self.level = level
+        self.threshold = threshold
+        self.dictionary = dictionary
+        self.frames = 0            # frames offered for compression
+        self.compressed_frames = 0 # frames sent deflated
+        self.original_bytes = 0    # size of the deflated frames before compression
+        self.compressed_bytes = 0
+        self.seconds = 0.0         # spent compressing
+        # a broadcast is compressed once for all the connections: frame, what is sent and its original size
+        self._last: Tuple[Optional[str], Union[str, bytes], int] = (None, "", 0)
+
+    def compress(self, frame: str) -> Union[str, bytes]:
+        """
+        Deflated frame, or the frame itself when its UTF-8 form is too short or does not shrink
+        """
+        self.frames += 1
+        # a UTF-8 character takes 1 to 4 bytes
+        if len(frame) * 4 < self.threshold:
+            return frame
+        last_frame, result, size = self._last
+        if frame is not last_frame:
+            started = time.perf_counter()
+            data = frame.encode()
+            if len(data) < self.threshold:
+                result = frame
+            else:
+                compressor = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=self.dictionary)
+                compressed = compressor.compress(data) + compressor.flush()
+                result = compressed if len(compressed) < len(data) else frame
+            self.seconds += time.perf_counter() - started
+            size = len(data)
+            self._last = (frame, result, size)
+        if result is not frame:
+            self.compressed_frames += 1
+            self.original_bytes += size
+            self.compressed_bytes += len(result)
+        return result
+
+    def to_dict(self) -> dict:
+        return {"level": self.level, "threshold": self.threshold, "frames": self.frames,
+                "compressed_frames": self.compressed_frames, "original_bytes": self.original_bytes,
+                "compressed_bytes": self.compressed_bytes,
+                "saved_bytes": self.original_bytes - self.compressed_bytes, "seconds": round(self.seconds, 6)}
+
+def decompress_frame(data: bytes, dictionary: bytes = DICTIONARY) -> str:
+    decompressor = zlib.decompressobj(-zlib.MAX_WBITS, zdict=dictionary)
+    return (decompressor.decompress(data) + decompressor.flush()).decode()
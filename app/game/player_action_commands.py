@@ -42,9 +42,8 @@ class AbsPlayerActionCommands(ABC):
 
 class CallCommand(AbsPlayerActionCommands):
     async def process_turn(self) -> ProcessedTurn:
-        self.player_acting.bet += self.turn_response.amount
-        self.player_acting.balance -= self.turn_response.amount
-        self.game.pot += self.turn_response.amount
+        # a player who cannot cover the call is all-in
+        self.game.put_in_pot(self.player_acting, self.to_call)
 
         await self.broadcast_turn_result()
         return ProcessedTurn(
@@ -54,19 +53,27 @@ class CallCommand(AbsPlayerActionCommands):
 
 class RaiseCommand(AbsPlayerActionCommands):
     async def process_turn(self) -> ProcessedTurn:
-        self.player_acting.bet += self.to_call + self.turn_response.amount
-        self.player_acting.balance -= self.to_call + self.turn_response.amount
-        self.game.pot += self.to_call + self.turn_response.amount
+        raised = self.game.put_in_pot(self.player_acting, self.to_call + max(0, self.turn_response.amount)) \
+                 - self.to_call
 
         await self.broadcast_turn_result()
+        if raised <= 0:
+            # all-in for no more than the call
+            return ProcessedTurn(
+                action=PlayerAction.CALL,
+                curr_bet=self.player_acting.bet,
+                curr_raise=self.prev_raise)
+        if raised < self.turn_response.amount and raised < self.prev_raise:
+            # a short all-in raise does not lower the minimum raise
+            raised = self.prev_raise
         return ProcessedTurn(
             action=PlayerAction.RAISE,
             curr_bet=self.player_acting.bet,
-            curr_raise=self.turn_response.amount)
+            curr_raise=raised)
 
 class FoldCommand(AbsPlayerActionCommands):
     async def process_turn(self) -> ProcessedTurn:
-        self.game.folded.append(self.player_acting)
+        self.game.seats.fold(self.game.seats.seat_of(self.player_acting.id))
 
         await self.broadcast_turn_result()
         return ProcessedTurn(
@@ -0,0 +1,78 @@
+from typing import Dict, Iterable, List, NamedTuple
+
+class Pot(NamedTuple):
+    amount: float
+    level: float # contribution a player needs to be eligible
+    eligible_ids: List[int]
+
+class PotLedger:
+    """
+    Chips every player put in during the hand, the main pot and the side pots are cut from them
+    at the contribution levels of the players still in the hand
+    """
+    def __init__(self):
+        self.contributions: Dict[int, float] = {}
+
+    def add(self, player_id: int, amount: float):
+        self.contributions[player_id] = self.contributions.get(player_id, 0) + amount
+
+    @property
+    def total(self) -> float:
+        return sum(self.contributions.values())
+
+    def contribution_of(self, player_id: int) -> float:
+        return self.contributions.get(player_id, 0)
+
+    def build_pots(self, live_ids: Iterable[int]) -> List[Pot]:
+        """
+        Main pot first, every next side pot is contested by fewer players.
+        Chips of folded players count towards the pots but never make them eligible
+        """
+        live = sorted((self.contribution_of(i), i) for i in live_ids)
+        pots: List[Pot] = []
+        prev_level = 0
+        for k, (level, _) in enumerate(live):
+            if level == prev_level:
+                continue
+            amount = sum(min(c, level) - min(c, prev_level) for c in self.contributions.values())
+            pots.append(Pot(amount, level, [i for _, i in live[k:]]))
+            prev_level = level
+        # bets above the highest live contribution were made by players who folded afterwards
+        rest = sum(c - prev_level for c in self.contributions.values() if c > prev_level)
+        if rest:
+            if pots:
+                pots[-1] = pots[-1]._replace(amount=pots[-1].amount + rest)
+            else:
+                pots.append(Pot(rest, prev_level, [i for _, i in live]))
+        return pots
+
+    def award(self, live_ids: List[int], scores: Dict[int, int]) -> Dict[int, float]:
+        """
+        Splits every pot between its best eligible hands, live_ids are in seat order from the small blind
+        and odd chips of a split go to the first winner in that order.
+        Players are ranked in a single pass: going from the last side pot down to the main pot only adds
+        eligible players, so the best hand so far is simply carried over
+        """
+        pots = self.build_pots(live_ids)
+        seats = {player_id: i for i, player_id in enumerate(live_ids)}
+        by_contribution = sorted(live_ids, key=self.contribution_of, reverse=True)
+        payouts: Dict[int, float] = {}
+        best_score = None
+        best_ids: List[int] = []
+        ranked = 0
+        for pot in reversed(pots):
+            while ranked < len(by_contribution) and self.contribution_of(by_contribution[ranked]) >= pot.level:
+                player_id = by_contribution[ranked]
+                ranked += 1
+                score = scores[player_id]
+                if best_score is None or score > best_score:
+                    best_score, best_ids = score, [player_id]
+                elif score == best_score:
+                    best_ids.append(player_id)
+
+            winners = sorted(best_ids, key=seats.get)
+            share = pot.amount // len(winners)
+            remainder = pot.amount - share * len(winners)
+            for k, player_id in enumerate(winners):
+                payouts[player_id] = payouts.get(player_id, 0) + share + (remainder if k == 0 else 0)
+        return payouts
@@ -0,0 +1,132 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Tuple
+from app.game.equity import EquityTally, prepare_pockets, score_runout
+from app.game.models import Card, RANKS
+
+# file layout: header, then equities of every hand class against 1..max_opponents random hands
+# as little-endian uint16 fractions of EQUITY_SCALE, row-major by hand class
+MAGIC = b'PFEQ'
+VERSION = 1
+HEADER = struct.Struct('<4sBBH')
+EQUITY_SCALE = 65535
+HAND_CLASSES = 169
+MAX_OPPONENTS = 9
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), 'data', 'preflop_equity.bin')
+
+def hand_class_index(card_1: Card, card_2: Card) -> int:
+    """
+    Index in a 13x13 grid: pairs on the diagonal, suited hands above it, offsuit hands below
+    """
+    high = max(card_1.code >> 2, card_2.code >> 2)
+    low = min(card_1.code >> 2, card_2.code >> 2)
+    if (card_1.code & 3) == (card_2.code & 3):
+        return low * 13 + high
+    return high * 13 + low
+
+def hand_class_name(index: int) -> str:
+    row, col = divmod(index, 13)
+    if row == col:
+        return RANKS[row] + RANKS[col]
+    if row < col:
+        return RANKS[col] + RANKS[row] + 's'
+    return RANKS[row] + RANKS[col] + 'o'
+
+def hand_class_codes(index: int) -> Tuple[int, int]:
+    """
+    Card codes of one representative hand of the class
+    """
+    row, col = divmod(index, 13)
+    if row <= col:
+        return col * 4, row * 4 + (1 if row == col else 0)
+    return row * 4, col * 4 + 1
+
+class PreflopEquityTable:
+    """
+    Memory-mapped preflop all-in equities, built by running this module as a script
+    """
+    def __init__(self, path: str = DEFAULT_PATH):
+        with open(path, 'rb') as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_opponents, classes = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION or classes != HAND_CLASSES:
+            raise ValueError(f'{path} is not a preflop equity table')
+        if len(self._mmap) != HEADER.size + classes * self.max_opponents * 2:
+            raise ValueError(f'{path} is truncated')
+
+    def equity(self, card_1: Card, card_2: Card, opponents: int = 1) -> float:
+        """
+        All-in equity of the pocket cards against the given number of random hands
+        """
+        if not 1 <= opponents <= self.max_opponents:
+            raise ValueError(f'Opponents count must be between 1 and {self.max_opponents}')
+        offset = HEADER.size + (hand_class_index(card_1, card_2) * self.max_opponents + opponents - 1) * 2
+        return struct.unpack_from('<H', self._mmap, offset)[0] / EQUITY_SCALE
+
+    def close(self):
+        self._mmap.close()
+
+@lru_cache(maxsize=None)
+def get_preflop_table(path: str = DEFAULT_PATH) -> PreflopEquityTable:
+    return PreflopEquityTable(path)
+
+def simulate_hand_class(index: int, max_opponents: int, samples: int, seed: int) -> List[float]:
+    """
+    Monte Carlo equity of one hand class against 1..max_opponents random hands
+    """
+    rng = random.Random(seed * HAND_CLASSES + index)
+    hero = hand_class_codes(index)
+    deck = [code for code in range(52) if code not in hero]
+    equities = []
+    for opponents in range(1, max_opponents + 1):
+        tally = EquityTally(opponents + 1)
+        drawn = opponents * 2 + 5
+        for _ in range(samples):
+            for i in range(drawn):
+                j = i + int(rng.random() * (len(deck) - i))
+                deck[i], deck[j] = deck[j], deck[i]
+            pockets = [hero] + [deck[5 + 2 * p:7 + 2 * p] for p in range(opponents)]
+            tally.add(score_runout(deck[:5], prepare_pockets(pockets)))
+        equities.append(tally.shares[0] / tally.samples)
+    return equities
+
+def build_table(path: str, samples: int, max_opponents: int, seed: int, workers: int):
+    if workers > 1:
+        # a pool of its own, the shared one of the equity calculators is sized to the cpu count
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(simulate_hand_class, i, max_opponents, samples, seed)
+                       for i in range(HAND_CLASSES)]
+            rows = [f.result() for f in futures]
+    else:
+        rows = [simulate_hand_class(i, max_opponents, samples, seed) for i in range(HAND_CLASSES)]
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, max_opponents, HAND_CLASSES))
+        for row in rows:
+            file.write(struct.pack(f'<{max_opponents}H', *[round(e * EQUITY_SCALE) for e in row]))
+    os.replace(tmp_path, path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Builds the preflop all-in equity table')
+    parser.add_argument('--output', default=DEFAULT_PATH)
+    parser.add_argument('--samples', type=int, default=5000, help='runouts per hand class and opponents count')
+    parser.add_argument('--max-opponents', type=int, default=MAX_OPPONENTS)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    build_table(args.output, args.samples, args.max_opponents, args.seed, args.workers)
+    print(f'Wrote {args.output} in {time.perf_counter() - started:.1f}s')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+from app.game.game import AbsGameHandler, ConcreteGameBuilder, Game
+from app.game.game_schema import *
+from app.game.hand_history import HandRecord, HandAction, HandPayout, read_hands
+from app.game.models import Player
+from app.game.table import Table
+
+class ReplayDivergenceError(RuntimeError):
+    """
+    The replayed game asked for something else than what was recorded
+    """
+
+class ReplayState:
+    """
+    Table as it was before the next replayed action
+    """
+    def __init__(self, game: Game, next_action: Optional[HandAction], actions_played: int):
+        self.actions_played = actions_played
+        self.next_action = next_action
+        self.pot = game.pot
+        self.board = [c.code for c in game.table.community_cards]
+        self.balances = {p.id: p.balance for p in game.players}
+        self.bets = {p.id: p.bet for p in game.players}
+        self.folded_ids = game.seats.ids(game.seats.folded)
+
+class ScriptedGameHandler(AbsGameHandler):
+    """
+    Implementation for Bridge pattern that answers turns with the recorded actions
+    """
+    def __init__(self, players: List[Player], sb_amount: float, bb_amount: float, actions: List[HandAction]):
+        super().__init__(players, [], sb_amount, bb_amount)
+        self.actions = actions
+        self.position = 0
+        self.pause_at: Optional[int] = None
+        self.paused = asyncio.Event()
+        self.resumed = asyncio.Event()
+        self.payouts: List[HandPayout] = []
+
+    async def broadcast(self, game_phase: GamePhase, abs_game_phase_args: AbsGamePhaseArgs) -> None:
+        if game_phase == GamePhase.SHOWDOWN_WINNERS:
+            self.payouts = [HandPayout(w.winner.id, w.won_pot) for w in abs_game_phase_args.winners]
+
+    async def send_personal(self, game_phase: GamePhase, player_id: int,
+                            abs_game_phase_args: AbsGamePhaseArgs) -> None:
+        pass
+
+    async def turn(self, player: Player, turn_request_args: TurnRequestArgs) -> TurnResponse:
+        if self.position == self.pause_at:
+            self.resumed.clear()
+            self.paused.set()
+            await self.resumed.wait()
+
+        if self.position >= len(self.actions):
+            raise ReplayDivergenceError(f"Player {player.id} has to act after the last recorded action")
+        action = self.actions[self.position]
+        if action.player_id != player.id:
+            raise ReplayDivergenceError(f"Action {self.position} was recorded for player {action.player_id}, "
+                                        f"player {player.id} is asked to act")
+        self.position += 1
+
+        match action.action:
+            case PlayerAction.CALL:
+                return TurnResponse(action=action.action, amount=action.bet - turn_request_args.player_bet)
+            case PlayerAction.RAISE:
+                return TurnResponse(action=action.action, amount=action.bet - turn_request_args.prev_bet)
+            case _:
+                return TurnResponse(action=action.action, amount=0)
+
+class HandReplay:
+    """
+    Re-executes a recorded hand through the real game states, can pause before any action
+    """
+    def __init__(self, record: HandRecord):
+        if record.deck_seed is None:
+            raise ValueError("Hand was recorded without a deck seed and cannot be replayed")
+        self.record = record
+        table = Table()
+        for player in record.players:
+            table.add_player(Player(player.id, player.name, player.balance))
+        self.game_handler = ScriptedGameHandler(table.players, record.sb_amount, record.bb_amount, record.actions)
+        game_builder = ConcreteGameBuilder()
+        game_builder.set_game_handler(self.game_handler)
+        game_builder.set_table(table)
+        game_builder.set_small_blind_amount(record.sb_amount)
+        game_builder.set_big_blind_amount(record.bb_amount)
+        game_builder.set_min_raise_amount(record.sb_amount)
+        self.game = game_builder.get_built_game()
+        # start_game moves the button by one seat
+        self.game.curr_dealer_pos = record.dealer_pos - 1
+        self._game_task: Optional[asyncio.Task] = None
+
+    async def step_to(self, action_index: int) -> ReplayState:
+        """
+        Plays until the action with the given index is about to be made
+        """
+        if not 0 <= action_index <= len(self.record.actions):
+            raise ValueError(f"Action index must be between 0 and {len(self.record.actions)}")
+        if action_index < self.game_handler.position:
+            raise ValueError("Replay cannot go back, start a new one")
+
+        handler = self.game_handler
+        handler.pause_at = action_index
+        handler.paused.clear()
+        if self._game_task is None:
+            self._game_task = asyncio.create_task(self.game.start_game(self.record.deck_seed))
+        else:
+            handler.resumed.set()
+
+        paused = asyncio.create_task(handler.paused.wait())
+        await asyncio.wait([paused, self._game_task], return_when=asyncio.FIRST_COMPLETED)
+        paused.cancel()
+        if self._game_task.done():
+            self._game_task.result()
+        next_action = self.record.actions[handler.position] if handler.position < len(self.record.actions) else None
+        return ReplayState(self.game, next_action, handler.position)
+
+    async def finish(self) -> 'ReplayResult':
+        """
+        Plays the rest of the hand and compares it with the record
+        """
+        self.game_handler.pause_at = None
+        if self._game_task is None:
+            await self.game.start_game(self.record.deck_seed)
+        else:
+            self.game_handler.resumed.set()
+            await self._game_task
+        return ReplayResult(self.record, self.game, self.game_handler)
+
+class ReplayResult:
+    def __init__(self, record: HandRecord, game: Game, game_handler: ScriptedGameHandler):
+        self.record = record
+        self.payouts = game_handler.payouts
+        self.balances: Dict[int, float] = {p.id: p.balance for p in game.players}
+        self.board = [c.code for c in game.table.community_cards]
+        self.pocket_cards = {p.id: [c.code for c in p.pocket_cards] for p in game.players}
+        self.actions_played = game_handler.position
+
+    @property
+    def mismatches(self) -> List[str]:
+        mismatches = []
+        if self.actions_played != len(self.record.actions):
+            mismatches.append(f"{self.actions_played} of {len(self.record.actions)} actions played")
+        if self.board != self.record.board:
+            mismatches.append(f"board {self.board} != {self.record.board}")
+        for player in self.record.players:
+            if player.pocket_cards and self.pocket_cards[player.id] != player.pocket_cards:
+                mismatches.append(f"pocket cards of {player.id} {self.pocket_cards[player.id]} "
+                                  f"!= {player.pocket_cards}")
+        if self.payouts != self.record.payouts:
+            mismatches.append(f"payouts {self.payouts} != {self.record.payouts}")
+        return mismatches
+
+    @property
+    def matches(self) -> bool:
+        return not self.mismatches
+
+async def replay_hand(record: HandRecord) -> ReplayResult:
+    return await HandReplay(record).finish()
+
+async def replay_log(path: str, hand_id: Optional[int] = None, step: Optional[int] = None):
+    replayed, skipped, diverged = 0, 0, 0
+    started = time.perf_counter()
+    for record in read_hands(path):
+        if hand_id is not None and record.hand_id != hand_id:
+            continue
+        if record.deck_seed is None:
+            skipped += 1
+            continue
+        replay = HandReplay(record)
+        if step is not None:
+            state = await replay.step_to(min(step, len(record.actions)))
+            print(f"Hand {record.hand_id} before action {state.actions_played}: pot {state.pot}, "
+                  f"board {state.board}, bets {state.bets}, next {state.next_action}")
+        try:
+            result = await replay.finish()
+            mismatches = result.mismatches
+        except ReplayDivergenceError as e:
+            mismatches = [str(e)]
+        replayed += 1
+        if mismatches:
+            diverged += 1
+            print(f"Hand {record.hand_id} diverged: {'; '.join(mismatches)}")
+    seconds = time.perf_counter() - started
+    print(f"{replayed} hands replayed in {seconds:.2f}s ({replayed / seconds if seconds else 0:.0f} hands/s), "
+          f"{diverged} diverged, {skipped} without a deck seed skipped")
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays recorded hands through the game states')
+    parser.add_argument('path')
+    parser.add_argument('--hand-id', type=int, help='replay only this hand')
+    parser.add_argument('--step', type=int, help='print the table before this action of every replayed hand')
+    args = parser.parse_args()
+    asyncio.run(replay_log(args.path, args.hand_id, args.step))
+
+if __name__ == '__main__':
+    main()
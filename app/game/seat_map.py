@@ -0,0 +1,143 @@
+from typing import Dict, Iterable, Iterator, List, Optional
+from app.game.models import Player
+
+class SeatMap:
+    """
+    Players by seat and by id. Folded and all-in players are bitsets over the seats and the seats that can still
+    act are linked in a ring in action order, so moving the action to the next player skips nobody one by one
+    """
+    def __init__(self, players: Iterable[Player] = ()):
+        self.players: List[Player] = []
+        self._seats: Dict[int, int] = {}
+        for player in players:
+            self._seats[player.id] = len(self.players)
+            self.players.append(player)
+        self.start_hand()
+
+    def start_hand(self):
+        """
+        Every seat is back in the hand
+        """
+        count = len(self.players)
+        self.folded: int = 0 # bit per seat
+        self.all_in: int = 0
+        self._can_act: int = (1 << count) - 1
+        self._next: List[int] = [(seat + 1) % count for seat in range(count)]
+        self._prev: List[int] = [(seat - 1) % count for seat in range(count)]
+
+    def __len__(self) -> int:
+        return len(self.players)
+
+    def __iter__(self) -> Iterator[Player]:
+        return iter(self.players)
+
+    def __contains__(self, player_id: int) -> bool:
+        return player_id in self._seats
+
+    def get(self, player_id: int) -> Optional[Player]:
+        seat = self._seats.get(player_id)
+        return None if seat is None else self.players[seat]
+
+    def seat_of(self, player_id: int) -> int:
+        return self._seats[player_id]
+
+    def add(self, player: Player):
+        if player.id in self._seats:
+            raise ValueError(f'Player {player.id} is already seated')
+        self._seats[player.id] = len(self.players)
+        self.players.append(player)
+        self.start_hand()
+
+    def remove(self, player_id: int) -> Optional[Player]:
+        """
+        Seats after the removed one move up, seats change between hands so the hand state is reset
+        """
+        seat = self._seats.pop(player_id, None)
+        if seat is None:
+            return None
+        player = self.players.pop(seat)
+        for moved_seat in range(seat, len(self.players)):
+            self._seats[self.players[moved_seat].id] = moved_seat
+        self.start_hand()
+        return player
+
+    def clear(self):
+        self.players.clear()
+        self._seats.clear()
+        self.start_hand()
+
+    def fold(self, seat: int):
+        self.folded |= 1 << seat
+        self._unlink(seat)
+
+    def set_all_in(self, seat: int):
+        self.all_in |= 1 << seat
+        self._unlink(seat)
+
+    def is_folded(self, seat: int) -> bool:
+        return bool(self.folded >> seat & 1)
+
+    @property
+    def active_bits(self) -> int:
+        return ((1 << len(self.players)) - 1) & ~self.folded
+
+    @property
+    def active_count(self) -> int:
+        return self.active_bits.bit_count()
+
+    @property
+    def can_act_bits(self) -> int:
+        """
+        Players still in the hand with chips behind
+        """
+        return self._can_act
+
+    @property
+    def can_act_count(self) -> int:
+        return self._can_act.bit_count()
+
+    def active_players(self, start: int = 0) -> List[Player]:
+        """
+        Players still in the hand in seat order from the start seat on
+        """
+        count = len(self.players)
+        seats = ((start + i) % count for i in range(count))
+        return [self.players[seat] for seat in seats if not self.folded >> seat & 1]
+
+    def folded_players(self) -> List[Player]:
+        return [p for seat, p in enumerate(self.players) if self.folded >> seat & 1]
+
+    def ids(self, bits: int) -> List[int]:
+        return [p.id for seat, p in enumerate(self.players) if bits >> seat & 1]
+
+    def bits(self, player_ids: Iterable[int]) -> int:
+        bits = 0
+        for player_id in player_ids:
+            bits |= 1 << self._seats[player_id]
+        return bits
+
+    def next_to_act(self, seat: int) -> int:
+        """
+        First seat after the given one whose player can act, the seat itself when nobody can
+        """
+        if not self._can_act:
+            return seat
+        # an unlinked seat still points to the seat that followed it, that one is either linked or leads further
+        seat = self._next[seat]
+        while not self._can_act >> seat & 1:
+            seat = self._next[seat]
+        return seat
+
+    def first_to_act(self, seat: int) -> int:
+        """
+        The given seat if its player can act, the next one that can otherwise
+        """
+        return seat if self._can_act >> seat & 1 else self.next_to_act(seat)
+
+    def _unlink(self, seat: int):
+        if not self._can_act >> seat & 1:
+            return
+        self._can_act &= ~(1 << seat)
+        prev_seat, next_seat = self._prev[seat], self._next[seat]
+        self._next[prev_seat] = next_seat
+        self._prev[next_seat] = prev_seat
@@ -0,0 +1,299 @@
+import argparse
+import asyncio
+import random
+import time
+import tracemalloc
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Set
+from app.game.equity import EquityTally, prepare_pockets, score_runout
+from app.game.game import AbsGameHandler, ConcreteGameBuilder, Game
+from app.game.game_schema import *
+from app.game.game_states import AbsGameState
+from app.game.game_serializer import encode_event
+from app.game.hand_history import HandHistoryWriter, FsyncPolicy
+from app.game.models import Player, Card
+from app.game.preflop_table import get_preflop_table
+from app.game.table import Table
+
+class BotView:
+    """
+    What a simulated player knows when it has to act
+    """
+    def __init__(self, player: Player, board: List[Card], pot: float, opponents: int):
+        self.player = player
+        self.board = board
+        self.pot = pot
+        self.opponents = opponents
+
+class AbsBotStrategy(ABC):
+    """
+    Strategy pattern for decisions of simulated players
+    """
+    @abstractmethod
+    def decide(self, view: BotView, turn_request_args: TurnRequestArgs) -> TurnResponse:
+        pass
+
+    @staticmethod
+    def _check_or_fold(turn_request_args: TurnRequestArgs) -> TurnResponse:
+        if PlayerAction.CHECK in turn_request_args.options:
+            return TurnResponse(action=PlayerAction.CHECK, amount=0)
+        return TurnResponse(action=PlayerAction.FOLD, amount=0)
+
+    @staticmethod
+    def _call(view: BotView, turn_request_args: TurnRequestArgs) -> TurnResponse:
+        to_call = turn_request_args.prev_bet - turn_request_args.player_bet
+        if PlayerAction.CALL not in turn_request_args.options:
+            return AbsBotStrategy._check_or_fold(turn_request_args)
+        # a short stack calls all-in
+        return TurnResponse(action=PlayerAction.CALL, amount=min(to_call, view.player.balance))
+
+    @staticmethod
+    def _raise(view: BotView, turn_request_args: TurnRequestArgs, amount: float) -> TurnResponse:
+        to_call = turn_request_args.prev_bet - turn_request_args.player_bet
+        amount = max(amount, turn_request_args.prev_raise)
+        if PlayerAction.RAISE not in turn_request_args.options or to_call >= view.player.balance:
+            return AbsBotStrategy._call(view, turn_request_args)
+        return TurnResponse(action=PlayerAction.RAISE, amount=min(amount, view.player.balance - to_call))
+
+class RandomBot(AbsBotStrategy):
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def decide(self, view: BotView, turn_request_args: TurnRequestArgs) -> TurnResponse:
+        match self.rng.choice(turn_request_args.options):
+            case PlayerAction.RAISE:
+                return self._raise(view, turn_request_args, turn_request_args.prev_raise * self.rng.randint(1, 3))
+            case PlayerAction.CALL:
+                return self._call(view, turn_request_args)
+            case action:
+                return TurnResponse(action=action, amount=0)
+
+class CallingStationBot(AbsBotStrategy):
+    def decide(self, view: BotView, turn_request_args: TurnRequestArgs) -> TurnResponse:
+        return self._call(view, turn_request_args)
+
+class EquityBot(AbsBotStrategy):
+    """
+    Compares its equity against random hands with the pot odds, raises with strong hands
+    """
+    def __init__(self, rng: random.Random, samples: int = 200, raise_equity: float = 0.6):
+        self.rng = rng
+        self.samples = samples
+        self.raise_equity = raise_equity
+
+    def equity(self, view: BotView) -> float:
+        pocket = [c.code for c in view.player.pocket_cards]
+        opponents = max(view.opponents, 1)
+        if not view.board:
+            table = get_preflop_table()
+            if opponents <= table.max_opponents:
+                return table.equity(*view.player.pocket_cards, opponents=opponents)
+
+        board = [c.code for c in view.board]
+        used = set(pocket + board)
+        deck = [code for code in range(52) if code not in used]
+        missing = 5 - len(board)
+        drawn = missing + 2 * opponents
+        tally = EquityTally(opponents + 1)
+        rand = self.rng.random
+        for _ in range(self.samples):
+            for i in range(drawn):
+                j = i + int(rand() * (len(deck) - i))
+                deck[i], deck[j] = deck[j], deck[i]
+            pockets = [pocket] + [deck[missing + 2 * p:missing + 2 * p + 2] for p in range(opponents)]
+            tally.add(score_runout(board + deck[:missing], prepare_pockets(pockets)))
+        return tally.shares[0] / tally.samples
+
+    def decide(self, view: BotView, turn_request_args: TurnRequestArgs) -> TurnResponse:
+        equity = self.equity(view)
+        to_call = turn_request_args.prev_bet - turn_request_args.player_bet
+        if equity >= self.raise_equity:
+            return self._raise(view, turn_request_args, max(turn_request_args.prev_raise, view.pot // 2))
+        if to_call > 0 and equity >= to_call / (view.pot + to_call):
+            return self._call(view, turn_request_args)
+        return self._check_or_fold(turn_request_args)
+
+STRATEGIES = {
+    "random": lambda rng: RandomBot(rng),
+    "calling": lambda rng: CallingStationBot(),
+    "equity": lambda rng: EquityBot(rng),
+}
+
+class SimulatedGameHandler(AbsGameHandler):
+    """
+    In-memory implementation for Bridge pattern, turns are answered by bot strategies
+    """
+    def __init__(self, players: List[Player], sb_amount: float, bb_amount: float,
+                 strategies: Dict[int, AbsBotStrategy], encode_events: bool = False):
+        super().__init__(players, [], sb_amount, bb_amount)
+        self.strategies = strategies
+        self.encode_events = encode_events
+        self.events_count = 0
+        self.decision_seconds = 0.0 # spent by the bots, included in the state times
+        self.board: List[Card] = []
+        self.pot: float = 0
+        self.folded_ids: Set[int] = set()
+
+    async def broadcast(self, game_phase: GamePhase, abs_game_phase_args: AbsGamePhaseArgs) -> None:
+        self.events_count += 1
+        if self.encode_events:
+            encode_event(game_phase, abs_game_phase_args)
+        match game_phase:
+            case GamePhase.PRE_START:
+                self.board = []
+                self.pot = 0
+                self.folded_ids = set()
+            case GamePhase.COMMUNITY_CARDS:
+                self.board = list(abs_game_phase_args.cards)
+            case GamePhase.POT:
+                self.pot = abs_game_phase_args.pot
+            case GamePhase.TURN_RESULT if abs_game_phase_args.action == PlayerAction.FOLD:
+                self.folded_ids.add(abs_game_phase_args.player.id)
+
+    async def send_personal(self, game_phase: GamePhase, player_id: int,
+                            abs_game_phase_args: AbsGamePhaseArgs) -> None:
+        self.events_count += 1
+        if self.encode_events:
+            encode_event(game_phase, abs_game_phase_args)
+
+    async def turn(self, player: Player, turn_request_args: TurnRequestArgs) -> TurnResponse:
+        opponents = len([p for p in self.players if p.id != player.id and p.id not in self.folded_ids])
+        view = BotView(player, self.board, self.pot, opponents)
+        started = time.perf_counter()
+        turn_response = self.strategies[player.id].decide(view, turn_request_args)
+        self.decision_seconds += time.perf_counter() - started
+        return turn_response
+
+class TimedGame(Game):
+    """
+    Game that adds up how long every state ran
+    """
+    def __init__(self):
+        super().__init__()
+        self.state_times: Dict[str, float] = {}
+        self._state_started: Optional[float] = None
+
+    def set_game_state(self, game_state: AbsGameState):
+        self._close_state()
+        super().set_game_state(game_state)
+        self._state_started = time.perf_counter()
+
+    async def start_game(self, deck_seed: Optional[int] = None):
+        await super().start_game(deck_seed)
+        self._close_state()
+
+    def _close_state(self):
+        if self._state_started is not None:
+            name = type(self.game_state).__name__
+            self.state_times[name] = self.state_times.get(name, 0) + time.perf_counter() - self._state_started
+            self._state_started = None
+
+class SimulatedGameBuilder(ConcreteGameBuilder):
+    def reset(self):
+        self._game = TimedGame()
+
+class SimulationReport:
+    def __init__(self, hands: int, seconds: float, events: int, rebuys: int, state_times: Dict[str, float],
+                 decision_seconds: float, peak_memory: Optional[int] = None,
+                 top_allocations: Optional[List[str]] = None):
+        self.hands = hands
+        self.seconds = seconds
+        self.events = events
+        self.rebuys = rebuys
+        self.state_times = state_times
+        self.decision_seconds = decision_seconds
+        self.peak_memory = peak_memory
+        self.top_allocations = top_allocations or []
+
+    @property
+    def hands_per_second(self) -> float:
+        return self.hands / self.seconds if self.seconds else 0
+
+    def format(self) -> str:
+        lines = [f"{self.hands} hands in {self.seconds:.2f}s: {self.hands_per_second:.0f} hands/s, "
+                 f"{self.events} events, {self.rebuys} rebuys"]
+        for name, seconds in sorted(self.state_times.items(), key=lambda item: -item[1]):
+            lines.append(f"  {name:<14} {seconds:8.3f}s {seconds / self.hands * 1e6:9.1f} us/hand")
+        lines.append(f"  {'bot decisions':<14} {self.decision_seconds:8.3f}s "
+                     f"{self.decision_seconds / self.hands * 1e6:9.1f} us/hand (part of the states above)")
+        if self.peak_memory is not None:
+            lines.append(f"Peak traced memory: {self.peak_memory / 1024:.1f} KiB")
+            lines.extend("  " + line for line in self.top_allocations)
+        return "\n".join(lines)
+
+async def simulate(hands: int, strategies: List[str], seed: int = 0, balance: float = 1000,
+                   sb_amount: float = 5, bb_amount: float = 10, encode_events: bool = False,
+                   trace_allocations: bool = False, history_path: Optional[str] = None) -> SimulationReport:
+    """
+    Plays complete hands without any connection and checks that no chips are created or lost
+    """
+    if len(strategies) < 2:
+        raise ValueError("Simulation needs at least two players")
+    if any(s not in STRATEGIES for s in strategies):
+        raise ValueError(f"Unknown strategy, expected one of {list(STRATEGIES)}")
+
+    # bots and deck shuffles draw from it, the global generator of the process is left alone
+    rng = random.Random(seed)
+    table = Table()
+    for i, _ in enumerate(strategies, start=1):
+        table.add_player(Player(i, f"bot{i}", balance))
+    game_handler = SimulatedGameHandler(table.players, sb_amount, bb_amount,
+                                        {i: STRATEGIES[s](rng) for i, s in enumerate(strategies, start=1)},
+                                        encode_events)
+    game_builder = SimulatedGameBuilder()
+    game_builder.set_game_handler(game_handler)
+    game_builder.set_table(table)
+    game_builder.set_small_blind_amount(sb_amount)
+    game_builder.set_big_blind_amount(bb_amount)
+    game_builder.set_min_raise_amount(sb_amount)
+    hand_history = None
+    if history_path is not None:
+        hand_history = HandHistoryWriter(history_path, FsyncPolicy.NEVER)
+        game_builder.set_hand_history(hand_history, "simulation")
+    game: TimedGame = game_builder.get_built_game()
+
+    if trace_allocations:
+        tracemalloc.start()
+    rebuys = 0
+    started = time.perf_counter()
+    for hand in range(hands):
+        for player in table.players:
+            if player.balance < bb_amount:
+                player.balance = balance
+                rebuys += 1
+        chips = sum(p.balance for p in table.players)
+        await game.start_game(rng.getrandbits(63))
+        if sum(p.balance for p in table.players) != chips:
+            raise RuntimeError(f"Chips are not conserved in hand {hand}: {chips} before, "
+                               f"{sum(p.balance for p in table.players)} after")
+    if hand_history is not None:
+        hand_history.close()
+    seconds = time.perf_counter() - started
+
+    peak_memory, top_allocations = None, None
+    if trace_allocations:
+        _, peak_memory = tracemalloc.get_traced_memory()
+        statistics = tracemalloc.take_snapshot().statistics('lineno')
+        top_allocations = [str(stat) for stat in statistics[:5]]
+        tracemalloc.stop()
+    return SimulationReport(hands, seconds, game_handler.events_count, rebuys, game.state_times,
+                            game_handler.decision_seconds, peak_memory, top_allocations)
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays bot games in memory and reports engine throughput')
+    parser.add_argument('--hands', type=int, default=10000)
+    parser.add_argument('--bots', nargs='+', default=['random', 'calling', 'equity', 'random'],
+                        choices=list(STRATEGIES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--encode', action='store_true', help='encode every event like the server does')
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help='trace allocations with tracemalloc, slows the run down')
+    parser.add_argument('--history', help='append the played hands to this hand history log')
+    args = parser.parse_args()
+
+    report = asyncio.run(simulate(args.hands, args.bots, args.seed, encode_events=args.encode,
+                                  trace_allocations=args.trace_allocations, history_path=args.history))
+    print(report.format())
+
+if __name__ == '__main__':
+    main()
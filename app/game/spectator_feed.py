@@ -0,0 +1,99 @@
+import asyncio
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+from app.game.game_schema import GamePhase
+
+# events of a single player, spectators never get them whoever they were sent to
+PRIVATE_PHASES = (GamePhase.POCKET_CARDS, GamePhase.HAND_STRENGTH, GamePhase.TURN_REQUEST, GamePhase.TABLE_STATE)
+_PRIVATE_PREFIXES = tuple(f'{{"{phase.value}"' for phase in PRIVATE_PHASES)
+_HAND_START_PREFIX = f'{{"{GamePhase.PRE_START.value}"'
+
+class SpectatorFeed:
+    """
+    Public events of one table for its spectators, delayed and kept in a ring buffer shared by all of them.
+    Publishing is one append whatever the number of spectators, each of them reads the buffer from its own task.
+    The seats are captured with every hand start and released with it, spectators never see live stacks
+    """
+    def __init__(self, delay: float = 30, capacity: int = 4096, interval: float = 0.25,
+                 seats: Optional[Callable[[], List[str]]] = None):
+        if delay < 0:
+            raise ValueError("Spectator delay cannot be negative")
+        if capacity <= 0:
+            raise ValueError("Spectator feed capacity must be positive")
+        self.delay = delay
+        self.capacity = capacity
+        self.interval = interval # frames are released at most this often, a burst wakes the spectators once
+        self.seats = seats # frames of the current seats
+        # release time, frame and the seat frames captured when the frame starts a hand
+        self._frames: List[Optional[Tuple[float, str, Optional[List[str]]]]] = [None] * capacity
+        self.hand_seats: List[str] = [] # seats at the start of the latest released hand
+        self.published = 0  # sequence of the next frame
+        self.released = 0   # frames before this sequence are visible to spectators
+        self.hand_start = 0 # first frame of the latest released hand, new spectators start from it
+        self.dropped_frames = 0
+        self.spectators = 0
+        self._released_event = asyncio.Event()
+        self._release_timer: Optional[asyncio.TimerHandle] = None
+
+    def publish(self, frame: str):
+        if frame.startswith(_PRIVATE_PREFIXES):
+            return
+        loop = asyncio.get_running_loop()
+        seats = None
+        if self.seats is not None and frame.startswith(_HAND_START_PREFIX):
+            seats = self.seats()
+        self._frames[self.published % self.capacity] = (loop.time() + self.delay, frame, seats)
+        self.published += 1
+        if self._release_timer is None:
+            self._release_timer = loop.call_later(self.delay, self._release)
+
+    def _release(self):
+        self._release_timer = None
+        if self.published - self.released > self.capacity:
+            # more frames were published within the delay than the buffer holds
+            self.dropped_frames += self.published - self.capacity - self.released
+            self.released = self.published - self.capacity
+        now = asyncio.get_running_loop().time()
+        released = self.released
+        while self.released < self.published:
+            release_at, frame, seats = self._frames[self.released % self.capacity]
+            if release_at > now:
+                break
+            if frame.startswith(_HAND_START_PREFIX):
+                self.hand_start = self.released
+                self.hand_seats = seats or []
+            self.released += 1
+        if self.released != released:
+            self._released_event.set()
+            self._released_event = asyncio.Event()
+        if self.released < self.published:
+            release_at = self._frames[self.released % self.capacity][0]
+            self._release_timer = asyncio.get_running_loop().call_later(max(release_at - now, self.interval),
+                                                                        self._release)
+
+    def close(self):
+        if self._release_timer is not None:
+            self._release_timer.cancel()
+            self._release_timer = None
+
+    async def follow(self) -> AsyncIterator[List[str]]:
+        """
+        Seats and released frames from the start of the latest hand on, then the frames of every release.
+        A spectator falling behind by more than the buffer skips the frames it lost
+        """
+        cursor = self.hand_start
+        seats = self.hand_seats
+        self.spectators += 1
+        try:
+            while True:
+                if cursor >= self.released:
+                    await self._released_event.wait()
+                    continue
+                cursor = max(cursor, self.published - self.capacity)
+                frames = [self._frames[i % self.capacity][1] for i in range(cursor, self.released)]
+                cursor = self.released
+                if seats:
+                    frames = seats + frames
+                    seats = None
+                yield frames
+        finally:
+            self.spectators -= 1
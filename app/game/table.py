@@ -1,36 +1,67 @@
 import random
-from typing import List
-from app.game.models import Player, Card
+from typing import List, Optional
+from app.game.models import Player, Card, DECK
+from app.game.seat_map import SeatMap
 
 class Table:
     def __init__(self):
-        self.players: List[Player] = []
+        self.seats: SeatMap = SeatMap()
         self.community_cards: List[Card] = []
 
-        self.__deck: List[Card] = []
-        self.__suits = ['♥️', '♦️', '♠️', '♣️']
-        self.__ranks = ['A', 'K', 'Q', 'J', '10', '9', '8', '7', '6', '5', '4', '3', '2']
+        # deck is allocated once and reshuffled in place, dealt cards are tracked by position
+        self.__deck: List[Card] = list(DECK)
+        self.__deck_pos: int = 0
         self.reset_deck()
 
-    def reset_deck(self):
-        self.__deck = [Card(s, r) for s in self.__suits for r in self.__ranks]
-        random.shuffle(self.__deck)
+    def reset_deck(self, seed: Optional[int] = None):
+        """
+        With a seed the deck order is reproducible, the shuffle starts from the same card order every time
+        """
+        if seed is None:
+            random.shuffle(self.__deck)
+        else:
+            self.__deck[:] = DECK
+            random.Random(seed).shuffle(self.__deck)
+        self.__deck_pos = 0
+
+    @property
+    def deck_pos(self) -> int:
+        return self.__deck_pos
+
+    def restore_deck(self, seed: int, deck_pos: int):
+        """
+        Deck of a seeded hand with deck_pos cards already dealt
+        """
+        if not 0 <= deck_pos <= len(self.__deck):
+            raise ValueError(f"Deck position must be between 0 and {len(self.__deck)}")
+        self.reset_deck(seed)
+        self.__deck_pos = deck_pos
 
     def get_cards(self, count)->List[Card]:
-        if len(self.__deck) < count:
+        if len(self.__deck) - self.__deck_pos < count:
             return []
-        cards = self.__deck[:count]
-        self.__deck = self.__deck[count:]
+        cards = self.__deck[self.__deck_pos:self.__deck_pos + count]
+        self.__deck_pos += count
         return cards
 
+    @property
+    def players(self) -> List[Player]:
+        """
+        Seated players in seat order, the list is changed in place when seats change
+        """
+        return self.seats.players
+
+    def get_player(self, id: int) -> Optional[Player]:
+        return self.seats.get(id)
+
     def add_player(self, player: Player):
         if player.id <= 0:
             raise ValueError('Player id must be positive')
         if player.name is None or player.name == "":
             raise ValueError('Player name cannot be empty')
-        self.players.append(player)
+        self.seats.add(player)
 
     def remove_player(self, id: int):
         if id <= 0:
             raise ValueError('Player id must be positive')
-        self.players = [p for p in self.players if p.id != id]
\ No newline at end of file
+        self.seats.remove(id)
\ No newline at end of file
@@ -0,0 +1,325 @@
+import asyncio
+import fcntl
+import itertools
+import json
+import logging
+import os
+import struct
+import uuid
+import zlib
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, IO, List, Optional, Tuple
+from starlette.websockets import WebSocket, WebSocketDisconnect
+from app.game.connection_manager import ClientConnection
+
+logger = logging.getLogger(__name__)
+
+MessageHandler = Callable[[dict], Awaitable[Optional[dict]]]
+
+class AbsMessageBus(ABC):
+    """
+    Bridge between worker processes, every worker receives the messages addressed to its index
+    Handlers are awaited in arrival order, so they must not block
+    """
+    def __init__(self, worker_index: int):
+        self.worker_index = worker_index
+        self.handler: Optional[MessageHandler] = None
+        self._replies: Dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+
+    def set_handler(self, handler: MessageHandler):
+        self.handler = handler
+
+    @abstractmethod
+    async def start(self):
+        pass
+
+    @abstractmethod
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    async def _deliver(self, worker: int, message: dict):
+        pass
+
+    async def publish(self, worker: int, message: dict):
+        await self._deliver(worker, message)
+
+    async def request(self, worker: int, message: dict, timeout: float = 5) -> Optional[dict]:
+        """
+        Sends a message and waits for the reply of the other worker's handler
+        """
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._replies[request_id] = future
+        try:
+            await self._deliver(worker, {**message, "request_id": request_id, "reply_to": self.worker_index})
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._replies.pop(request_id, None)
+
+    async def _on_message(self, message: dict):
+        if message.get("type") == "reply":
+            future = self._replies.get(message["request_id"])
+            if future is not None and not future.done():
+                future.set_result(message["body"])
+            return
+
+        reply = None
+        try:
+            reply = await self.handler(message)
+        except Exception as e:
+            logger.exception(f"Error handling bus message {message.get('type')}: {e}")
+        if "request_id" in message:
+            await self._deliver(message["reply_to"], {"type": "reply", "request_id": message["request_id"],
+                                                      "body": reply})
+
+class LocalMessageHub:
+    """
+    In-process stand-in for a broker, connects the LocalMessageBus of every simulated worker
+    """
+    def __init__(self):
+        self.buses: Dict[int, 'LocalMessageBus'] = {}
+
+class LocalMessageBus(AbsMessageBus):
+    def __init__(self, worker_index: int, hub: LocalMessageHub):
+        super().__init__(worker_index)
+        self.hub = hub
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._reader_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self.hub.buses[self.worker_index] = self
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def stop(self):
+        self.hub.buses.pop(self.worker_index, None)
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+    async def _deliver(self, worker: int, message: dict):
+        # messages are copied through JSON like they would be on a real transport
+        self.hub.buses[worker]._queue.put_nowait(json.dumps(message))
+
+    async def _read_loop(self):
+        while True:
+            await self._on_message(json.loads(await self._queue.get()))
+
+class UnixSocketMessageBus(AbsMessageBus):
+    """
+    Every worker listens on its own Unix socket, messages are length-prefixed JSON
+    """
+    HEADER = struct.Struct('>I')
+
+    def __init__(self, worker_index: int, socket_dir: str):
+        super().__init__(worker_index)
+        self.socket_dir = socket_dir
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def socket_path(self, worker: int) -> str:
+        return os.path.join(self.socket_dir, f'worker-{worker}.sock')
+
+    async def start(self):
+        path = self.socket_path(self.worker_index)
+        if os.path.exists(path):
+            os.unlink(path)
+        self._server = await asyncio.start_unix_server(self._serve, path)
+
+    async def stop(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                (length,) = self.HEADER.unpack(await reader.readexactly(self.HEADER.size))
+                await self._on_message(json.loads(await reader.readexactly(length)))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _deliver(self, worker: int, message: dict):
+        body = json.dumps(message).encode()
+        lock = self._locks.setdefault(worker, asyncio.Lock())
+        async with lock:
+            for attempt in range(2):
+                try:
+                    writer = self._writers.get(worker)
+                    if writer is None or writer.is_closing():
+                        _, writer = await asyncio.open_unix_connection(self.socket_path(worker))
+                        self._writers[worker] = writer
+                    writer.write(self.HEADER.pack(len(body)) + body)
+                    await writer.drain()
+                    return
+                except (ConnectionError, FileNotFoundError):
+                    # the other worker restarted, reconnect once
+                    self._writers.pop(worker, None)
+                    if attempt == 1:
+                        raise
+
+def claim_worker_index(lock_dir: str, worker_count: int) -> Tuple[int, IO]:
+    """
+    Every uvicorn worker runs the same app, the first free lock decides its index
+    Returned lock file must stay open for the lifetime of the process
+    """
+    os.makedirs(lock_dir, exist_ok=True)
+    for index in range(worker_count):
+        lock_file = open(os.path.join(lock_dir, f'worker-{index}.lock'), 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return index, lock_file
+        except BlockingIOError:
+            lock_file.close()
+    raise RuntimeError(f'All {worker_count} worker slots are taken')
+
+class TableRouter:
+    """
+    Pins every table to one owner worker by hashing its id
+    """
+    def __init__(self, worker_index: int, worker_count: int):
+        if worker_count <= 0:
+            raise ValueError("Workers count must be positive")
+        if not 0 <= worker_index < worker_count:
+            raise ValueError("Worker index out of range")
+        self.worker_index = worker_index
+        self.worker_count = worker_count
+
+    def owner_of(self, table_id: str) -> int:
+        return zlib.crc32(table_id.encode()) % self.worker_count
+
+    def is_local(self, table_id: str) -> bool:
+        return self.owner_of(table_id) == self.worker_index
+
+    def new_table_id(self) -> str:
+        """
+        Id of a new table owned by this worker
+        """
+        while True:
+            table_id = uuid.uuid4().hex[:8]
+            if self.is_local(table_id):
+                return table_id
+
+class RemoteWebSocket:
+    """
+    Stands in, at the table's owner, for a client WebSocket held by another worker
+    """
+    def __init__(self, bus: AbsMessageBus, gateway: int, connection_id: str, table_id: str, client_id: int):
+        self.bus = bus
+        self.gateway = gateway
+        self.connection_id = connection_id
+        self.table_id = table_id
+        self.client_id = client_id
+        self.incoming: asyncio.Queue = asyncio.Queue()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame: str):
+        await self.bus.publish(self.gateway, {"type": "frame", "connection_id": self.connection_id,
+                                              "frame": frame})
+
+    async def close(self, code: int = 1000):
+        await self.bus.publish(self.gateway, {"type": "close", "connection_id": self.connection_id,
+                                              "code": code})
+
+    async def receive_json(self):
+        data = await self.incoming.get()
+        if data is None:
+            raise WebSocketDisconnect()
+        return data
+
+class TableCluster:
+    """
+    Routes connections and requests for tables owned by other workers through the message bus
+    """
+    def __init__(self, router: TableRouter, bus: AbsMessageBus,
+                 play_at_table: Callable[[str, WebSocket, int], Awaitable[None]],
+                 request_handler: MessageHandler, max_queue_size: int = 256):
+        self.router = router
+        self.bus = bus
+        self.play_at_table = play_at_table
+        self.request_handler = request_handler
+        self.max_queue_size = max_queue_size
+        # by the id of the forwarded connection, a client reconnecting to the same table gets a new one
+        self._remote_sockets: Dict[str, RemoteWebSocket] = {}
+        self._gateway_connections: Dict[str, ClientConnection] = {}
+        bus.set_handler(self._on_message)
+
+    async def start(self):
+        await self.bus.start()
+
+    async def stop(self):
+        await self.bus.stop()
+
+    async def request(self, table_id: str, message: dict) -> Optional[dict]:
+        return await self.bus.request(self.router.owner_of(table_id), {**message, "table_id": table_id})
+
+    async def request_all(self, message: dict) -> List[dict]:
+        """
+        Replies of every other worker, workers that did not answer are skipped
+        """
+        workers = [w for w in range(self.router.worker_count) if w != self.router.worker_index]
+        replies = await asyncio.gather(*[self.bus.request(w, message) for w in workers], return_exceptions=True)
+        return [r for r in replies if isinstance(r, dict)]
+
+    async def forward_websocket(self, websocket: WebSocket, table_id: str, client_id: int):
+        """
+        Gateway side: relays a client connected here to the worker that owns the table
+        """
+        owner = self.router.owner_of(table_id)
+        connection_id = uuid.uuid4().hex
+        await websocket.accept()
+        connection = ClientConnection(client_id, websocket, self.max_queue_size)
+        connection.start()
+        self._gateway_connections[connection_id] = connection
+        await self.bus.publish(owner, {"type": "connect", "connection_id": connection_id, "table_id": table_id,
+                                       "client_id": client_id, "gateway": self.router.worker_index})
+        try:
+            while True:
+                data = await websocket.receive_json()
+                await self.bus.publish(owner, {"type": "client_message", "connection_id": connection_id,
+                                               "data": data})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            self._gateway_connections.pop(connection_id, None)
+            connection.stop()
+            # the owner ends the session of this connection however it ended, a broken frame included
+            await self.bus.publish(owner, {"type": "disconnect", "connection_id": connection_id})
+
+    async def _on_message(self, message: dict) -> Optional[dict]:
+        key = message.get("connection_id")
+        match message["type"]:
+            case "connect":
+                remote_socket = RemoteWebSocket(self.bus, message["gateway"], key, message["table_id"],
+                                                message["client_id"])
+                self._remote_sockets[key] = remote_socket
+                asyncio.create_task(self._play_remote(remote_socket))
+            case "client_message":
+                if key in self._remote_sockets:
+                    self._remote_sockets[key].incoming.put_nowait(message["data"])
+            case "disconnect":
+                if key in self._remote_sockets:
+                    self._remote_sockets[key].incoming.put_nowait(None)
+            case "frame":
+                if key in self._gateway_connections:
+                    self._gateway_connections[key].enqueue(message["frame"])
+            case "close":
+                if key in self._gateway_connections:
+                    await self._gateway_connections[key].websocket.close(code=message["code"])
+            case _:
+                return await self.request_handler(message)
+        return None
+
+    async def _play_remote(self, remote_socket: RemoteWebSocket):
+        try:
+            await self.play_at_table(remote_socket.table_id, remote_socket, remote_socket.client_id)
+        finally:
+            self._remote_sockets.pop(remote_socket.connection_id, None)
@@ -0,0 +1,224 @@
+import uuid
+from typing import Dict, List, Optional
+from app.game.concrete_game_handler import ConcreteGameHandler
+from app.game.connection_manager import ConnectionManager
+from app.game.game import Game, ConcreteGameBuilder
+from app.game.game_schema import GamePhase, NewPlayerArgs, TableStateArgs
+from app.game.game_serializer import encode_event
+from app.game.game_snapshot import GameSnapshotter, SnapshotFile, SnapshotStore, TableSnapshot, load_snapshot
+from app.game.hand_history import HandHistoryWriter
+from app.game.payload_compression import PayloadCompressor
+from app.game.spectator_feed import SpectatorFeed
+from app.game.table_state import TableStateTracker
+from app.game.table import Table
+from app.game.turn_clock import TableTurnClock
+
+class TableSession:
+    """
+    One hosted table: its own subscribers, seats and game
+    """
+    def __init__(self, id: str, name: str, sb_amount: float = 5, bb_amount: float = 10, min_raise: float = 5,
+                 min_players: int = 4, batch_events: bool = True, action_timeout: float = 30,
+                 time_bank: float = 60, hand_history: Optional[HandHistoryWriter] = None,
+                 snapshot_file: Optional[SnapshotFile] = None, reconnect_grace: float = 30,
+                 spectator_delay: float = 30, compressor: Optional[PayloadCompressor] = None):
+        self.id = id
+        self.name = name
+        self.sb_amount = sb_amount
+        self.bb_amount = bb_amount
+        self.min_raise = min_raise
+        self.min_players = min_players
+        self.spectator_feed = SpectatorFeed(spectator_delay, seats=self.get_seat_frames)
+        self.connection_manager = ConnectionManager(batch_events=batch_events,
+                                                    turn_clock=TableTurnClock(action_timeout, time_bank),
+                                                    reconnect_grace=reconnect_grace,
+                                                    spectator_feed=self.spectator_feed,
+                                                    state_tracker=TableStateTracker(self.get_public_state),
+                                                    compressor=compressor,
+                                                    table_state=self.get_table_state)
+        self.table = Table()
+        self.hand_history = hand_history
+        self.snapshotter: Optional[GameSnapshotter] = None
+        if snapshot_file is not None:
+            self.snapshotter = GameSnapshotter(snapshot_file, id, name, sb_amount, bb_amount, min_raise, min_players)
+        self.game: Optional[Game] = None
+
+    @property
+    def is_game_started(self) -> bool:
+        return self.game is not None and self.game.is_game_started
+
+    def get_game(self) -> Game:
+        if self.game is None:
+            self.game = self.build_game()
+        return self.game
+
+    def build_game(self) -> Game:
+        game_handler = ConcreteGameHandler(self.table.players, [], self.sb_amount, self.bb_amount,
+                                           self.connection_manager)
+        game_builder = ConcreteGameBuilder()
+        game_builder.set_game_handler(game_handler)
+        game_builder.set_table(self.table)
+        game_builder.set_small_blind_amount(self.sb_amount)
+        game_builder.set_big_blind_amount(self.bb_amount)
+        game_builder.set_min_raise_amount(self.min_raise)
+        if self.hand_history is not None:
+            game_builder.set_hand_history(self.hand_history, self.id)
+        if self.snapshotter is not None:
+            game_builder.set_snapshotter(self.snapshotter)
+        return game_builder.get_built_game()
+
+    def save_snapshot(self):
+        if self.snapshotter is not None:
+            self.snapshotter.save(self.table, self.game)
+
+    def restore(self, snapshot: TableSnapshot):
+        """
+        Seats the snapshot's players again and puts a hand in flight back at its last action boundary
+        """
+        snapshot.restore_players(self.table)
+        self.game = None
+        snapshot.restore_game(self.get_game())
+
+    def close(self):
+        self.spectator_feed.close()
+        if self.snapshotter is not None:
+            self.snapshotter.close()
+
+    def get_table_state(self, player_id: int) -> TableStateArgs:
+        """
+        Table as seen by one player: only their own pocket cards and pending turn
+        """
+        game = self.game
+        if not self.is_game_started:
+            return TableStateArgs(players=self.table.players, away_player_ids=list(self.connection_manager.away),
+                                  folded_player_ids=[], is_game_started=False, pot=0, cards=[], pocket_cards=[])
+
+        player = game.seats.get(player_id)
+        hand_evaluator = game.hand_evaluators.get(player_id)
+        curr_player_id = None
+        if game.betting_round is not None:
+            curr_player_id = game.players[game.betting_round.curr_player_pos].id
+        return TableStateArgs(
+            players=game.players,
+            away_player_ids=list(self.connection_manager.away),
+            folded_player_ids=game.seats.ids(game.seats.folded),
+            is_game_started=True,
+            pot=game.pot,
+            cards=game.table.community_cards,
+            pocket_cards=[] if player is None else player.pocket_cards,
+            hand=None if hand_evaluator is None else hand_evaluator.hand_value,
+            dealer_id=game.players[game.curr_dealer_pos].id,
+            curr_player_id=curr_player_id,
+            turn_request=self.connection_manager.pending_turn_request(player_id))
+
+    def get_seat_frames(self) -> List[str]:
+        return [encode_event(GamePhase.NEW_PLAYER, NewPlayerArgs(player=p)) for p in self.table.players]
+
+    def get_public_state(self) -> dict:
+        """
+        Table as everyone sees it, versioned by the state tracker. Fields without a value are left out,
+        player ids are strings because they are object keys
+        """
+        game = self.game
+        players = game.players if self.is_game_started else self.table.players
+        state = {
+            "seats": [p.id for p in players],
+            "players": {str(p.id): {"name": p.name, "balance": p.balance, "bet": p.bet, "is_ready": p.is_ready}
+                        for p in players},
+            "away": sorted(self.connection_manager.away),
+            "is_game_started": self.is_game_started}
+        if not self.is_game_started:
+            return state
+        state["folded"] = game.seats.ids(game.seats.folded)
+        state["pot"] = game.pot
+        state["cards"] = [c.code for c in game.table.community_cards]
+        state["dealer_id"] = game.players[game.curr_dealer_pos].id
+        if game.betting_round is not None:
+            state["curr_player_id"] = game.players[game.betting_round.curr_player_pos].id
+        if game.last_action is not None:
+            state["last_action"] = {"player_id": game.last_action[0], "action": game.last_action[1].value}
+        return state
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "sb_amount": self.sb_amount,
+            "bb_amount": self.bb_amount,
+            "players": len(self.table.players),
+            "spectators": self.spectator_feed.spectators,
+            "is_game_started": self.is_game_started
+        }
+
+class TableRegistry:
+    """
+    Lobby of all tables hosted by this process
+    """
+    def __init__(self, max_tables: int = 1000, hand_history: Optional[HandHistoryWriter] = None,
+                 snapshot_store: Optional[SnapshotStore] = None, reconnect_grace: float = 30,
+                 spectator_delay: float = 30, compressor: Optional[PayloadCompressor] = None):
+        self.max_tables = max_tables
+        self.reconnect_grace = reconnect_grace
+        self.spectator_delay = spectator_delay
+        self.hand_history = hand_history # shared by every table, one writer thread per process
+        self.compressor = compressor # shared by every table, its metrics cover the process
+        self.snapshot_store = snapshot_store
+        self.tables: Dict[str, TableSession] = {}
+
+    def create_table(self, name: str, sb_amount: float = 5, bb_amount: float = 10,
+                     table_id: Optional[str] = None) -> TableSession:
+        if len(self.tables) >= self.max_tables:
+            raise ValueError("Tables limit reached")
+        if name is None or name == "":
+            raise ValueError("Table name cannot be empty")
+        if sb_amount <= 0:
+            raise ValueError("Small blind value must be positive")
+        if bb_amount <= sb_amount:
+            raise ValueError("Big blind must be bigger than small blind")
+        table_id = table_id or uuid.uuid4().hex[:8]
+        if table_id in self.tables:
+            raise ValueError(f"Table {table_id} already exists")
+
+        snapshot_file = None if self.snapshot_store is None else self.snapshot_store.open(table_id)
+        session = TableSession(table_id, name, sb_amount, bb_amount, min_raise=sb_amount,
+                               hand_history=self.hand_history, snapshot_file=snapshot_file,
+                               reconnect_grace=self.reconnect_grace, spectator_delay=self.spectator_delay,
+                               compressor=self.compressor)
+        self.tables[table_id] = session
+        session.save_snapshot()
+        return session
+
+    def restore_table(self, table_id: str) -> Optional[TableSession]:
+        """
+        Rebuilds a table from its snapshot after a restart, a hand in flight still has to be resumed
+        """
+        if self.snapshot_store is None or table_id in self.tables:
+            return None
+        snapshot_file = self.snapshot_store.open(table_id)
+        snapshot = load_snapshot(snapshot_file)
+        if snapshot is None:
+            snapshot_file.close()
+            self.snapshot_store.remove(table_id)
+            return None
+
+        session = TableSession(table_id, snapshot.name, snapshot.sb_amount, snapshot.bb_amount, snapshot.min_raise,
+                               snapshot.min_players, hand_history=self.hand_history, snapshot_file=snapshot_file,
+                               reconnect_grace=self.reconnect_grace, spectator_delay=self.spectator_delay,
+                               compressor=self.compressor)
+        session.restore(snapshot)
+        self.tables[table_id] = session
+        return session
+
+    def get_table(self, table_id: str) -> Optional[TableSession]:
+        return self.tables.get(table_id)
+
+    def list_tables(self) -> List[TableSession]:
+        return list(self.tables.values())
+
+    def remove_table(self, table_id: str):
+        session = self.tables.pop(table_id, None)
+        if session is None:
+            return
+        session.close()
+        if session.snapshotter is not None:
+            self.snapshot_store.remove(table_id)
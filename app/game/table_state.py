@@ -0,0 +1,81 @@
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple
+from app.game.game_schema import GamePhase
+from app.game.game_serializer import encode_frame
+
+# public events whose content is part of the table state, subscribers of the deltas do not get them
+STATE_PHASES = (GamePhase.NEW_PLAYER, GamePhase.PRE_START, GamePhase.PRE_FLOP_SB, GamePhase.PRE_FLOP_BB,
+                GamePhase.POT, GamePhase.TURN_HIGHLIGHT, GamePhase.TURN_RESULT, GamePhase.COMMUNITY_CARDS,
+                GamePhase.IS_READY)
+STATE_PREFIXES = tuple(f'{{"{phase.value}"' for phase in STATE_PHASES)
+STATE_DELTA = "STATE_DELTA"
+STATE_FULL = "STATE_FULL"
+
+def diff_state(old: dict, new: dict) -> dict:
+    """
+    JSON merge patch (RFC 7386) that turns old into new: changed fields only, None for removed ones,
+    so state values are never None themselves
+    """
+    patch = {}
+    for key, value in new.items():
+        old_value = old.get(key)
+        if old_value == value:
+            continue
+        if isinstance(value, dict) and isinstance(old_value, dict):
+            patch[key] = diff_state(old_value, value)
+        else:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+def apply_patch(state: dict, patch: dict) -> dict:
+    result = dict(state)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict):
+            base = result.get(key)
+            result[key] = apply_patch(base if isinstance(base, dict) else {}, value)
+        else:
+            result[key] = value
+    return result
+
+class TableStateTracker:
+    """
+    Versioned public state of a table, each version is published as a patch against the previous one.
+    The latest patches are kept so a client that missed some catches up without the full state
+    """
+    def __init__(self, build_state: Callable[[], dict], history: int = 64):
+        if history <= 0:
+            raise ValueError("State history must be positive")
+        self.build_state = build_state
+        self.version = 0
+        self.state: dict = {}
+        self._patches: Deque[Tuple[int, str]] = deque(maxlen=history) # version and its STATE_DELTA frame
+        self.full_states = 0
+
+    def update(self) -> Optional[str]:
+        """
+        STATE_DELTA frame of the next version, None when nothing changed
+        """
+        state = self.build_state()
+        patch = diff_state(self.state, state)
+        if not patch:
+            return None
+        self.version += 1
+        self.state = state
+        frame = encode_frame({STATE_DELTA: {"version": self.version, "patch": patch}})
+        self._patches.append((self.version, frame))
+        return frame
+
+    def sync(self, version: Optional[int] = None) -> List[str]:
+        """
+        Frames that bring a client from its version to the latest one, the full state when it has none
+        or is further behind than the kept patches
+        """
+        if version is not None and 0 <= self.version - version <= len(self._patches):
+            return [frame for patch_version, frame in self._patches if patch_version > version]
+        self.full_states += 1
+        return [encode_frame({STATE_FULL: {"version": self.version, "state": self.state}})]
@@ -0,0 +1,119 @@
+import asyncio
+import heapq
+import itertools
+from typing import Callable, Dict, List, Optional, Tuple
+
+class TurnDeadline:
+    def __init__(self, when: float, callback: Callable[[], None]):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class TurnClock:
+    """
+    Deadlines of every pending turn in the process share one heap and one loop timer,
+    cancelled deadlines are skipped when they reach the top of the heap
+    """
+    def __init__(self):
+        self._heap: List[Tuple[float, int, TurnDeadline]] = []
+        self._counter = itertools.count()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def time(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> TurnDeadline:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # deadlines of a closed loop can never fire
+            self._heap.clear()
+            self._timer = None
+            self._loop = loop
+
+        deadline = TurnDeadline(loop.time() + delay, callback)
+        heapq.heappush(self._heap, (deadline.when, next(self._counter), deadline))
+        if self._timer is None or deadline.when < self._timer.when():
+            self._arm()
+        return deadline
+
+    def _arm(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._heap and self._heap[0][2].cancelled:
+            heapq.heappop(self._heap)
+        if self._heap:
+            self._timer = self._loop.call_at(self._heap[0][0], self._fire)
+
+    def _fire(self):
+        self._timer = None
+        now = self._loop.time()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, deadline = heapq.heappop(self._heap)
+            if not deadline.cancelled:
+                deadline.cancelled = True
+                deadline.callback()
+        self._arm()
+
+_turn_clock: Optional[TurnClock] = None
+
+def get_turn_clock() -> TurnClock:
+    global _turn_clock
+    if _turn_clock is None:
+        _turn_clock = TurnClock()
+    return _turn_clock
+
+class TableTurnClock:
+    """
+    Turn limits of one table: every turn gets action_timeout seconds, then the player's time bank is spent
+    """
+    def __init__(self, action_timeout: float = 30, time_bank: float = 60, clock: Optional[TurnClock] = None):
+        if action_timeout <= 0:
+            raise ValueError("Action timeout must be positive")
+        if time_bank < 0:
+            raise ValueError("Time bank cannot be negative")
+        self.action_timeout = action_timeout
+        self.time_bank = time_bank
+        self.clock = clock or get_turn_clock()
+        self.time_banks: Dict[int, float] = {}
+        self._turns: Dict[int, Tuple[float, TurnDeadline]] = {}
+
+    def time_bank_of(self, player_id: int) -> float:
+        return self.time_banks.get(player_id, self.time_bank)
+
+    def start_turn(self, player_id: int, on_expire: Callable[[], None]):
+        self.stop_turn(player_id)
+        deadline = self.clock.schedule(self.action_timeout + self.time_bank_of(player_id), on_expire)
+        self._turns[player_id] = (self.clock.time(), deadline)
+
+    def time_left(self, player_id: int) -> Optional[Tuple[float, float]]:
+        """
+        Action time and time bank left in the player's running turn
+        """
+        turn = self._turns.get(player_id)
+        if turn is None:
+            return None
+        elapsed = self.clock.time() - turn[0]
+        if elapsed <= self.action_timeout:
+            return self.action_timeout - elapsed, self.time_bank_of(player_id)
+        return 0.0, max(0.0, self.time_bank_of(player_id) - (elapsed - self.action_timeout))
+
+    def stop_turn(self, player_id: int):
+        """
+        Cancels the deadline and charges the time used above action_timeout to the time bank
+        """
+        turn = self._turns.pop(player_id, None)
+        if turn is None:
+            return
+        started, deadline = turn
+        deadline.cancel()
+        overtime = self.clock.time() - started - self.action_timeout
+        if overtime > 0:
+            self.time_banks[player_id] = max(0.0, self.time_bank_of(player_id) - overtime)
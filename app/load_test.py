@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import logging
+import math
+import time
+from typing import Dict, List, Optional
+import uvicorn
+import websockets
+from app.game.binary_serializer import BINARY_SUBPROTOCOL, decode_binary_frame, encode_binary_message
+from app.game.payload_compression import DEFLATE_SUBPROTOCOL, decompress_frame
+from app.game.table_state import apply_patch
+
+FIRST_CLIENT_ID = 1_000_000_000_000 # ids look like the browser's Date.now()
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile of the values
+    """
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    def add(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def format(self) -> str:
+        lines = []
+        for name, values in self.samples.items():
+            lines.append(f"  {name:<26} n={len(values):<7} p50={percentile(values, 50) * 1000:7.2f}ms "
+                         f"p95={percentile(values, 95) * 1000:7.2f}ms p99={percentile(values, 99) * 1000:7.2f}ms "
+                         f"max={max(values) * 1000:7.2f}ms")
+        return "\n".join(lines)
+
+class TableLoad:
+    """
+    Synthetic clients of one table, only one of them acts at a time
+    """
+    def __init__(self, table_id: Optional[str], players: int, hands: int):
+        self.table_id = table_id
+        self.players = players
+        self.hands = hands
+        self.joined = 0
+        self.all_joined = asyncio.Event()
+        self.responses_sent_at: List[float] = [] # k-th turn response, matched with the k-th TURN_RESULT
+        self.awaiting_request = False
+
+    def path(self, route: str, client_id: int) -> str:
+        if self.table_id is None:
+            return f"/{route}/{client_id}"
+        return f"/{route}/{self.table_id}/{client_id}"
+
+async def post_json(host: str, port: int, path: str, body: dict) -> dict:
+    """
+    Minimal HTTP/1.1 POST, keeps the harness free of an HTTP client dependency
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    data = json.dumps(body).encode()
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode() + data)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    if not head.startswith(b"HTTP/1.1 2"):
+        raise RuntimeError(f"POST {path} failed: {head.splitlines()[0].decode()}")
+    return json.loads(payload)
+
+async def join(host: str, port: int, table: TableLoad, client_id: int):
+    """
+    Gets ready once every player of the table is seated
+    """
+    table.joined += 1
+    if table.joined == table.players:
+        table.all_joined.set()
+    await table.all_joined.wait()
+    await post_json(host, port, table.path("player-ready", client_id), {"is_player_ready": True})
+
+async def run_client(host: str, port: int, table: TableLoad, client_id: int, recorder: LatencyRecorder,
+                     counts: Dict[str, int], deltas: bool = False, binary: bool = False, compress: bool = False):
+    subprotocols = [BINARY_SUBPROTOCOL] if binary else [DEFLATE_SUBPROTOCOL] if compress else None
+    async with websockets.connect(f"ws://{host}:{port}{table.path('ws', client_id)}", max_queue=None,
+                                  subprotocols=subprotocols) as websocket:
+        async def send(message: dict):
+            await websocket.send(encode_binary_message(message) if binary else json.dumps(message))
+
+        hands_played = 0
+        results_seen = 0
+        # with deltas the client follows the table state instead of the events it replaces
+        state, version, joined = {}, 0, False
+        if deltas:
+            await send({"STATE_SYNC": {}})
+        while hands_played < table.hands:
+            raw = await websocket.recv()
+            if binary:
+                messages = decode_binary_frame(raw)
+            else:
+                # long frames of a deflate client come as bytes
+                frame = json.loads(decompress_frame(raw) if isinstance(raw, bytes) else raw)
+                # frames of one game step may come batched as an array
+                messages = frame if isinstance(frame, list) else [frame]
+            received_at = time.perf_counter()
+            counts["frames"] = counts.get("frames", 0) + 1
+            counts["bytes"] = counts.get("bytes", 0) + len(raw)
+            for message in messages:
+                event = next(iter(message))
+                counts[event] = counts.get(event, 0) + 1
+                args = message[event]
+                match event:
+                    case "NEW_PLAYER" if args["player"]["id"] == client_id:
+                        await join(host, port, table, client_id)
+                    case "STATE_FULL":
+                        state, version = args["state"], args["version"]
+                    case "STATE_DELTA":
+                        if args["version"] != version + 1:
+                            await send({"STATE_SYNC": {"version": version}})
+                            continue
+                        state, version = apply_patch(state, args["patch"]), args["version"]
+                        if args["patch"].get("last_action"):
+                            if results_seen < len(table.responses_sent_at):
+                                recorder.add("broadcast fan-out", received_at - table.responses_sent_at[results_seen])
+                            results_seen += 1
+                    case "TURN_REQUEST":
+                        if table.awaiting_request:
+                            recorder.add("turn response -> request", received_at - table.responses_sent_at[-1])
+                            table.awaiting_request = False
+                        action = "CHECK" if "CHECK" in args["options"] else "CALL"
+                        amount = 0 if action == "CHECK" else args["prev_bet"] - args["player_bet"]
+                        table.responses_sent_at.append(time.perf_counter())
+                        table.awaiting_request = True
+                        await send({"TURN_RESPONSE": {"action": action, "amount": amount}})
+                    case "TURN_RESULT":
+                        if results_seen < len(table.responses_sent_at):
+                            recorder.add("broadcast fan-out", received_at - table.responses_sent_at[results_seen])
+                        results_seen += 1
+                    case "PLAY_AGAIN":
+                        table.awaiting_request = False
+                        hands_played += 1
+                        if hands_played < table.hands:
+                            await post_json(host, port, table.path("player-ready", client_id),
+                                            {"is_player_ready": True})
+                if deltas and not joined and str(client_id) in state.get("players", {}):
+                    joined = True
+                    await join(host, port, table, client_id)
+
+async def run_load_test(host: str, port: int, tables: int, players: int, hands: int, deltas: bool = False,
+                        binary: bool = False, compress: bool = False) -> str:
+    recorder = LatencyRecorder()
+    counts: Dict[str, int] = {}
+    if tables == 1:
+        loads = [TableLoad(None, players, hands)]
+    else:
+        loads = []
+        for i in range(tables):
+            created = await post_json(host, port, "/tables", {"name": f"load {i}"})
+            loads.append(TableLoad(created["id"], players, hands))
+
+    started = time.perf_counter()
+    clients = [run_client(host, port, load, FIRST_CLIENT_ID + t * players + p, recorder, counts, deltas, binary,
+                          compress)
+               for t, load in enumerate(loads) for p in range(players)]
+    await asyncio.gather(*clients)
+    seconds = time.perf_counter() - started
+
+    turns = sum(len(load.responses_sent_at) for load in loads)
+    return (f"{tables} tables x {players} players x {hands} hands in {seconds:.2f}s: {turns / seconds:.0f} turns/s, "
+            f"{counts.get('frames', 0)} frames, {sum(v for k, v in counts.items() if k not in ('frames', 'bytes'))} "
+            f"events, {counts.get('bytes', 0)} bytes ({counts.get('bytes', 0) / max(turns, 1):.0f} per turn)\n"
+            + recorder.format())
+
+async def run_with_server(port: int, tables: int, players: int, hands: int, deltas: bool = False,
+                          binary: bool = False, compress: bool = False, transport_deflate: bool = True) -> str:
+    """
+    Serves the app in this process on localhost for the duration of the test
+    """
+    from app.main import app, table_registry
+    # the app logs every received message at debug level, that would dominate the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           ws_per_message_deflate=transport_deflate))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()
+        await asyncio.sleep(0.05)
+    try:
+        report = await run_load_test("127.0.0.1", port, tables, players, hands, deltas, binary, compress)
+        if table_registry.compressor is not None and table_registry.compressor.frames:
+            report += f"\n  compression {json.dumps(table_registry.compressor.to_dict())}"
+        return report
+    finally:
+        server.should_exit = True
+        await server_task
+
+def main():
+    parser = argparse.ArgumentParser(description='Drives the WebSocket endpoints with synthetic players')
+    parser.add_argument('--tables', type=int, default=1, help='1 plays at the main table, more are created')
+    parser.add_argument('--players', type=int, default=4, help='players per table')
+    parser.add_argument('--hands', type=int, default=5, help='hands played at every table')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--server', help='host:port of a running server, by default one is started in process')
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--deltas', action='store_true', help='clients follow the table state deltas')
+    parser.add_argument('--binary', action='store_true', help='clients negotiate the MessagePack subprotocol')
+    parser.add_argument('--compress', action='store_true', help='clients negotiate the deflate subprotocol')
+    parser.add_argument('--no-transport-deflate', action='store_true',
+                        help='the in process server does not offer permessage-deflate')
+    args = parser.parse_args()
+    if args.players < 4:
+        parser.error('games start with at least 4 players')
+
+    if args.server:
+        host, port = args.server.rsplit(':', 1)
+        test = run_load_test(host, int(port), args.tables, args.players, args.hands, args.deltas, args.binary,
+                             args.compress)
+    else:
+        test = run_with_server(args.port, args.tables, args.players, args.hands, args.deltas, args.binary,
+                               args.compress, not args.no_transport_deflate)
+
+    async def run():
+        return await asyncio.wait_for(test, args.timeout)
+
+    print(asyncio.run(run()))
+
+if __name__ == '__main__':
+    main()
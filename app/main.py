@@ -1,30 +1,100 @@
 import asyncio
 import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
 from http import HTTPStatus
 from typing import Optional
 
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, WebSocket, HTTPException
 from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from starlette.staticfiles import StaticFiles
+from starlette.status import WS_1008_POLICY_VIOLATION, WS_1011_INTERNAL_ERROR
 from starlette.websockets import WebSocketDisconnect
 
-from app.game.concrete_game_handler import ConcreteGameHandler
-from app.game.connection_manager import ConnectionManager
-from app.game.game import Game, ConcreteGameBuilder
+from app.game.binary_serializer import BINARY_SUBPROTOCOL, decode_binary_frame
 from app.game.game_schema import GamePhase, NewPlayerArgs, TurnResponse, PlayerAction, IsReadyArgs
+from app.game.game_snapshot import SnapshotStore
+from app.game.hand_history import HandHistoryWriter, FsyncPolicy
 from app.game.models import Player
-from app.game.table import Table
+from app.game.payload_compression import PayloadCompressor
+from app.game.table_cluster import TableCluster, TableRouter, UnixSocketMessageBus, claim_worker_index
+from app.game.table_registry import TableRegistry, TableSession
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 logger.debug("Debugging: This is a test log message.")
 
-app = FastAPI()
+DEFAULT_TABLE_ID = "main"
+
+# with POKER_WORKERS > 1 every uvicorn worker owns a share of the tables, see table_cluster
+WORKERS = int(os.environ.get("POKER_WORKERS", "1"))
+CLUSTER_DIR = os.environ.get("POKER_CLUSTER_DIR", os.path.join(tempfile.gettempdir(), "poker-cluster"))
+# played hands are appended to <dir>/hands-<worker>.log, an empty value turns the history off
+HAND_HISTORY_DIR = os.environ.get("POKER_HAND_HISTORY_DIR", "hand_history")
+HAND_HISTORY_FSYNC = FsyncPolicy(os.environ.get("POKER_HAND_HISTORY_FSYNC", FsyncPolicy.BATCH.value))
+# tables are snapshotted to <dir>/<table id>.snap and restored on start, an empty value turns snapshots off
+SNAPSHOT_DIR = os.environ.get("POKER_SNAPSHOT_DIR", "snapshots")
+# seconds players of restored tables get to reconnect before their seats are freed
+RECOVERY_GRACE = float(os.environ.get("POKER_RECOVERY_GRACE", "15"))
+# seconds a dropped player keeps the seat and a pending turn, 0 frees the seat at once
+RECONNECT_GRACE = float(os.environ.get("POKER_RECONNECT_GRACE", "30"))
+# seconds spectators are behind the seated players
+SPECTATOR_DELAY = float(os.environ.get("POKER_SPECTATOR_DELAY", "30"))
+# deflate level 1-9 for clients of the poker.json.deflate subprotocol, 0 turns the subprotocol off
+COMPRESSION_LEVEL = int(os.environ.get("POKER_COMPRESSION_LEVEL", "6"))
+# frames shorter than this many UTF-8 bytes are sent as they are
+COMPRESSION_THRESHOLD = int(os.environ.get("POKER_COMPRESSION_THRESHOLD", "256"))
+
+table_registry = TableRegistry(reconnect_grace=RECONNECT_GRACE, spectator_delay=SPECTATOR_DELAY,
+                               compressor=PayloadCompressor(COMPRESSION_LEVEL, COMPRESSION_THRESHOLD)
+                               if COMPRESSION_LEVEL else None)
+cluster: Optional[TableCluster] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global cluster
+    lock_file = None
+    worker_index = 0
+    if WORKERS > 1:
+        worker_index, lock_file = claim_worker_index(CLUSTER_DIR, WORKERS)
+        logger.info(f"Worker {worker_index} of {WORKERS} started")
+        cluster = TableCluster(TableRouter(worker_index, WORKERS),
+                               UnixSocketMessageBus(worker_index, CLUSTER_DIR),
+                               play_at_table_id, handle_cluster_request)
+        await cluster.start()
+    if HAND_HISTORY_DIR:
+        table_registry.hand_history = HandHistoryWriter(os.path.join(HAND_HISTORY_DIR, f"hands-{worker_index}.log"),
+                                                        HAND_HISTORY_FSYNC)
+    if SNAPSHOT_DIR:
+        table_registry.snapshot_store = SnapshotStore(SNAPSHOT_DIR)
+        for table_id in table_registry.snapshot_store.table_ids():
+            if not is_local_table(table_id):
+                continue
+            session = table_registry.restore_table(table_id)
+            if session is not None:
+                logger.info(f"Table {table_id} restored with {len(session.table.players)} players")
+                asyncio.create_task(recover_table(session))
+    if is_local_table(DEFAULT_TABLE_ID) and table_registry.get_table(DEFAULT_TABLE_ID) is None:
+        table_registry.create_table("Main table", table_id=DEFAULT_TABLE_ID)
+    yield
+    for session in table_registry.list_tables():
+        session.close()
+    if cluster is not None:
+        await cluster.stop()
+        lock_file.close()
+    if table_registry.hand_history is not None:
+        table_registry.hand_history.close()
+    table_registry.hand_history = None
+    table_registry.snapshot_store = None
+
+app = FastAPI(lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-connection_manager = ConnectionManager()
+def is_local_table(table_id: str) -> bool:
+    return cluster is None or cluster.router.is_local(table_id)
 
 @app.get("/")
 async def root():
@@ -33,115 +103,308 @@ async def root():
 class IsPlayerReady(BaseModel):
     is_player_ready: bool
 
-table = Table()
+class CreateTable(BaseModel):
+    name: str
+    sb_amount: float = 5
+    bb_amount: float = 10
+
+@app.get("/tables")
+async def list_tables():
+    tables = [session.to_dict() for session in table_registry.list_tables()]
+    if cluster is not None:
+        for reply in await cluster.request_all({"type": "list_tables"}):
+            tables.extend(reply["tables"])
+    return tables
+
+@app.get("/compression")
+async def compression_metrics():
+    # counted by this worker for its tables
+    if table_registry.compressor is None:
+        return {"enabled": False}
+    return {"enabled": True, **table_registry.compressor.to_dict()}
+
+@app.post("/tables")
+async def create_table(create_table_args: CreateTable):
+    # new tables are owned by the worker that created them
+    table_id = None if cluster is None else cluster.router.new_table_id()
+    try:
+        session = table_registry.create_table(create_table_args.name,
+                                              create_table_args.sb_amount,
+                                              create_table_args.bb_amount,
+                                              table_id)
+    except ValueError as e:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST, detail=str(e))
+    return session.to_dict()
+
+@app.get("/tables/{table_id}")
+async def get_table(table_id: str):
+    if not is_local_table(table_id):
+        return get_remote_reply(table_id, await cluster.request(table_id, {"type": "get_table"}))
+    return get_session(table_id).to_dict()
+
+def get_session(table_id: str) -> TableSession:
+    session = table_registry.get_table(table_id)
+    if session is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Table {table_id} not found")
+    return session
+
+def get_remote_reply(table_id: str, reply: Optional[dict]) -> dict:
+    if reply is None:
+        raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail=f"Table {table_id} not found")
+    return reply
 
 @app.post("/player-ready/{client_id}")
 async def player_ready(client_id: int, is_player_ready: IsPlayerReady):
-    global table
-    if game_instance is not None and game_instance.is_game_started:
-        return HTTPStatus.CONFLICT
+    return await route_player_ready(DEFAULT_TABLE_ID, client_id, is_player_ready.is_player_ready)
+
+@app.post("/player-ready/{table_id}/{client_id}")
+async def table_player_ready(table_id: str, client_id: int, is_player_ready: IsPlayerReady):
+    return await route_player_ready(table_id, client_id, is_player_ready.is_player_ready)
 
-    is_ready = is_player_ready.is_player_ready
+async def route_player_ready(table_id: str, client_id: int, is_ready: bool):
+    if not is_local_table(table_id):
+        reply = await cluster.request(table_id, {"type": "player_ready", "client_id": client_id, "is_ready": is_ready})
+        return HTTPStatus(get_remote_reply(table_id, reply)["status"])
+    return await set_player_ready(get_session(table_id), client_id, is_ready)
 
-    for p in table.players:
-        print(p.name)
-        print(p.is_ready)
-        print("\n-----\n")
-        if p.id == client_id:
-            p.is_ready = is_ready
+async def set_player_ready(session: TableSession, client_id: int, is_ready: bool):
+    if session.is_game_started:
+        return HTTPStatus.CONFLICT
+
+    player = session.table.get_player(client_id)
+    if player is not None:
+        player.is_ready = is_ready
 
     if is_ready:
         log_text = f"Player {client_id} is ready ✅"
     else:
         log_text = f"Player {client_id} is not ready ❌"
-    await connection_manager.log(log_text)
-    await connection_manager.broadcast({GamePhase.IS_READY.value: IsReadyArgs(
+    await session.connection_manager.log(log_text)
+    session.connection_manager.broadcast_event(GamePhase.IS_READY, IsReadyArgs(
         player_id=client_id,
         is_ready=is_ready
-    ).dict()})
+    ))
 
-    if all(p.is_ready == True for p in table.players):
-         asyncio.create_task(start_game())
+    if all(p.is_ready == True for p in session.table.players):
+         asyncio.create_task(start_game(session))
 
     return HTTPStatus.OK
 
-game_instance: Optional[Game] = None
-
-async def start_game():
-    global game_instance
+async def start_game(session: TableSession):
     try:
-        if len(table.players) < 4:
-             await connection_manager.log("Not enough players to start.")
+        # busted players sit out, only players with chips are dealt in
+        if sum(1 for p in session.table.players if p.balance > 0) < max(session.min_players, 2):
+             await session.connection_manager.log("Not enough players to start.")
              return
 
-        if game_instance is None:
-            game_instance = build_game()
+        game = session.get_game()
+        await session.connection_manager.log("Game started ❗")
+        asyncio.create_task(game.start_game())
+    except Exception as e:
+        logger.exception(f"Error starting game: {e}")
 
-        await connection_manager.log("Game started ❗")
-        asyncio.create_task(game_instance.start_game())
+async def recover_table(session: TableSession):
+    """
+    Holds the seats of a restored table for its players and resumes the interrupted hand,
+    turns of players who did not come back yet wait for them like after a dropped connection
+    """
+    for player in session.table.players:
+        session.connection_manager.hold_seat(player.id, lambda player_id=player.id: asyncio.create_task(
+            leave_table(session, player_id)), RECOVERY_GRACE)
+    try:
+        if session.is_game_started:
+            await session.connection_manager.log("Resuming the interrupted hand ❗")
+            await session.game.resume_game()
     except Exception as e:
-        logger.exception("Error starting game:" + e)
-
-def build_game() -> Game:
-    game_handler = ConcreteGameHandler(table.players, [], 5, 10, connection_manager)
-    game_builder = ConcreteGameBuilder()
-    game_builder.set_game_handler(game_handler)
-    game_builder.set_table(table)
-    game_builder.set_small_blind_amount(5)
-    game_builder.set_big_blind_amount(10)
-    game_builder.set_min_raise_amount(5)
-    return game_builder.get_built_game()
+        logger.exception(f"Error resuming table {session.id}: {e}")
+
+async def handle_cluster_request(message: dict) -> Optional[dict]:
+    """
+    Requests forwarded by other workers for the tables owned by this one
+    """
+    if message["type"] == "list_tables":
+        return {"tables": [session.to_dict() for session in table_registry.list_tables()]}
+
+    session = table_registry.get_table(message["table_id"])
+    if session is None:
+        return None
+    match message["type"]:
+        case "get_table":
+            return session.to_dict()
+        case "player_ready":
+            status = await set_player_ready(session, message["client_id"], message["is_ready"])
+            return {"status": status.value}
+    logger.warning(f"Unknown cluster request: {message}")
+    return None
 
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: int):
-    await connection_manager.connect(websocket, client_id)
+    await route_websocket(websocket, DEFAULT_TABLE_ID, client_id)
+
+@app.websocket("/ws/{table_id}/{client_id}")
+async def table_websocket_endpoint(websocket: WebSocket, table_id: str, client_id: int):
+    await route_websocket(websocket, table_id, client_id)
 
+@app.websocket("/watch/{table_id}")
+async def watch_websocket_endpoint(websocket: WebSocket, table_id: str):
+    # spectators are served by the worker owning the table, its feed is not relayed between workers
+    session = table_registry.get_table(table_id) if is_local_table(table_id) else None
+    if session is None:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+    await watch_table(session, websocket)
+
+async def watch_table(session: TableSession, websocket: WebSocket):
+    """
+    Streams the table's delayed public events, starting with the seats as they were when the latest
+    released hand started
+    """
+    await websocket.accept()
+
+    async def stream():
+        async for frames in session.spectator_feed.follow():
+            await websocket.send_text(frames[0] if len(frames) == 1 else "[" + ",".join(frames) + "]")
+
+    streaming = asyncio.create_task(stream())
+    try:
+        # spectators send nothing, reading only notices the disconnect
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        streaming.cancel()
+
+async def route_websocket(websocket: WebSocket, table_id: str, client_id: int):
+    if not is_local_table(table_id):
+        await cluster.forward_websocket(websocket, table_id, client_id)
+        return
+    await play_at_table_id(table_id, websocket, client_id)
+
+async def play_at_table_id(table_id: str, websocket: WebSocket, client_id: int):
+    session = table_registry.get_table(table_id)
+    if session is None:
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+    await play_at_table(session, websocket, client_id)
+
+def negotiate_subprotocol(session: TableSession, websocket: WebSocket) -> Optional[str]:
+    """
+    First subprotocol offered by the client that the table supports, None for plain JSON
+    """
+    # clients of tables owned by another worker are relayed as JSON
+    if not isinstance(websocket, WebSocket):
+        return None
+    supported = session.connection_manager.subprotocols
+    return next((p for p in websocket.scope.get("subprotocols", ()) if p in supported), None)
+
+async def play_at_table(session: TableSession, websocket: WebSocket, client_id: int):
+    connection_manager = session.connection_manager
+    table = session.table
     client_name = str(client_id)[9:]
-    player = Player(client_id, client_name, 1000)
+    subprotocol = negotiate_subprotocol(session, websocket)
 
-    #load existing players for new connection
-    for existing_player in table.players:
-        await connection_manager.send_personal(client_id,
-               {GamePhase.NEW_PLAYER.value: NewPlayerArgs(
-                   player=existing_player).dict()})
+    if client_id in table.seats:
+        # a returning player gets the whole table in one message, the seat was held for them
+        await connection_manager.reconnect(websocket, client_id, subprotocol)
+        connection_manager.send_event(client_id, GamePhase.TABLE_STATE, session.get_table_state(client_id))
+        await connection_manager.log(f"Player {client_name} is back")
+    else:
+        await connection_manager.connect(websocket, client_id, subprotocol)
+        player = Player(client_id, client_name, 1000)
 
-    #add new player to everyone
-    await connection_manager.broadcast({GamePhase.NEW_PLAYER.value: NewPlayerArgs(player=player).dict()})
-    await connection_manager.log(f"Player {client_name} joined")
+        #load existing players for new connection
+        for existing_player in table.players:
+            connection_manager.send_event(client_id, GamePhase.NEW_PLAYER, NewPlayerArgs(player=existing_player))
 
-    table.add_player(player)
+        #add new player to everyone
+        connection_manager.broadcast_event(GamePhase.NEW_PLAYER, NewPlayerArgs(player=player))
+        await connection_manager.log(f"Player {client_name} joined")
+
+        table.add_player(player)
+        session.save_snapshot()
 
     try:
         while True:
             # Receive messages from the client
-            data = await websocket.receive_json()
-            logger.debug(f"Received data from client {client_id}: {data}")
-
-            # Handle incoming turn responses
-            if "TURN_RESPONSE" in data:
-                try:
-                    # Validate the incoming data using the Pydantic model
-                    turn_response_data = TurnResponse(**data["TURN_RESPONSE"])
-                    # Convert the validated model to a TurnResult object
-                    turn_result = TurnResponse(
-                        action=turn_response_data.action,
-                        amount=turn_response_data.amount
-                    )
-                    # Process the turn response using the connection manager
-                    connection_manager.process_turn_response(client_id, turn_result)
-                except Exception as e:
-                    logger.error(f"Invalid turn response format from client {client_id}: {e}")
-                    # Optionally, send an error back to the client or assume a FOLD
-                    connection_manager.process_turn_response(client_id,
-                                                             TurnResponse(action=PlayerAction.FOLD, amount=0))
-            # Add other message handling logic here as needed
-            else:
-                logger.warning(f"Received unknown message format from client {client_id}: {data}")
+            # deflate clients compress nothing they send
+            try:
+                if subprotocol == BINARY_SUBPROTOCOL:
+                    messages = decode_binary_frame(await websocket.receive_bytes())
+                else:
+                    messages = [await websocket.receive_json()]
+                    if not isinstance(messages[0], dict):
+                        raise ValueError("message must be a JSON object")
+            except (ValueError, KeyError) as e:
+                # a frame that cannot be read is handled like an invalid turn response
+                logger.error(f"Invalid frame from client {client_id}: {e}")
+                connection_manager.process_turn_response(client_id, TurnResponse(action=PlayerAction.FOLD, amount=0))
+                continue
+            for data in messages:
+                handle_client_message(session, client_id, data)
 
     except WebSocketDisconnect:
         logger.info(f"Player {client_id} disconnected.")
-        connection_manager.disconnect(client_id)
-        table.remove_player(client_id)
-        await connection_manager.log(f"Player {client_name} left")
+        await release_connection(session, websocket, client_id)
     except Exception as e:
-        logger.exception(f"Error in websocket connection with client {client_id}:" + e)
\ No newline at end of file
+        logger.exception(f"Error in websocket connection with client {client_id}: {e}")
+        # the connection is dropped and its seat held or freed like after a disconnect
+        try:
+            await websocket.close(code=WS_1011_INTERNAL_ERROR)
+        except Exception:
+            pass
+        await release_connection(session, websocket, client_id)
+
+async def release_connection(session: TableSession, websocket: WebSocket, client_id: int):
+    """
+    Holds the seat of a dropped client for the reconnect grace, frees it at once without one
+    """
+    connection_manager = session.connection_manager
+    if connection_manager.is_replaced(client_id, websocket):
+        return # the client is already back on a new connection
+    client_name = str(client_id)[9:]
+    if connection_manager.reconnect_grace > 0:
+        connection_manager.hold_seat(client_id, lambda: asyncio.create_task(leave_table(session, client_id)))
+        await connection_manager.log(f"Player {client_name} lost connection, "
+                                     f"the seat is held for {connection_manager.reconnect_grace:.0f}s")
+    else:
+        connection_manager.disconnect(client_id)
+        await leave_table(session, client_id)
+
+async def leave_table(session: TableSession, client_id: int):
+    session.table.remove_player(client_id)
+    session.save_snapshot()
+    await session.connection_manager.log(f"Player {str(client_id)[9:]} left")
+    # tables created from the lobby are closed once everyone left
+    if session.id != DEFAULT_TABLE_ID and not session.table.players and not session.is_game_started:
+        table_registry.remove_table(session.id)
+
+def handle_client_message(session: TableSession, client_id: int, data: dict):
+    logger.debug(f"Received data from client {client_id}: {data}")
+    connection_manager = session.connection_manager
+
+    # Handle incoming turn responses
+    if "TURN_RESPONSE" in data:
+        try:
+            # Validate the incoming data using the Pydantic model
+            turn_response_data = TurnResponse(**data["TURN_RESPONSE"])
+            # Convert the validated model to a TurnResult object
+            turn_result = TurnResponse(
+                action=turn_response_data.action,
+                amount=turn_response_data.amount
+            )
+            # Process the turn response using the connection manager
+            connection_manager.process_turn_response(client_id, turn_result)
+        except Exception as e:
+            logger.error(f"Invalid turn response format from client {client_id}: {e}")
+            # Optionally, send an error back to the client or assume a FOLD
+            connection_manager.process_turn_response(client_id,
+                                                     TurnResponse(action=PlayerAction.FOLD, amount=0))
+    # the client follows the table through state deltas, also sent again with its version after a gap
+    elif "STATE_SYNC" in data:
+        sync = data["STATE_SYNC"]
+        version = sync.get("version") if isinstance(sync, dict) else None
+        connection_manager.subscribe_deltas(client_id, version if isinstance(version, int) else None)
+    # Add other message handling logic here as needed
+    else:
+        logger.warning(f"Received unknown message format from client {client_id}: {data}")
@@ -9,7 +9,7 @@ async function readyButtonClick(button) {
         button.classList.add("not-ready");
         is_ready = false;
     }
-    await fetch(`http://127.0.0.1:8000/player-ready/${client_id}`, {
+    await fetch(`http://127.0.0.1:8000/player-ready/${table_id}/${client_id}`, {
             method: "POST",
             headers: {
                 "Content-Type": "application/json"
@@ -23,9 +23,13 @@ function sendTurn(action, amount=0) {
         "TURN_RESPONSE": {"action": action, "amount": amount}
     }))
 
+    hideTurnButtons();
+}
+
+function hideTurnButtons() {
     let buttons = document.getElementById("self_buttons");
-    console.log(buttons);
     Array.from(buttons.children).forEach(button => {
         button.style.display = "none";
     })
+    stopTurnTimer();
 }
\ No newline at end of file
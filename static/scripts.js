@@ -1,11 +1,49 @@
-var client_id = Date.now();
-var ws = new WebSocket(`ws://localhost:8000/ws/${client_id}`);
+// the id outlives reloads of this tab, a returning client takes its seat back
+var client_id = Number(sessionStorage.getItem("client_id")) || Date.now();
+sessionStorage.setItem("client_id", client_id);
+// tables are picked with ?table=<id>, the main table is used by default
+var url_params = new URLSearchParams(window.location.search);
+var table_id = url_params.get("table") || "main";
+// with ?watch the table is followed as a spectator, its public events arrive with a delay
+var is_spectator = url_params.has("watch");
+var ws = null;
+var reconnect_delay = 500;
+const WS_REPLACED = 4000;
+
+function connect() {
+    if (is_spectator)
+        ws = new WebSocket(`ws://localhost:8000/watch/${table_id}`);
+    else
+        ws = new WebSocket(`ws://localhost:8000/ws/${table_id}/${client_id}`);
+
+    ws.onopen = function () {
+        reconnect_delay = 500;
+    };
+
+    ws.onmessage = function (event) {
+        console.log("Received message: ", event.data);
+        let data = JSON.parse(event.data);
+        // events of one game step may arrive batched in a single array frame
+        let messages = Array.isArray(data) ? data : [data];
+        messages.forEach(message => {
+            let ws_message_processor = new WSMessageProcessor(ws);
+            ws_message_processor.processMessage(message);
+        });
+    };
+
+    ws.onclose = function (event) {
+        if (event.code === WS_REPLACED) {
+            new LogsHandler("The table was opened in another tab").handle();
+            return;
+        }
+        // the server holds the seat for a while, the table state is sent again on return
+        new LogsHandler("Connection lost, reconnecting...").handle();
+        setTimeout(connect, reconnect_delay);
+        reconnect_delay = Math.min(reconnect_delay * 2, 8000);
+    };
+}
 
-ws.onmessage = function (event) {
-    console.log("Received message: ", event.data);
-    let ws_message_processor = new WSMessageProcessor(ws);
-    ws_message_processor.processMessage(event);
-};
+connect();
 
 /**
  * Strategy pattern context class
@@ -27,10 +65,9 @@ class WSMessageProcessor{
 
     /**
      *
-     * @param {MessageEvent} event
+     * @param {Object} data - a single parsed game event
      */
-    processMessage(event){
-        let data = JSON.parse(event.data);
+    processMessage(data){
         let keys = Object.keys(data);
         let key1 = keys[0];
         switch (key1) {
@@ -83,6 +120,12 @@ class WSMessageProcessor{
             case "PLAY_AGAIN":
                 this.handler = new PlayAgainHandler(data[key1]);
                 break;
+            case "HAND_STRENGTH":
+                this.handler = new HandStrengthHandler(data[key1]);
+                break;
+            case "TABLE_STATE":
+                this.handler = new TableStateHandler(data[key1]);
+                break;
             default:
                 this.handler = new LogsHandler("Unknown state");
                 break;
@@ -122,6 +165,9 @@ class LogsHandler extends AbsGamePhaseHandler{
 class NewPlayerHandler extends AbsGamePhaseHandler{
     handle(){
         let player = this.args;
+        // spectators get the seats first and again in the replayed part of the feed
+        if (document.getElementById(player["id"] + "_div") !== null)
+            return;
         let player_div = CreatePlayer(player);
         let playersContainer = document.getElementById("players");
         playersContainer.appendChild(player_div);
@@ -295,6 +341,30 @@ function arrangePlayersInCircle(orderedPlayerIds) {
 
 }
 
+function resetCommunityCards() {
+    const communityCardsContainer = document.getElementById('community_cards');
+    communityCardsContainer.style.display="flex"
+    communityCardsContainer.innerHTML = '';
+    for (let i = 0; i < 5; i++) {
+        let placeholder = document.createElement('div');
+        placeholder.classList.add('community-card-placeholder');
+
+        placeholder.id = `community_card_${i}`;
+        communityCardsContainer.appendChild(placeholder);
+    }
+}
+
+function showCommunityCards(cards) {
+    for (let i = 0; i < cards.length; i++) {
+        let cardPlaceholder = document.getElementById(`community_card_${i}`);
+        if (cardPlaceholder) {
+            cardPlaceholder.classList.remove('community-card-placeholder');
+            cardPlaceholder.classList.add('card-display');
+            cardPlaceholder.textContent = cards[i]["suit"] + cards[i]["rank"];
+        }
+    }
+}
+
 class PreStartHandler extends AbsGamePhaseHandler{
     handle() {
         let data = this.args;
@@ -304,16 +374,7 @@ class PreStartHandler extends AbsGamePhaseHandler{
 
         const tableContainer = document.getElementById('poker_table_container');
         tableContainer.classList.add('game-started');
-        const communityCardsContainer = document.getElementById('community_cards');
-        communityCardsContainer.style.display="flex"
-        communityCardsContainer.innerHTML = '';
-        for (let i = 0; i < 5; i++) {
-            let placeholder = document.createElement('div');
-            placeholder.classList.add('community-card-placeholder');
-
-            placeholder.id = `community_card_${i}`;
-            communityCardsContainer.appendChild(placeholder);
-        }
+        resetCommunityCards();
 
         // Hide/show dealer chips
         let prev_dealer_chip = document.getElementById(prev_dealer + "_dealer");
@@ -339,6 +400,8 @@ class PreStartHandler extends AbsGamePhaseHandler{
         let ready_button = document.getElementById("ready_button");
         ready_button.style.display = "none";
 
+        document.getElementById("hand_strength").textContent = '';
+
         // Call the arrangement function
         arrangePlayersInCircle(orderedPlayerIds);
 
@@ -413,6 +476,10 @@ class TurnRequestHandler extends AbsGamePhaseHandler{
 
         let to_call = prev_bet - player_bet;
 
+        if (data["time_to_act"] != null) {
+            startTurnTimer(data["time_to_act"], data["time_bank"]);
+        }
+
         if (options.includes("CALL")) {
             let call_button = document.getElementById("call_button");
             call_button.textContent = "Call $" + to_call;
@@ -506,6 +573,38 @@ class TurnRequestHandler extends AbsGamePhaseHandler{
 
 }
 
+let turn_timer_interval = null;
+
+/**
+ * Counts down the action time, then the time bank, until the server acts for the player
+ * @param {number} time_to_act - Seconds before the time bank is used
+ * @param {number} time_bank - Seconds left in the player's time bank
+ */
+function startTurnTimer(time_to_act, time_bank) {
+    stopTurnTimer();
+    let deadline = Date.now() + (time_to_act + time_bank) * 1000;
+    let bank_starts = Date.now() + time_to_act * 1000;
+    let timer = document.getElementById("turn_timer");
+    let tick = () => {
+        let now = Date.now();
+        if (now < bank_starts) {
+            timer.textContent = "Time to act: " + Math.ceil((bank_starts - now) / 1000) + "s";
+        } else {
+            timer.textContent = "Time bank: " + Math.max(0, Math.ceil((deadline - now) / 1000)) + "s";
+        }
+    };
+    tick();
+    turn_timer_interval = setInterval(tick, 250);
+}
+
+function stopTurnTimer() {
+    if (turn_timer_interval !== null) {
+        clearInterval(turn_timer_interval);
+        turn_timer_interval = null;
+    }
+    document.getElementById("turn_timer").textContent = "";
+}
+
 class TurnResultHandler extends AbsGamePhaseHandler{
     handle() {
         let data = this.args;
@@ -513,6 +612,11 @@ class TurnResultHandler extends AbsGamePhaseHandler{
         let action = data["action"];
         let amount = data["amount"];
 
+        // the server acts for players whose time ran out
+        if (player["id"] === client_id) {
+            hideTurnButtons();
+        }
+
         document.getElementById(player["id"] + "_balance").textContent = "Balance: $" + player["balance"];
         let turn_str = action.charAt(0) + action.toString().toLowerCase().slice(1, action.length) + " $" + amount;
 
@@ -584,14 +688,7 @@ class CommunityCardsHandler extends AbsGamePhaseHandler{
             }
         }
 
-        for (let i = 0; i < cards.length; i++) {
-            let cardPlaceholder = document.getElementById(`community_card_${i}`);
-            if (cardPlaceholder) {
-                cardPlaceholder.classList.remove('community-card-placeholder');
-                cardPlaceholder.classList.add('card-display');
-                cardPlaceholder.textContent = cards[i]["suit"] + cards[i]["rank"];
-            }
-        }
+        showCommunityCards(cards);
     }
 }
 
@@ -608,6 +705,13 @@ const HandNames = Object.freeze({
     9: "Royal Flush",
 });
 
+class HandStrengthHandler extends AbsGamePhaseHandler{
+    handle() {
+        let data = this.args;
+        document.getElementById("hand_strength").textContent = "Your hand: " + HandNames[data["hand"]];
+    }
+}
+
 class ShowdownWinnersHandler extends AbsGamePhaseHandler{
     handle(){
         let data = this.args;
@@ -655,4 +759,55 @@ class PlayAgainHandler extends AbsGamePhaseHandler{
         ready_button.className = "not-ready";
         ready_button.style.display = "flex";
     }
-}
\ No newline at end of file
+}
+
+/**
+ * Redraws the whole table after a reconnect, the events missed meanwhile are not replayed
+ */
+class TableStateHandler extends AbsGamePhaseHandler{
+    handle() {
+        let data = this.args;
+        let players = data["players"];
+        let playersContainer = document.getElementById("players");
+        playersContainer.innerHTML = '';
+        players.forEach(player => playersContainer.appendChild(CreatePlayer(player)));
+        hideTurnButtons();
+
+        players.forEach(player => {
+            let turn = document.getElementById(player["id"] + "_turn");
+            if (data["folded_player_ids"].includes(player["id"])) {
+                turn.textContent = "Fold";
+            } else if (data["away_player_ids"].includes(player["id"])) {
+                turn.textContent = "Away";
+            } else if (!data["is_game_started"]) {
+                turn.textContent = player["is_ready"] ? "✅" : "❌";
+            }
+        });
+        new PotHandler({"pot": data["pot"]}).handle();
+
+        let ready_button = document.getElementById("ready_button");
+        if (!data["is_game_started"]) {
+            let self = players.find(player => player["id"] === client_id);
+            ready_button.className = self && self["is_ready"] ? "ready" : "not-ready";
+            ready_button.style.display = "flex";
+            return;
+        }
+        ready_button.style.display = "none";
+
+        document.getElementById('poker_table_container').classList.add('game-started');
+        arrangePlayersInCircle(players.map(player => player["id"]));
+        resetCommunityCards();
+        showCommunityCards(data["cards"]);
+        document.getElementById(data["dealer_id"] + "_dealer").style.display = "inline-block";
+        new PocketCardsHandler({"pocket_cards": data["pocket_cards"]}).handle();
+        if (data["hand"] !== null) {
+            new HandStrengthHandler({"hand": data["hand"]}).handle();
+        }
+        if (data["curr_player_id"] !== null) {
+            document.getElementById(data["curr_player_id"] + "_name").style.color = "green";
+        }
+        if (data["turn_request"] !== null) {
+            new TurnRequestHandler(data["turn_request"]).handle();
+        }
+    }
+}
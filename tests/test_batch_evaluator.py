@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from app.game.batch_evaluator import rank_hands
+from app.game.lookup_evaluator import evaluate_codes
+
+def test_matches_lookup_evaluator_row_by_row():
+    rng = np.random.default_rng(5)
+    hands = np.array([rng.permutation(52)[:7] for _ in range(3000)])
+    scores = rank_hands(hands, chunk_size=1000)
+    assert scores.tolist() == [evaluate_codes(hand.tolist()) for hand in hands]
+
+def test_five_and_six_card_hands():
+    rng = np.random.default_rng(6)
+    for cards_count in (5, 6):
+        hands = np.array([rng.permutation(52)[:cards_count] for _ in range(500)])
+        assert rank_hands(hands).tolist() == [evaluate_codes(hand.tolist()) for hand in hands]
+
+def test_rejects_bad_input():
+    with pytest.raises(ValueError):
+        rank_hands(np.zeros((3, 4), dtype=np.int64))
+    with pytest.raises(ValueError):
+        rank_hands(np.full((3, 7), 52))
+    with pytest.raises(ValueError):
+        rank_hands(np.array([[0, 4, 8, 12, 16], [0, 4, 8, 12, 12]]))
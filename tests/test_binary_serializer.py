@@ -0,0 +1,92 @@
+import asyncio
+import json
+import msgpack
+import pytest
+import app.main
+from app.game.binary_serializer import *
+from app.game.connection_manager import ConnectionManager
+from app.game.game_schema import *
+from app.game.game_serializer import encode_event, encode_frame
+from app.game.models import Player, Card
+from app.game.table_registry import TableSession
+from tests.test_connection_manager import FakeWebSocket
+from tests.test_game_serializer import sample_events
+
+def test_binary_messages_decode_to_the_json_ones():
+    messages = [json.loads(encode_event(game_phase, args)) for game_phase, args in sample_events()]
+    messages += [{"LOG": "hello"}, {"STATE_DELTA": {"version": 3, "patch": {"pot": 15, "curr_player_id": None}}},
+                 {"TURN_RESPONSE": {"action": "RAISE", "amount": 20}}, {"STATE_SYNC": {"version": 2}},
+                 {"UNKNOWN": {"kept": [1, 2]}}]
+    for message in messages:
+        assert decode_binary_frame(encode_binary_message(message)) == [message]
+    batch = encode_binary_batch([encode_binary_message(m) for m in messages])
+    assert decode_binary_frame(batch) == messages
+
+def test_binary_messages_are_compact():
+    player = Player(1000000000123, "123", 990)
+    cards = CommunityCardsArgs(cards=[Card('♠️', 'K'), Card('♦️', 'J'), Card('♥️', '7')])
+    result = TurnResultArgs(player=player, action=PlayerAction.RAISE, amount=20)
+    for game_phase, args in ((GamePhase.COMMUNITY_CARDS, cards), (GamePhase.TURN_RESULT, result)):
+        message = json.loads(encode_event(game_phase, args))
+        assert len(encode_binary_message(message)) * 2 < len(encode_frame(message).encode())
+    # 2 array headers, the type code, the 2 bytes header of the cards and a byte per card
+    assert len(encode_binary_message(json.loads(encode_event(GamePhase.COMMUNITY_CARDS, cards)))) == 8
+
+def test_each_format_is_encoded_once_per_broadcast():
+    async def scenario():
+        manager = ConnectionManager(batch_events=True)
+        json_client, bot, other_bot = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(json_client, 1)
+        await manager.connect(bot, 2, BINARY_SUBPROTOCOL)
+        await manager.connect(other_bot, 3, BINARY_SUBPROTOCOL)
+        assert bot.subprotocol == BINARY_SUBPROTOCOL and json_client.subprotocol is None
+
+        manager.broadcast_event(GamePhase.POT, PotArgs(pot=15))
+        await asyncio.sleep(0.01)
+        assert json_client.sent == [{"POT": {"pot": 15}}]
+        assert bot.sent == [[{"POT": {"pot": 15}}]]
+        assert bot.binary_sent[0] is other_bot.binary_sent[0]
+
+        manager.broadcast_event(GamePhase.POT, PotArgs(pot=30))
+        manager.send_event(2, GamePhase.TURN_REQUEST, TurnRequestArgs(player_bet=0, prev_bet=10, prev_raise=10,
+                                                                      options=[PlayerAction.CALL]))
+        await asyncio.sleep(0.01)
+        assert [next(iter(m)) for m in bot.sent[-1]] == ["POT", "TURN_REQUEST"]
+        assert other_bot.sent[-1] == [{"POT": {"pot": 30}}]
+        for id in (1, 2, 3):
+            manager.disconnect(id)
+    asyncio.run(scenario())
+
+def test_malformed_binary_frames_are_rejected():
+    for frame in (b"", b"\xc1", msgpack.packb(5), msgpack.packb([[1]]), msgpack.packb([99, 1]),
+                  msgpack.packb([[name for name, _ in MESSAGES].index("TURN_RESPONSE"), [len(PlayerAction), 0]])):
+        with pytest.raises(ValueError):
+            decode_binary_frame(frame)
+
+class BinaryClientWebSocket(FakeWebSocket):
+    def __init__(self):
+        super().__init__()
+        self.incoming: asyncio.Queue = asyncio.Queue()
+
+    async def receive_bytes(self) -> bytes:
+        return await self.incoming.get()
+
+def test_malformed_frame_folds_the_pending_turn(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(app.main, "negotiate_subprotocol", lambda session, websocket: BINARY_SUBPROTOCOL)
+        session = TableSession("t", "table")
+        client = BinaryClientWebSocket()
+        player_task = asyncio.create_task(app.main.play_at_table(session, client, 1000000001))
+        await asyncio.sleep(0.01)
+        turn = asyncio.create_task(session.connection_manager.request_turn(1000000001, TurnRequestArgs(
+            player_bet=0, prev_bet=10, prev_raise=10, options=[PlayerAction.CALL, PlayerAction.FOLD])))
+        await asyncio.sleep(0.01)
+        client.incoming.put_nowait(b"\xc1")
+        assert (await asyncio.wait_for(turn, 1)).action == PlayerAction.FOLD
+        # the connection keeps being read
+        client.incoming.put_nowait(encode_binary_message({"STATE_SYNC": {"version": None}}))
+        await asyncio.sleep(0.01)
+        assert not player_task.done()
+        player_task.cancel()
+        session.close()
+    asyncio.run(scenario())
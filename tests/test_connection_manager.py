@@ -0,0 +1,179 @@
+import asyncio
+import json
+from app.game.binary_serializer import decode_binary_frame
+from app.game.connection_manager import *
+from app.game.game_schema import TableStateArgs
+from app.game.game_serializer import encode_frame
+
+class FakeWebSocket:
+    def __init__(self, delay: float = 0):
+        self.delay = delay
+        self.sent = []
+        self.binary_sent = []
+        self.closed = False
+        self.close_code = None
+
+    async def accept(self, subprotocol: Optional[str] = None):
+        self.subprotocol = subprotocol
+
+    async def send_text(self, frame: str):
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(frame))
+
+    async def send_bytes(self, frame: bytes):
+        await asyncio.sleep(self.delay)
+        self.binary_sent.append(frame)
+        self.sent.append(decode_binary_frame(frame)) # a single message or a batch, both as a list
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+        self.close_code = code
+
+def test_slow_client_does_not_block_broadcast():
+    async def scenario():
+        manager = ConnectionManager()
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+        await manager.connect(fast, 1)
+        await manager.connect(slow, 2)
+        await asyncio.wait_for(manager.broadcast({"POT": {"pot": 5}}), timeout=0.1)
+        await manager.send_personal(1, {"LOG": "personal"})
+        await asyncio.sleep(0.01)
+        assert fast.sent == [{"POT": {"pot": 5}}, {"LOG": "personal"}]
+        assert slow.sent == []
+        manager.disconnect(1)
+        manager.disconnect(2)
+    asyncio.run(scenario())
+
+def test_full_queue_drops_connection():
+    async def scenario():
+        manager = ConnectionManager(max_queue_size=2, slow_policy=SlowConnectionPolicy.DROP)
+        stuck = FakeWebSocket(delay=10)
+        await manager.connect(stuck, 1)
+        for i in range(4):
+            await manager.broadcast({"LOG": i})
+        await asyncio.sleep(0)
+        assert 1 not in manager.active_connections
+        assert stuck.closed
+    asyncio.run(scenario())
+
+def test_full_queue_flags_connection():
+    async def scenario():
+        manager = ConnectionManager(max_queue_size=2, slow_policy=SlowConnectionPolicy.FLAG)
+        stuck = FakeWebSocket(delay=10)
+        await manager.connect(stuck, 1)
+        for i in range(5):
+            await manager.broadcast({"LOG": i})
+        connection = manager.active_connections[1]
+        assert connection.is_slow
+        assert connection.skipped_frames > 0
+        manager.disconnect(1)
+    asyncio.run(scenario())
+
+def test_slow_connection_gets_the_table_again_once_the_queue_drains():
+    async def scenario():
+        table_state = TableStateArgs(players=[], away_player_ids=[], folded_player_ids=[], is_game_started=True,
+                                     pot=40, cards=[], pocket_cards=[])
+        manager = ConnectionManager(max_queue_size=2, slow_policy=SlowConnectionPolicy.FLAG,
+                                    table_state=lambda id: table_state)
+        lagging = FakeWebSocket(delay=0.01)
+        await manager.connect(lagging, 1)
+        for i in range(5):
+            await manager.broadcast({"LOG": i})
+        connection = manager.active_connections[1]
+        assert connection.is_slow
+        await asyncio.sleep(0.1)
+        assert not connection.is_slow
+        assert lagging.sent[:2] == [{"LOG": 0}, {"LOG": 1}]
+        assert [next(iter(m)) for m in lagging.sent[2:]] == ["TABLE_STATE"]
+        assert lagging.sent[2]["TABLE_STATE"]["pot"] == 40
+        manager.disconnect(1)
+    asyncio.run(scenario())
+
+def test_frames_of_a_replaced_connection_leave_the_new_one_alone():
+    async def scenario():
+        manager = ConnectionManager(max_queue_size=1, batch_events=True)
+        old, new = FakeWebSocket(delay=10), FakeWebSocket()
+        await manager.connect(old, 1)
+        manager.broadcast_frame(encode_frame({"LOG": "queued"}))
+        manager.broadcast_frame(encode_frame({"LOG": "batched"}))
+        old_connection = manager.active_connections[1]
+        await manager.connect(new, 1)
+        turn = asyncio.Future()
+        manager.pending_turns[1] = turn
+        # the old connection's full queue and batch must not drop the new connection
+        manager._enqueue(old_connection, "{}")
+        manager.flush_batches()
+        await asyncio.sleep(0.01)
+        assert manager.active_connections[1].websocket is new
+        assert not turn.done()
+        manager.disconnect(1)
+    asyncio.run(scenario())
+
+def test_events_of_one_step_are_batched():
+    async def scenario():
+        manager = ConnectionManager(batch_events=True)
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(first, 1)
+        await manager.connect(second, 2)
+        await manager.broadcast({"TURN_RESULT": {"amount": 10}})
+        await manager.broadcast({"POT": {"pot": 25}})
+        await manager.send_personal(2, {"TURN_REQUEST": {"prev_bet": 10}})
+        await asyncio.sleep(0.01)
+        assert first.sent == [[{"TURN_RESULT": {"amount": 10}}, {"POT": {"pot": 25}}]]
+        assert second.sent == [[{"TURN_RESULT": {"amount": 10}}, {"POT": {"pot": 25}},
+                                {"TURN_REQUEST": {"prev_bet": 10}}]]
+
+        await manager.log("single")
+        await asyncio.sleep(0.01)
+        assert first.sent[-1] == {"LOG": "single"}
+        manager.disconnect(1)
+        manager.disconnect(2)
+    asyncio.run(scenario())
+
+def test_seat_and_turn_are_held_until_reconnect():
+    async def scenario():
+        manager = ConnectionManager(turn_clock=TableTurnClock(action_timeout=30, time_bank=60))
+        await manager.connect(FakeWebSocket(), 1)
+        request = TurnRequestArgs(player_bet=0, prev_bet=10, prev_raise=5,
+                                  options=[PlayerAction.CALL, PlayerAction.FOLD])
+        turn = asyncio.create_task(manager.request_turn(1, request))
+        await asyncio.sleep(0)
+        manager.hold_seat(1, lambda: None, grace=10)
+        assert 1 in manager.away and 1 not in manager.active_connections
+        assert not turn.done()
+
+        returned = FakeWebSocket()
+        await manager.reconnect(returned, 1)
+        assert 1 not in manager.away
+        pending = manager.pending_turn_request(1)
+        assert pending.options == request.options and 0 < pending.time_to_act <= 30
+        manager.process_turn_response(1, TurnResponse(action=PlayerAction.CALL, amount=10))
+        assert (await turn).action == PlayerAction.CALL
+        assert manager.pending_turn_request(1) is None
+        manager.disconnect(1)
+    asyncio.run(scenario())
+
+def test_expired_grace_folds_pending_turn():
+    async def scenario():
+        manager = ConnectionManager(reconnect_grace=0.01)
+        await manager.connect(FakeWebSocket(), 1)
+        left = []
+        turn = asyncio.create_task(manager.request_turn(1, TurnRequestArgs(
+            player_bet=0, prev_bet=10, prev_raise=5, options=[PlayerAction.CALL, PlayerAction.FOLD])))
+        await asyncio.sleep(0)
+        manager.hold_seat(1, lambda: left.append(1))
+        assert (await asyncio.wait_for(turn, 1)).action == PlayerAction.FOLD
+        assert left == [1] and 1 not in manager.away
+    asyncio.run(scenario())
+
+def test_new_connection_replaces_old_one():
+    async def scenario():
+        manager = ConnectionManager()
+        old, new = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(old, 1)
+        await manager.connect(new, 1)
+        await asyncio.sleep(0)
+        assert old.close_code == WS_REPLACED
+        assert manager.is_replaced(1, old) and not manager.is_replaced(1, new)
+        manager.disconnect(1)
+    asyncio.run(scenario())
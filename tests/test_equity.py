@@ -0,0 +1,80 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.game.equity import *
+from app.game.models import Card
+
+def test_aces_against_kings_preflop():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'A')], [Card('♦️', 'K'), Card('♣️', 'K')]]
+    res = MonteCarloEquityCalculator(seed=1, margin=0.01).calculate(pockets)
+    assert abs(res.equities[0] - 0.82) < 0.03
+    assert abs(sum(res.equities) - 1) < 1e-9
+    assert res.margin <= 0.01
+
+def test_same_seed_same_estimate():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'K')], [Card('♦️', '7'), Card('♣️', '7')],
+               [Card('♦️', 'Q'), Card('♦️', 'J')]]
+    board = [Card('♥️', '2'), Card('♦️', '9'), Card('♣️', 'K')]
+    res_1 = MonteCarloEquityCalculator(samples=2000, seed=42).calculate(pockets, board)
+    res_2 = MonteCarloEquityCalculator(samples=2000, seed=42).calculate(pockets, board)
+    assert res_1 == res_2
+
+def test_early_stop_before_sample_limit():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'A')], [Card('♦️', '7'), Card('♣️', '2')]]
+    res = MonteCarloEquityCalculator(samples=100000, seed=3, margin=0.02).calculate(pockets)
+    assert res.samples < 100000
+
+def test_complete_board_is_exact():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'K')], [Card('♦️', 'A'), Card('♣️', 'K')]]
+    board = [Card('♥️', '2'), Card('♦️', '9'), Card('♣️', '5'), Card('♠️', '8'), Card('♥️', 'J')]
+    res = MonteCarloEquityCalculator(seed=1).calculate(pockets, board)
+    assert res.samples == 1
+    assert res.ties == [1.0, 1.0]
+    assert res.equities == [0.5, 0.5]
+
+def test_dead_cards_cannot_be_dealt():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'K')], [Card('♦️', 'A'), Card('♣️', 'K')]]
+    with pytest.raises(ValueError):
+        MonteCarloEquityCalculator().calculate(pockets, dead=[Card('♥️', 'A')])
+
+def test_exhaustive_turn_matches_enumeration():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'K')], [Card('♦️', '7'), Card('♣️', '7')]]
+    board = [Card('♥️', '2'), Card('♦️', '9'), Card('♣️', 'K'), Card('♠️', '3')]
+    res = ExhaustiveEquityCalculator().calculate(pockets, board)
+    # 44 rivers, only the two remaining sevens save the pair of sevens
+    assert res.samples == 44
+    assert res.wins == [42 / 44, 2 / 44]
+
+def test_exhaustive_flop_in_process_pool():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'K')], [Card('♦️', '7'), Card('♣️', '7')],
+               [Card('♦️', 'Q'), Card('♦️', 'J')]]
+    board = [Card('♥️', '2'), Card('♦️', '9'), Card('♦️', 'K')]
+    inline = ExhaustiveEquityCalculator(chunk_size=10000).calculate(pockets, board)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        calculator = ExhaustiveEquityCalculator(executor=executor, chunk_size=100)
+        pooled = calculator.calculate(pockets, board)
+        pooled_async = asyncio.run(calculator.calculate_async(pockets, board))
+    assert pooled.samples == inline.samples == 903
+    assert pooled.wins == inline.wins
+    assert pooled_async.equities == pytest.approx(inline.equities)
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+def test_exhaustive_async_scores_a_single_chunk_in_the_executor():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'K')], [Card('♦️', '7'), Card('♣️', '7')]]
+    board = [Card('♥️', '2'), Card('♦️', '9'), Card('♣️', 'K'), Card('♠️', '3')]
+    with CountingExecutor() as executor:
+        res = asyncio.run(ExhaustiveEquityCalculator(executor=executor).calculate_async(pockets, board))
+    assert res.samples == 44
+    assert executor.submitted == 1
+
+def test_exhaustive_needs_flop():
+    pockets = [[Card('♥️', 'A'), Card('♠️', 'K')], [Card('♦️', '7'), Card('♣️', '7')]]
+    with pytest.raises(ValueError):
+        ExhaustiveEquityCalculator().calculate(pockets)
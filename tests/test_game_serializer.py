@@ -0,0 +1,39 @@
+import json
+from app.game.game_serializer import *
+from app.game.models import Player, Card
+
+def sample_events():
+    player, other = Player(1, "one", 1000), Player(2, "two", 990.5)
+    player.pocket_cards = [Card('♥️', 'A'), Card('♣️', '10')]
+    winner = ShowdownWinnerArgs(winner=player, won_pot=30, hand=HandValue.FLUSH, pocket_cards=player.pocket_cards)
+    loser = ShowdownLoserArgs(player=other, hand=HandValue.ONE_PAIR, pocket_cards=[Card('♦️', '2'), Card('♦️', '3')])
+    return [
+        (GamePhase.NEW_PLAYER, NewPlayerArgs(player=player)),
+        (GamePhase.PRE_START, PreStartArgs(prev_dealer=player, curr_dealer=other, ordered_player_ids=[1, 2])),
+        (GamePhase.PRE_FLOP_SB, PreFlopSBArgs(sb_amount=5, player=player)),
+        (GamePhase.PRE_FLOP_BB, PreFlopBBArgs(bb_amount=10, player=other)),
+        (GamePhase.COMMUNITY_CARDS, CommunityCardsArgs(cards=[Card('♠️', 'K'), Card('♦️', 'J'), Card('♥️', '7')])),
+        (GamePhase.POCKET_CARDS, PocketCardsArgs(pocket_cards=player.get_poket_cards_dict())),
+        (GamePhase.TURN_RESULT, TurnResultArgs(player=player, action=PlayerAction.RAISE, amount=20)),
+        (GamePhase.TURN_HIGHLIGHT, TurnHighlightArgs(prev_player=player, curr_player=other)),
+        (GamePhase.TURN_HIGHLIGHT, TurnHighlightArgs(prev_player=player)),
+        (GamePhase.POT, PotArgs(pot=15)),
+        (GamePhase.TURN_REQUEST, TurnRequestArgs(player_bet=5, prev_bet=10, prev_raise=5,
+                                                 options=[PlayerAction.CALL, PlayerAction.FOLD])),
+        (GamePhase.HAND_STRENGTH, HandStrengthArgs(hand=HandValue.TWO_PAIRS)),
+        (GamePhase.SHOWDOWN_WINNERS, ShowdownWinnerListArgs(winners=[winner])),
+        (GamePhase.SHOWDOWN_LOSERS, ShowdownLoserListArgs(losers=[loser])),
+        (GamePhase.IS_READY, IsReadyArgs(player_id=1, is_ready=True)),
+        (GamePhase.TABLE_STATE, TableStateArgs(
+            players=[player, other], away_player_ids=[2], folded_player_ids=[], is_game_started=True, pot=15,
+            cards=[Card('♠️', 'K'), Card('♦️', 'J'), Card('♥️', '7')], pocket_cards=player.pocket_cards,
+            hand=HandValue.ONE_PAIR, dealer_id=2, curr_player_id=1,
+            turn_request=TurnRequestArgs(player_bet=5, prev_bet=10, prev_raise=5, options=[PlayerAction.CALL],
+                                         time_to_act=12.5, time_bank=60))),
+        (GamePhase.TABLE_STATE, TableStateArgs(players=[player], away_player_ids=[], folded_player_ids=[],
+                                               is_game_started=False, pot=0, cards=[], pocket_cards=[])),
+    ]
+
+def test_encoders_match_model_dict():
+    for game_phase, args in sample_events():
+        assert json.loads(encode_event(game_phase, args)) == {game_phase.value: args.dict()}
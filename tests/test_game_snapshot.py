@@ -0,0 +1,135 @@
+import asyncio
+import marshal
+import time
+import pytest
+from app.game.game_snapshot import *
+from app.game.game_snapshot import SLOT_HEADER
+from app.game.replay import HandReplay, ScriptedGameHandler, read_hands
+from app.game.game import ConcreteGameBuilder
+from app.game.simulation import simulate
+from app.game.table_registry import TableRegistry
+
+@pytest.fixture(scope="module")
+def records(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("history") / "hands.log")
+    asyncio.run(simulate(40, ["random", "calling", "equity", "random"], seed=5, history_path=path))
+    return list(read_hands(path))
+
+def test_torn_write_falls_back_to_previous_snapshot(tmp_path):
+    path = str(tmp_path / "main.snap")
+    file = SnapshotFile(path)
+    file.save(b"first")
+    file.save(b"second")
+    assert file.load() == b"second"
+    # a crash in the middle of the next write leaves a slot whose crc does not match
+    file._map[SLOT_HEADER.size + 1] ^= 0xff
+    assert file.load() == b"first"
+    file.close()
+
+    reopened = SnapshotFile(path)
+    assert reopened.sequence == 1
+    reopened.save(b"third")
+    assert reopened.load() == b"third"
+    reopened.close()
+
+def test_interrupted_hands_resume_to_recorded_payouts(records, tmp_path):
+    async def crash_and_recover(record, action_index, path):
+        replay = HandReplay(record)
+        file = SnapshotFile(path)
+        replay.game.snapshotter = GameSnapshotter(file, "main", "Main table", record.sb_amount,
+                                                  record.bb_amount, record.sb_amount, 4)
+        await replay.step_to(action_index)
+        replay._game_task.cancel() # the process dies while the player thinks
+        file.close()
+
+        file = SnapshotFile(path)
+        snapshot = load_snapshot(file)
+        assert snapshot.has_hand
+        starting_chips = sum(p.balance for p in record.players)
+        assert sum(p[2] for p in snapshot.players) + snapshot.hand[1] == pytest.approx(starting_chips)
+
+        table = Table()
+        snapshot.restore_players(table)
+        game_handler = ScriptedGameHandler(table.players, record.sb_amount, record.bb_amount, record.actions)
+        game_handler.position = action_index
+        game_builder = ConcreteGameBuilder()
+        game_builder.set_game_handler(game_handler)
+        game_builder.set_table(table)
+        game_builder.set_small_blind_amount(record.sb_amount)
+        game_builder.set_big_blind_amount(record.bb_amount)
+        game_builder.set_min_raise_amount(record.sb_amount)
+        game = game_builder.get_built_game()
+        snapshot.restore_game(game)
+        await game.resume_game()
+        file.close()
+
+        assert game_handler.position == len(record.actions)
+        assert game_handler.payouts == record.payouts
+        assert sum(p.balance for p in game.players) == pytest.approx(starting_chips)
+
+    async def scenario():
+        for i, record in enumerate(records):
+            if record.actions:
+                await crash_and_recover(record, i % len(record.actions), str(tmp_path / f"{i}.snap"))
+    asyncio.run(scenario())
+
+def test_registry_restores_tables(tmp_path):
+    registry = TableRegistry(snapshot_store=SnapshotStore(str(tmp_path)))
+    session = registry.create_table("restored", sb_amount=10, bb_amount=20, table_id="t1")
+    session.table.add_player(Player(1, "one", 990))
+    session.save_snapshot()
+    session.close()
+
+    restarted = TableRegistry(snapshot_store=SnapshotStore(str(tmp_path)))
+    restored = restarted.restore_table("t1")
+    assert (restored.name, restored.bb_amount) == ("restored", 20)
+    assert [(p.id, p.balance) for p in restored.table.players] == [(1, 990)]
+    assert not restored.is_game_started
+
+    restarted.remove_table("t1")
+    assert SnapshotStore(str(tmp_path)).table_ids() == []
+
+def test_snapshot_takes_microseconds(records, tmp_path):
+    async def scenario():
+        replay = HandReplay(max(records, key=lambda r: len(r.actions)))
+        await replay.step_to(1)
+        return replay
+    replay = asyncio.run(scenario())
+    file = SnapshotFile(str(tmp_path / "bench.snap"))
+    snapshotter = GameSnapshotter(file, "main", "Main table", 5, 10, 5, 4)
+    runs = 2000
+    started = time.perf_counter()
+    for _ in range(runs):
+        snapshotter.save(replay.game.table, replay.game)
+    per_snapshot = (time.perf_counter() - started) / runs
+    assert TableSnapshot(marshal.loads(file.load())).has_hand
+    assert per_snapshot < 200e-6 # generous bound for slow CI machines, typically a few microseconds
+    file.close()
+
+def test_players_outside_the_hand_keep_their_seats(records):
+    async def scenario():
+        record = next(r for r in records if len(r.actions) > 2)
+        replay = HandReplay(record)
+        await replay.step_to(1)
+        table = replay.game.table
+        left = table.players[0]
+        table.add_player(Player(90, "busted", 0))
+        table.add_player(Player(91, "joined", 1000))
+        table.remove_player(left.id)
+        snapshot = TableSnapshot(capture_snapshot(("main", "Main table", 5, 10, 5, 4), table, replay.game))
+        replay._game_task.cancel()
+
+        restored = Table()
+        snapshot.restore_players(restored)
+        assert [p.id for p in restored.players] == [p.id for p in table.players]
+        assert [(p.id, p.balance) for p in restored.players[-2:]] == [(90, 0), (91, 1000)]
+        game_handler = ScriptedGameHandler(restored.players, record.sb_amount, record.bb_amount, record.actions)
+        game_handler.position = 1
+        game_builder = ConcreteGameBuilder()
+        game_builder.set_game_handler(game_handler)
+        game_builder.set_table(restored)
+        game = game_builder.get_built_game()
+        snapshot.restore_game(game)
+        assert [p.id for p in game.players] == [p.id for p in record.players]
+        assert game.players[0].balance == left.balance and left.id not in restored.seats
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import asyncio
+from app.game.hand_history import *
+from app.game.simulation import simulate
+
+def make_record() -> HandRecord:
+    players = [Player(1, "one", 1000), Player(2, "двa", 990.5)]
+    record = HandRecord.start("main", 1, 5, 10, players, deck_seed=7)
+    record.sb_pos, record.bb_pos = 0, 1
+    record.set_pocket_cards(1, [Card('♥️', 'A'), Card('♣️', '10')])
+    record.set_pocket_cards(2, [Card('♦️', '2'), Card('♦️', '3')])
+    record.add_action(0, 1, PlayerAction.CALL, 10)
+    record.add_action(0, 2, PlayerAction.CHECK, 10)
+    record.add_action(3, 1, PlayerAction.RAISE, 20)
+    record.add_action(3, 2, PlayerAction.FOLD, 0)
+    record.board = [0, 1, 2]
+    record.add_payout(1, 40)
+    return record
+
+def test_writer_and_reader_round_trip(tmp_path):
+    path = str(tmp_path / "hands.log")
+    record = make_record()
+    writer = HandHistoryWriter(path, FsyncPolicy.ALWAYS)
+    for _ in range(3):
+        writer.append(record)
+    writer.close()
+
+    hands = list(read_hands(path))
+    assert len(hands) == 3
+    hand = hands[0]
+    assert (hand.table_id, hand.hand_id, hand.dealer_pos, hand.sb_pos, hand.bb_pos) == ("main", record.hand_id, 1, 0, 1)
+    assert hand.players == record.players
+    assert hand.actions == record.actions
+    assert hand.board == [0, 1, 2]
+    assert hand.payouts == [HandPayout(1, 40)]
+
+def test_torn_tail_is_truncated_before_appending(tmp_path):
+    path = str(tmp_path / "hands.log")
+    writer = HandHistoryWriter(path)
+    writer.append(make_record())
+    writer.close()
+    with open(path, 'ab') as file:
+        file.write(encode_record(make_record())[:-7])
+
+    assert len(list(read_hands(path))) == 1
+    writer = HandHistoryWriter(path)
+    writer.append(make_record())
+    writer.close()
+    assert len(list(read_hands(path))) == 2
+
+def test_simulated_hands_are_recorded(tmp_path):
+    path = str(tmp_path / "hands.log")
+    asyncio.run(simulate(50, ["random", "calling", "random"], seed=5, history_path=path))
+    hands = list(read_hands(path))
+    assert len(hands) == 50
+    for hand in hands:
+        assert all(len(p.pocket_cards) == 2 for p in hand.players)
+        assert len(hand.board) == 5
+        assert hand.payouts and sum(p.amount for p in hand.payouts) >= hand.sb_amount + hand.bb_amount
+
+def test_seed_0_and_a_missing_seed_stay_apart():
+    record = make_record()
+    for deck_seed in (0, None, 2 ** 63 - 1):
+        record.deck_seed = deck_seed
+        assert decode_record(encode_record(record)[LENGTH.size:]).deck_seed == deck_seed
+
+def test_long_names_are_cut_on_a_character_boundary():
+    record = make_record()
+    record.players[0] = record.players[0]._replace(name="a" + "♠️" * 60)
+    name = decode_record(encode_record(record)[LENGTH.size:]).players[0].name
+    assert len(name.encode()) <= 255 and name == "a" + "♠️" * 42
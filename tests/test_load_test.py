@@ -0,0 +1,50 @@
+import asyncio
+import socket
+import pytest
+import app.main
+from app.game.payload_compression import PayloadCompressor
+from app.game.table_registry import TableRegistry
+from app.load_test import percentile, run_with_server
+
+# every test gets its own tables, history and snapshots, seats held for the clients of a previous test
+# cannot get in the way
+@pytest.fixture
+def port(tmp_path, monkeypatch):
+    monkeypatch.setattr(app.main, "table_registry", TableRegistry(
+        reconnect_grace=app.main.RECONNECT_GRACE, spectator_delay=app.main.SPECTATOR_DELAY,
+        compressor=PayloadCompressor(app.main.COMPRESSION_LEVEL, app.main.COMPRESSION_THRESHOLD)))
+    monkeypatch.setattr(app.main, "HAND_HISTORY_DIR", str(tmp_path))
+    monkeypatch.setattr(app.main, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_percentile_is_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3
+    assert percentile([], 50) == 0
+
+def test_load_test_plays_hands_against_local_server(port, tmp_path):
+    report = asyncio.run(asyncio.wait_for(run_with_server(port, tables=2, players=4, hands=1), 30))
+    assert "2 tables x 4 players x 1 hands" in report
+    assert "turn response -> request" in report
+    assert "broadcast fan-out" in report
+    assert (tmp_path / "hands-0.log").exists()
+
+def test_load_test_follows_state_deltas(port):
+    report = asyncio.run(asyncio.wait_for(run_with_server(port, tables=1, players=4, hands=2, deltas=True), 30))
+    assert "1 tables x 4 players x 2 hands" in report
+    assert "broadcast fan-out" in report
+
+def test_load_test_speaks_the_binary_protocol(port):
+    report = asyncio.run(asyncio.wait_for(run_with_server(port, tables=1, players=4, hands=2, binary=True), 30))
+    assert "1 tables x 4 players x 2 hands" in report
+    assert "turn response -> request" in report
+
+def test_load_test_receives_deflated_frames(port):
+    report = asyncio.run(asyncio.wait_for(run_with_server(port, tables=1, players=4, hands=1, compress=True,
+                                                          transport_deflate=False), 30))
+    assert "1 tables x 4 players x 1 hands" in report
+    assert "compression {" in report and '"compressed_frames": 0' not in report
@@ -0,0 +1,85 @@
+import random
+from itertools import combinations
+import pytest
+from app.game.hand_evaluator import *
+from app.game.lookup_evaluator import *
+
+def test_matches_chain_hand_values():
+    hands = [
+        ([Card('♥️', '10'), Card('♥️', 'J'), Card('♥️', 'Q'), Card('♦️', '7'), Card('♥️', 'A')],
+         [Card('♥️', 'K'), Card('♣️', '7')]),
+        ([Card('♥️', '10'), Card('♥️', 'J'), Card('♥️', 'Q'), Card('♣️', '2'), Card('♥️', 'K')],
+         [Card('♣️', '8'), Card('♥️', '9')]),
+        ([Card('♥️', '10'), Card('♣️', '10'), Card('♠️', '10'), Card('♣️', '2'), Card('♥️', '2')],
+         [Card('♦️', '10'), Card('♥️', 'K')]),
+        ([Card('♥️', 'A'), Card('♣️', 'A'), Card('♠️', 'A'), Card('♣️', '2'), Card('♥️', '3')],
+         [Card('♦️', '2'), Card('♥️', 'K')]),
+        ([Card('♥️', 'J'), Card('♥️', '2'), Card('♥️', '8'), Card('♣️', '4'), Card('♥️', '3')],
+         [Card('♣️', '2'), Card('♥️', '10')]),
+        ([Card('♥️', 'K'), Card('♣️', '9'), Card('♥️', '8'), Card('♣️', '6'), Card('♥️', '7')],
+         [Card('♣️', 'Q'), Card('♥️', '10')]),
+        ([Card('♥️', 'A'), Card('♣️', 'K'), Card('♥️', 'K'), Card('♣️', '6'), Card('♥️', '7')],
+         [Card('♦️', 'K'), Card('♥️', '10')]),
+        ([Card('♥️', '2'), Card('♣️', '4'), Card('♥️', '6'), Card('♣️', '8'), Card('♥️', '4')],
+         [Card('♦️', '8'), Card('♥️', '3')]),
+        ([Card('♥️', 'K'), Card('♣️', '8'), Card('♥️', 'Q'), Card('♣️', '2'), Card('♥️', '7')],
+         [Card('♦️', 'K'), Card('♥️', '3')]),
+        ([Card('♥️', 'K'), Card('♣️', '8'), Card('♥️', 'Q'), Card('♣️', '2'), Card('♥️', '7')],
+         [Card('♦️', '4'), Card('♥️', '3')]),
+    ]
+    for comm_cards, pocket_cards in hands:
+        expected = RoyalFlushEvaluator().evaluate_hand(comm_cards, pocket_cards)
+        res = LookupHandEvaluator().evaluate_hand(comm_cards, pocket_cards)
+        assert res.hand_value == expected.hand_value
+        assert res.highest_in_hand_value == expected.highest_in_hand_value
+        assert res.highest_in_hand_value_2 == expected.highest_in_hand_value_2
+
+def test_wheel_straight():
+    comm_cards = [Card('♥️', 'A'), Card('♣️', '2'), Card('♥️', '3'),
+                  Card('♣️', 'K'), Card('♥️', '9')]
+    pocket_cards = [Card('♦️', '4'), Card('♥️', '5')]
+    res = LookupHandEvaluator().evaluate_hand(comm_cards, pocket_cards)
+    assert res.hand_value == HandValue.STRAIGHT
+    assert res.highest_in_hand_value == 5
+
+def test_kicker_decides_between_same_pairs():
+    comm_cards = [Card('♥️', 'K'), Card('♣️', '8'), Card('♥️', '6'),
+                  Card('♣️', '2'), Card('♥️', '3')]
+    ace_kicker = LookupHandEvaluator().evaluate_hand(comm_cards, [Card('♦️', 'K'), Card('♠️', 'A')])
+    queen_kicker = LookupHandEvaluator().evaluate_hand(comm_cards, [Card('♠️', 'K'), Card('♦️', 'Q')])
+    assert ace_kicker > queen_kicker
+    assert not queen_kicker > ace_kicker
+
+def test_split_on_board_plays():
+    comm_cards = [Card('♥️', '10'), Card('♣️', 'J'), Card('♥️', 'Q'),
+                  Card('♣️', 'K'), Card('♦️', 'A')]
+    res_1 = LookupHandEvaluator().evaluate_hand(comm_cards, [Card('♦️', '2'), Card('♠️', '3')])
+    res_2 = LookupHandEvaluator().evaluate_hand(comm_cards, [Card('♠️', '4'), Card('♦️', '5')])
+    assert res_1 == res_2
+    assert (res_1 > res_2) is None
+
+def test_seven_cards_score_is_best_five():
+    rng = random.Random(7)
+    for _ in range(300):
+        codes = rng.sample(range(52), 7)
+        best = max(evaluate_codes(five) for five in combinations(codes, 5))
+        assert evaluate_codes(codes) == best
+        assert evaluate_codes(codes[:6]) == max(evaluate_codes(five) for five in combinations(codes[:6], 5))
+
+def test_rejects_incomplete_hand():
+    with pytest.raises(ValueError):
+        evaluate_cards([Card('♥️', '10'), Card('♣️', 'J'), Card('♥️', 'Q'), Card('♣️', 'K')])
+
+def test_incremental_evaluator_follows_streets():
+    pocket_cards = [Card('♦️', 'K'), Card('♥️', '3')]
+    hand_evaluator = IncrementalHandEvaluator(pocket_cards)
+    assert hand_evaluator.hand_value == HandValue.HIGH_CARD
+
+    flop = [Card('♥️', 'K'), Card('♣️', '8'), Card('♥️', 'Q')]
+    hand_evaluator.add_cards(flop)
+    assert hand_evaluator.hand_value == HandValue.ONE_PAIR
+
+    turn_river = [Card('♣️', '3'), Card('♥️', '7')]
+    hand_evaluator.add_cards(turn_river)
+    assert hand_evaluator.hand_value == HandValue.TWO_PAIRS
+    assert hand_evaluator.evaluated_hand() == LookupHandEvaluator().evaluate_hand(flop + turn_river, pocket_cards)
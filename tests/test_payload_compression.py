@@ -0,0 +1,85 @@
+import asyncio
+import json
+import zlib
+import pytest
+from app.game.connection_manager import ConnectionManager
+from app.game.game_schema import *
+from app.game.game_serializer import encode_event, encode_frame
+from app.game.models import Player
+from app.game.payload_compression import *
+from tests.test_connection_manager import FakeWebSocket
+
+class DeflateWebSocket(FakeWebSocket):
+    async def send_bytes(self, frame: bytes):
+        self.binary_sent.append(frame)
+        self.sent.append(json.loads(decompress_frame(frame)))
+
+def showdown_frame() -> str:
+    players = [Player(1000000000000 + i, f"{i:04}", 1000 - i * 10) for i in range(6)]
+    winners = ShowdownWinnerListArgs(winners=[ShowdownWinnerArgs(winner=p, won_pot=60, hand=HandValue.FLUSH,
+                                                                 pocket_cards=[]) for p in players[:2]])
+    return encode_event(GamePhase.SHOWDOWN_WINNERS, winners)
+
+def test_only_long_frames_are_compressed():
+    compressor = PayloadCompressor(level=6, threshold=256)
+    short = encode_frame({"LOG": "Player 0001 joined"})
+    assert compressor.compress(short) is short
+    frame = showdown_frame()
+    compressed = compressor.compress(frame)
+    assert isinstance(compressed, bytes)
+    assert decompress_frame(compressed) == frame
+    assert compressor.to_dict()["frames"] == 2
+    assert compressor.compressed_frames == 1
+    assert compressor.original_bytes - compressor.compressed_bytes == compressor.to_dict()["saved_bytes"] > 0
+    # the threshold counts bytes, a suit takes several of them
+    suits = encode_frame({"LOG": "♠️" * 60})
+    assert len(suits) < 256 <= len(suits.encode())
+    assert isinstance(compressor.compress(suits), bytes)
+
+def test_dictionary_of_field_names_shrinks_frames():
+    frame = showdown_frame().encode()
+    plain = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+    without_dictionary = len(plain.compress(frame) + plain.flush())
+    assert len(PayloadCompressor(threshold=0).compress(frame.decode())) < without_dictionary
+    with pytest.raises(ValueError):
+        PayloadCompressor(level=0)
+
+def test_broadcast_is_compressed_once_for_deflate_clients():
+    async def scenario():
+        compressor = PayloadCompressor(threshold=256)
+        manager = ConnectionManager(compressor=compressor)
+        json_client, first, second = FakeWebSocket(), DeflateWebSocket(), DeflateWebSocket()
+        await manager.connect(json_client, 1)
+        await manager.connect(first, 2, DEFLATE_SUBPROTOCOL)
+        await manager.connect(second, 3, DEFLATE_SUBPROTOCOL)
+        frame = showdown_frame()
+        manager.broadcast_frame(frame)
+        await manager.log("short")
+        await asyncio.sleep(0.01)
+
+        assert json_client.sent == second.sent == [json.loads(frame), {"LOG": "short"}]
+        assert first.binary_sent[0] is second.binary_sent[0]
+        assert compressor.frames == 4 and compressor.compressed_frames == 2
+        for id in (1, 2, 3):
+            manager.disconnect(id)
+        with pytest.raises(ValueError):
+            await ConnectionManager().connect(FakeWebSocket(), 4, DEFLATE_SUBPROTOCOL)
+    asyncio.run(scenario())
+
+def test_batched_broadcast_is_compressed_once():
+    async def scenario():
+        compressor = PayloadCompressor(threshold=256)
+        manager = ConnectionManager(batch_events=True, compressor=compressor)
+        clients = [DeflateWebSocket() for _ in range(10)]
+        for id, client in enumerate(clients):
+            await manager.connect(client, id, DEFLATE_SUBPROTOCOL)
+        for _ in range(2):
+            manager.broadcast_frame(showdown_frame())
+            manager.broadcast_frame(encode_frame({"LOG": "hand over"}))
+            await asyncio.sleep(0.01)
+        assert all(len(client.binary_sent) == 2 for client in clients)
+        for i in range(2):
+            assert all(client.binary_sent[i] is clients[0].binary_sent[i] for client in clients)
+        for id in range(len(clients)):
+            manager.disconnect(id)
+    asyncio.run(scenario())
@@ -0,0 +1,65 @@
+import asyncio
+import random
+from app.game.pot_ledger import PotLedger, Pot
+from app.game.replay import replay_hand
+from app.game.hand_history import read_hands
+from app.game.simulation import simulate
+
+def make_ledger(contributions):
+    ledger = PotLedger()
+    for player_id, amount in contributions.items():
+        ledger.add(player_id, amount)
+    return ledger
+
+def test_side_pots_at_all_in_levels():
+    # 1 is all-in for 20, 2 for 50, 3 and 4 bet 100, 5 folded after putting in 30
+    ledger = make_ledger({1: 20, 2: 50, 3: 100, 4: 100, 5: 30})
+    assert ledger.build_pots([1, 2, 3, 4]) == [
+        Pot(100, 20, [1, 2, 3, 4]),
+        Pot(100, 50, [2, 3, 4]),
+        Pot(100, 100, [3, 4]),
+    ]
+    assert ledger.total == 300
+
+def test_bets_of_folded_players_go_to_the_last_pot():
+    ledger = make_ledger({1: 10, 2: 40})
+    assert ledger.build_pots([1]) == [Pot(50, 10, [1])]
+
+def test_short_stack_wins_only_the_main_pot():
+    ledger = make_ledger({1: 20, 2: 50, 3: 100, 4: 100, 5: 30})
+    payouts = ledger.award([1, 2, 3, 4], {1: 9, 2: 5, 3: 7, 4: 1})
+    assert payouts == {1: 100, 3: 200}
+
+def test_split_remainder_goes_to_the_first_winner_in_seat_order():
+    ledger = make_ledger({1: 11, 2: 10, 3: 10})
+    assert ledger.award([3, 2], {2: 4, 3: 4}) == {3: 16, 2: 15}
+
+def test_ten_players_with_many_side_pots():
+    rng = random.Random(7)
+    for _ in range(200):
+        ledger = make_ledger({i: rng.choice([10, 20, 35, 50, 80, 100]) for i in range(10)})
+        live_ids = [i for i in range(10) if rng.random() < 0.8] or [0]
+        scores = {i: rng.randint(0, 5) for i in live_ids}
+
+        # every pot ranked on its own gives the same payouts
+        expected = {}
+        for pot in ledger.build_pots(live_ids):
+            best = max(scores[i] for i in pot.eligible_ids)
+            winners = [i for i in live_ids if i in pot.eligible_ids and scores[i] == best]
+            for k, player_id in enumerate(winners):
+                share = pot.amount // len(winners) + (pot.amount % len(winners) if k == 0 else 0)
+                expected[player_id] = expected.get(player_id, 0) + share
+        assert ledger.award(live_ids, scores) == expected
+        assert sum(expected.values()) == ledger.total
+
+def test_short_stacks_go_all_in_and_hands_replay(tmp_path):
+    path = str(tmp_path / "hands.log")
+    asyncio.run(simulate(200, ["random", "calling", "equity", "random", "calling"], seed=11, balance=60,
+                         history_path=path))
+    records = list(read_hands(path))
+    assert any(len(record.payouts) > 1 for record in records)
+
+    async def replay_all():
+        for record in records:
+            assert (await replay_hand(record)).matches
+    asyncio.run(replay_all())
@@ -0,0 +1,33 @@
+import pytest
+from app.game.models import Card
+from app.game.preflop_table import *
+
+def test_shipped_table_lookups():
+    table = get_preflop_table()
+    aces = table.equity(Card('♥️', 'A'), Card('♠️', 'A'))
+    assert abs(aces - 0.85) < 0.02
+    assert table.equity(Card('♥️', 'A'), Card('♥️', 'K')) > table.equity(Card('♥️', 'A'), Card('♣️', 'K'))
+    assert table.equity(Card('♥️', '7'), Card('♣️', '2')) < 0.4
+    assert table.equity(Card('♥️', 'A'), Card('♠️', 'A'), opponents=9) < aces
+
+def test_hand_classes_are_unique():
+    names = {hand_class_name(i) for i in range(HAND_CLASSES)}
+    assert len(names) == HAND_CLASSES
+    assert hand_class_index(Card('♦️', 'K'), Card('♦️', 'Q')) == hand_class_index(Card('♠️', 'Q'), Card('♠️', 'K'))
+
+def test_rebuild_round_trip(tmp_path):
+    path = str(tmp_path / 'preflop.bin')
+    build_table(path, samples=20, max_opponents=2, seed=3, workers=1)
+    table = PreflopEquityTable(path)
+    assert table.max_opponents == 2
+    assert 0 <= table.equity(Card('♥️', 'A'), Card('♠️', 'A'), opponents=2) <= 1
+    with pytest.raises(ValueError):
+        table.equity(Card('♥️', 'A'), Card('♠️', 'A'), opponents=3)
+    table.close()
+
+def test_rebuild_with_workers_matches_serial_build(tmp_path):
+    serial, parallel = str(tmp_path / 'serial.bin'), str(tmp_path / 'parallel.bin')
+    build_table(serial, samples=5, max_opponents=1, seed=3, workers=1)
+    build_table(parallel, samples=5, max_opponents=1, seed=3, workers=2)
+    with open(serial, 'rb') as a, open(parallel, 'rb') as b:
+        assert a.read() == b.read()
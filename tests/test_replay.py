@@ -0,0 +1,48 @@
+import asyncio
+import copy
+import pytest
+from app.game.replay import *
+from app.game.simulation import simulate
+
+@pytest.fixture(scope="module")
+def records(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("history") / "hands.log")
+    asyncio.run(simulate(100, ["random", "calling", "equity", "random"], seed=11, history_path=path))
+    return list(read_hands(path))
+
+def test_seeded_deck_is_reproducible():
+    table_1, table_2 = Table(), Table()
+    table_1.reset_deck(42)
+    table_2.get_cards(7)
+    table_2.reset_deck(42)
+    assert table_1.get_cards(52) == table_2.get_cards(52)
+
+def test_replay_reaches_recorded_payouts(records):
+    async def scenario():
+        for record in records:
+            result = await replay_hand(record)
+            assert result.matches, result.mismatches
+    asyncio.run(scenario())
+
+def test_replay_steps_to_any_action(records):
+    record = max(records, key=lambda r: len(r.actions))
+    async def scenario():
+        replay = HandReplay(record)
+        state = await replay.step_to(2)
+        assert state.actions_played == 2
+        assert state.next_action == record.actions[2]
+        assert state.pot >= record.sb_amount + record.bb_amount
+        state = await replay.step_to(len(record.actions) - 1)
+        assert state.next_action == record.actions[-1]
+        with pytest.raises(ValueError):
+            await replay.step_to(0)
+        assert (await replay.finish()).matches
+    asyncio.run(scenario())
+
+def test_replay_detects_divergence(records):
+    # a copy, the records are shared by the tests of the module
+    record = copy.copy(records[0])
+    record.actions = list(record.actions)
+    record.actions[0] = record.actions[0]._replace(player_id=-1)
+    with pytest.raises(ReplayDivergenceError):
+        asyncio.run(replay_hand(record))
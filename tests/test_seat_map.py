@@ -0,0 +1,49 @@
+import pytest
+from app.game.models import Player
+from app.game.seat_map import SeatMap
+from app.game.table import Table
+
+def make_seats(count, balance=100):
+    return SeatMap([Player(i + 1, f"p{i + 1}", balance) for i in range(count)])
+
+def test_lookup_by_id_and_seat():
+    seats = make_seats(4)
+    assert seats.seat_of(3) == 2
+    assert seats.get(3) is seats.players[2]
+    assert seats.get(9) is None
+    assert 4 in seats and 9 not in seats
+
+def test_ring_skips_folded_and_all_in_players():
+    seats = make_seats(6)
+    seats.fold(1)
+    seats.set_all_in(2)
+    seats.fold(3)
+    assert seats.next_to_act(0) == 4
+    # a seat that left the ring still leads to the next one that can act
+    assert seats.next_to_act(1) == 4
+    assert seats.first_to_act(2) == 4
+    assert seats.next_to_act(5) == 0
+    assert seats.active_count == 4
+    assert seats.can_act_count == 3
+    assert [p.id for p in seats.active_players(start=4)] == [5, 6, 1, 3]
+    assert seats.ids(seats.folded) == [2, 4]
+    assert seats.bits([2, 4]) == seats.folded
+
+def test_nobody_left_to_act():
+    seats = make_seats(3)
+    for seat in range(3):
+        seats.set_all_in(seat)
+    assert seats.can_act_count == 0
+    assert seats.next_to_act(1) == 1
+
+def test_removing_a_player_moves_the_next_seats_up():
+    table = Table()
+    for i in range(1, 5):
+        table.add_player(Player(i, f"p{i}", 100))
+    players = table.players
+    table.remove_player(2)
+    assert [p.id for p in players] == [1, 3, 4]
+    assert table.seats.seat_of(4) == 2
+    assert table.get_player(2) is None
+    with pytest.raises(ValueError):
+        table.add_player(Player(3, "p3", 100))
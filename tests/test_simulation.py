@@ -0,0 +1,96 @@
+import asyncio
+import random
+import pytest
+from app.game.game_states import ShowdownState
+from app.game.lookup_evaluator import IncrementalHandEvaluator
+from app.game.seat_map import SeatMap
+from app.game.simulation import *
+
+def test_simulation_conserves_chips():
+    report = asyncio.run(simulate(300, ["random", "calling", "equity", "random"], seed=3))
+    assert report.hands == 300
+    assert report.events > 0
+    assert set(report.state_times) == {"PreFlopState", "FlopState", "TurnState", "RiverState", "ShowdownState"}
+
+def test_simulation_is_seeded_without_the_global_generator():
+    reports, draws_after = [], []
+    for global_seed in (1, 2):
+        random.seed(global_seed)
+        reports.append(asyncio.run(simulate(50, ["random", "equity"], seed=5)))
+        draws_after.append(random.random())
+    assert reports[0].events == reports[1].events and reports[0].rebuys == reports[1].rebuys
+    # the global generator went on from where the caller left it instead of being seeded again
+    assert draws_after[0] != draws_after[1]
+
+def test_simulation_rejects_unknown_strategy():
+    with pytest.raises(ValueError):
+        asyncio.run(simulate(1, ["random", "bluffer"]))
+
+def test_split_pot_without_small_blind():
+    table = Table()
+    for i in range(1, 4):
+        table.add_player(Player(i, f"p{i}", 100))
+    game = Game()
+    game.table, game.seats, game.pot, game.sb_pos = table, SeatMap(table.players), 31, 0
+    for player_id, amount in [(1, 11), (2, 10), (3, 10)]:
+        game.pot_ledger.add(player_id, amount)
+    board = [Card('♥️', '10'), Card('♥️', 'J'), Card('♥️', 'Q'), Card('♥️', 'K'), Card('♥️', 'A')]
+    for player, pocket in zip(table.players, [[Card('♣️', '2'), Card('♣️', '3')],
+                                              [Card('♦️', '2'), Card('♦️', '3')],
+                                              [Card('♠️', '2'), Card('♠️', '3')]]):
+        player.pocket_cards = pocket
+        game.hand_evaluators[player.id] = IncrementalHandEvaluator(pocket)
+        game.hand_evaluators[player.id].add_cards(board)
+    game.seats.fold(0)
+
+    winners, losers = ShowdownState(game).process_showdown()
+    assert [(w.winner.id, w.won_pot) for w in winners.winners] == [(2, 16), (3, 15)]
+    assert [p.balance for p in table.players] == [100, 116, 115]
+
+def test_busted_player_sits_out():
+    class RecordingGameHandler(SimulatedGameHandler):
+        def __init__(self, *args):
+            super().__init__(*args)
+            self.events = []
+
+        async def broadcast(self, game_phase, abs_game_phase_args):
+            self.events.append((game_phase, abs_game_phase_args))
+            await super().broadcast(game_phase, abs_game_phase_args)
+
+    table = Table()
+    for i, balance in enumerate([1000, 0, 1000, 1000], start=1):
+        table.add_player(Player(i, f"p{i}", balance))
+    game_handler = RecordingGameHandler(table.players, 5, 10, {i: CallingStationBot() for i in range(1, 5)})
+    game_builder = ConcreteGameBuilder()
+    game_builder.set_game_handler(game_handler)
+    game_builder.set_table(table)
+    game_builder.set_small_blind_amount(5)
+    game_builder.set_big_blind_amount(10)
+    game_builder.set_min_raise_amount(5)
+    game = game_builder.get_built_game()
+
+    dealers = []
+    for hand in range(4):
+        asyncio.run(game.start_game(deck_seed=hand))
+        assert 2 not in game.seats and table.players[1].balance == 0
+        dealers.append(game.players[game.curr_dealer_pos].id)
+    assert dealers == [1, 3, 4, 1]
+    for game_phase, args in game_handler.events:
+        match game_phase:
+            case GamePhase.PRE_START:
+                assert args.ordered_player_ids == [1, 3, 4]
+            case GamePhase.PRE_FLOP_SB | GamePhase.PRE_FLOP_BB | GamePhase.TURN_RESULT:
+                assert args.player.id != 2
+            case GamePhase.SHOWDOWN_WINNERS:
+                assert all(w.winner.id != 2 for w in args.winners)
+    assert sum(p.balance for p in table.players) == 3000
+
+def test_hand_needs_two_players_with_chips():
+    table = Table()
+    for i, balance in enumerate([1000, 0, 0], start=1):
+        table.add_player(Player(i, f"p{i}", balance))
+    game = Game()
+    game.table = table
+    with pytest.raises(ValueError):
+        asyncio.run(game.start_game())
+    assert not game.is_game_started
@@ -0,0 +1,122 @@
+import asyncio
+import gc
+import json
+import time
+from app.game.connection_manager import ConnectionManager
+from app.game.game_schema import *
+from app.game.game_serializer import encode_event, encode_frame
+from app.game.models import Player
+from app.game.spectator_feed import SpectatorFeed
+from app.game.table_registry import TableSession
+from app.main import watch_table
+from tests.test_connection_manager import FakeWebSocket
+
+async def collect(feed: SpectatorFeed, into: list):
+    async for frames in feed.follow():
+        into.extend(json.loads(frame) for frame in frames)
+
+def test_private_events_are_redacted_and_public_ones_delayed():
+    async def scenario():
+        feed = SpectatorFeed(delay=0.05, interval=0.01)
+        manager = ConnectionManager(spectator_feed=feed)
+        received = []
+        watcher = asyncio.create_task(collect(feed, received))
+        await asyncio.sleep(0)
+
+        manager.broadcast_frame(encode_event(GamePhase.POT, PotArgs(pot=15)))
+        manager.broadcast_frame(encode_event(GamePhase.POCKET_CARDS, PocketCardsArgs(pocket_cards=[])))
+        manager.broadcast_frame(encode_frame({"LOG": "hello"}))
+        await asyncio.sleep(0.02)
+        assert received == []
+        await asyncio.sleep(0.06)
+        assert received == [{"POT": {"pot": 15}}, {"LOG": "hello"}]
+        watcher.cancel()
+        feed.close()
+    asyncio.run(scenario())
+
+def test_late_spectator_starts_from_the_latest_hand():
+    async def scenario():
+        feed = SpectatorFeed(delay=0, interval=0.01)
+        player = Player(1, "p1", 100)
+        feed.publish(encode_frame({"LOG": "previous hand"}))
+        feed.publish(encode_event(GamePhase.PRE_START, PreStartArgs(prev_dealer=player, curr_dealer=player,
+                                                                    ordered_player_ids=[1])))
+        feed.publish(encode_event(GamePhase.POT, PotArgs(pot=15)))
+        await asyncio.sleep(0.01)
+
+        received = []
+        watcher = asyncio.create_task(collect(feed, received))
+        await asyncio.sleep(0.01)
+        assert [list(frame) for frame in received] == [["PRE_START"], ["POT"]]
+        assert feed.spectators == 1
+        watcher.cancel()
+        await asyncio.sleep(0)
+        assert feed.spectators == 0
+    asyncio.run(scenario())
+
+def test_thousands_of_spectators_do_not_slow_down_publishing():
+    async def count(feed: SpectatorFeed, counts: list, i: int):
+        async for frames in feed.follow():
+            counts[i] += len(frames)
+
+    async def scenario():
+        feed = SpectatorFeed(delay=0.01, interval=0.01)
+        counts = [0] * 2000
+        watchers = [asyncio.create_task(count(feed, counts, i)) for i in range(len(counts))]
+        await asyncio.sleep(0)
+
+        frame = encode_event(GamePhase.POT, PotArgs(pot=15))
+        gc.collect() # a full collection in the timed loop would be counted as publishing
+        started = time.perf_counter()
+        for _ in range(500):
+            feed.publish(frame)
+        per_frame = (time.perf_counter() - started) / 500
+        await asyncio.sleep(0.1)
+        assert counts == [500] * len(counts)
+        assert per_frame < 50e-6 # an append, not a send per spectator
+        for watcher in watchers:
+            watcher.cancel()
+    asyncio.run(scenario())
+
+def test_overflowing_buffer_drops_oldest_frames():
+    async def scenario():
+        feed = SpectatorFeed(delay=0.01, capacity=4, interval=0.01)
+        for i in range(10):
+            feed.publish(encode_frame({"LOG": i}))
+        received = []
+        watcher = asyncio.create_task(collect(feed, received))
+        await asyncio.sleep(0.05)
+        assert received == [{"LOG": i} for i in range(6, 10)]
+        assert feed.dropped_frames == 6
+        watcher.cancel()
+    asyncio.run(scenario())
+
+class SpectatorWebSocket(FakeWebSocket):
+    async def receive_text(self):
+        await asyncio.Event().wait()
+
+def test_spectator_gets_no_live_seats_before_the_delay():
+    async def scenario():
+        session = TableSession("t", "table", spectator_delay=0.05)
+        player = Player(1, "p1", 1000)
+        session.table.add_player(player)
+        session.connection_manager.broadcast_event(GamePhase.NEW_PLAYER, NewPlayerArgs(player=player))
+        session.connection_manager.broadcast_event(GamePhase.PRE_START, PreStartArgs(
+            prev_dealer=player, curr_dealer=player, ordered_player_ids=[1]))
+        await asyncio.sleep(0.07)
+        # live stacks and bets change after the released hand start
+        player.balance, player.bet = 900, 100
+        session.connection_manager.broadcast_event(GamePhase.TURN_RESULT, TurnResultArgs(
+            player=player, action=PlayerAction.RAISE, amount=100))
+
+        spectator = SpectatorWebSocket()
+        watcher = asyncio.create_task(watch_table(session, spectator))
+        await asyncio.sleep(0.02)
+        received = [m for frame in spectator.sent for m in (frame if isinstance(frame, list) else [frame])]
+        assert [next(iter(m)) for m in received] == ["NEW_PLAYER", "PRE_START"]
+        assert received[0]["NEW_PLAYER"]["player"]["balance"] == 1000
+        await asyncio.sleep(0.06)
+        assert spectator.sent[-1]["TURN_RESULT"]["player"]["balance"] == 900
+        watcher.cancel()
+        session.close()
+    asyncio.run(scenario())
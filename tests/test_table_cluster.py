@@ -0,0 +1,163 @@
+import asyncio
+import json
+import pytest
+from starlette.websockets import WebSocketDisconnect
+from app.game.table_cluster import *
+
+class FakeClientWebSocket:
+    def __init__(self):
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame: str):
+        self.sent.append(json.loads(frame))
+
+    async def receive_json(self):
+        data = await self.incoming.get()
+        if data is None:
+            raise WebSocketDisconnect()
+        if isinstance(data, Exception):
+            raise data
+        return data
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+def test_router_is_stable_and_creates_local_ids():
+    router = TableRouter(1, 3)
+    assert router.owner_of("main") == TableRouter(0, 3).owner_of("main")
+    assert all(router.is_local(router.new_table_id()) for _ in range(20))
+    with pytest.raises(ValueError):
+        TableRouter(3, 3)
+
+def test_websocket_is_forwarded_to_owner():
+    async def scenario():
+        received = []
+
+        async def play_at_table(table_id, websocket, client_id):
+            await websocket.accept()
+            await websocket.send_text(json.dumps({"LOG": f"joined {table_id}"}))
+            try:
+                while True:
+                    received.append(await websocket.receive_json())
+            except WebSocketDisconnect:
+                received.append("left")
+
+        async def request_handler(message):
+            return {"owner": True}
+
+        hub = LocalMessageHub()
+        workers = [TableCluster(TableRouter(i, 2), LocalMessageBus(i, hub), play_at_table, request_handler)
+                   for i in range(2)]
+        for worker in workers:
+            await worker.start()
+
+        table_id = workers[1].router.new_table_id()
+        client = FakeClientWebSocket()
+        gateway_task = asyncio.create_task(workers[0].forward_websocket(client, table_id, 7))
+        client.incoming.put_nowait({"TURN_RESPONSE": {"action": "CHECK", "amount": 0}})
+        await asyncio.sleep(0.01)
+        assert client.sent == [{"LOG": f"joined {table_id}"}]
+        client.incoming.put_nowait(None)
+        await asyncio.wait_for(gateway_task, timeout=1)
+        await asyncio.sleep(0.01)
+
+        assert received == [{"TURN_RESPONSE": {"action": "CHECK", "amount": 0}}, "left"]
+        assert await workers[0].request(table_id, {"type": "get_table"}) == {"owner": True}
+        assert await workers[0].request_all({"type": "list_tables"}) == [{"owner": True}]
+        for worker in workers:
+            await worker.stop()
+    asyncio.run(scenario())
+
+def test_owner_frees_the_seat_when_forwarding_fails():
+    async def scenario():
+        received = []
+
+        async def play_at_table(table_id, websocket, client_id):
+            await websocket.accept()
+            try:
+                while True:
+                    received.append(await websocket.receive_json())
+            except WebSocketDisconnect:
+                received.append("left")
+
+        hub = LocalMessageHub()
+        workers = [TableCluster(TableRouter(i, 2), LocalMessageBus(i, hub), play_at_table, None) for i in range(2)]
+        for worker in workers:
+            await worker.start()
+        client = FakeClientWebSocket()
+        gateway_task = asyncio.create_task(workers[0].forward_websocket(client, workers[1].router.new_table_id(), 7))
+        client.incoming.put_nowait(ValueError("not JSON"))
+        with pytest.raises(ValueError):
+            await asyncio.wait_for(gateway_task, timeout=1)
+        await asyncio.sleep(0.01)
+        assert received == ["left"]
+        for worker in workers:
+            await worker.stop()
+    asyncio.run(scenario())
+
+def test_reconnect_before_the_old_socket_closes():
+    async def scenario():
+        sessions = []
+
+        async def play_at_table(table_id, websocket, client_id):
+            await websocket.accept()
+            session = {"state": "open"}
+            sessions.append(session)
+            try:
+                while True:
+                    await websocket.send_text(json.dumps({"LOG": (await websocket.receive_json())["LOG"]}))
+            except WebSocketDisconnect:
+                session["state"] = "left"
+
+        hub = LocalMessageHub()
+        workers = [TableCluster(TableRouter(i, 2), LocalMessageBus(i, hub), play_at_table, None) for i in range(2)]
+        for worker in workers:
+            await worker.start()
+        table_id = workers[1].router.new_table_id()
+        old_client, new_client = FakeClientWebSocket(), FakeClientWebSocket()
+        old_task = asyncio.create_task(workers[0].forward_websocket(old_client, table_id, 7))
+        await asyncio.sleep(0.01)
+        new_task = asyncio.create_task(workers[0].forward_websocket(new_client, table_id, 7))
+        await asyncio.sleep(0.01)
+        old_client.incoming.put_nowait(None)
+        await asyncio.wait_for(old_task, timeout=1)
+        await asyncio.sleep(0.01)
+        assert [s["state"] for s in sessions] == ["left", "open"]
+
+        new_client.incoming.put_nowait({"LOG": "still here"})
+        await asyncio.sleep(0.01)
+        assert new_client.sent == [{"LOG": "still here"}] and old_client.sent == []
+        new_client.incoming.put_nowait(None)
+        await asyncio.wait_for(new_task, timeout=1)
+        for worker in workers:
+            await worker.stop()
+    asyncio.run(scenario())
+
+def test_unix_socket_bus_request(tmp_path):
+    async def scenario():
+        buses = [UnixSocketMessageBus(i, str(tmp_path)) for i in range(2)]
+
+        async def echo(message):
+            return {"echo": message["value"]}
+
+        for bus in buses:
+            bus.set_handler(echo)
+            await bus.start()
+        assert await buses[0].request(1, {"type": "echo", "value": "♠️" * 1000}) == {"echo": "♠️" * 1000}
+        for bus in buses:
+            await bus.stop()
+    asyncio.run(scenario())
+
+def test_claim_worker_index(tmp_path):
+    index_1, lock_1 = claim_worker_index(str(tmp_path), 2)
+    index_2, lock_2 = claim_worker_index(str(tmp_path), 2)
+    assert {index_1, index_2} == {0, 1}
+    with pytest.raises(RuntimeError):
+        claim_worker_index(str(tmp_path), 2)
+    lock_1.close()
+    lock_2.close()
@@ -0,0 +1,23 @@
+import pytest
+from app.game.table_registry import TableRegistry
+
+def test_tables_are_isolated():
+    registry = TableRegistry()
+    first = registry.create_table("first")
+    second = registry.create_table("second", sb_amount=10, bb_amount=20)
+    assert first.id != second.id
+    assert first.table is not second.table
+    assert first.connection_manager is not second.connection_manager
+    assert second.get_game().bb_amount == 20
+    assert [t.id for t in registry.list_tables()] == [first.id, second.id]
+
+    registry.remove_table(first.id)
+    assert registry.get_table(first.id) is None
+
+def test_invalid_tables_are_rejected():
+    registry = TableRegistry(max_tables=1)
+    with pytest.raises(ValueError):
+        registry.create_table("blinds", sb_amount=10, bb_amount=10)
+    registry.create_table("only", table_id="only")
+    with pytest.raises(ValueError):
+        registry.create_table("one too many")
@@ -0,0 +1,57 @@
+import asyncio
+import json
+from app.game.connection_manager import ConnectionManager
+from app.game.game_schema import *
+from app.game.game_serializer import encode_event, encode_frame
+from app.game.models import Player
+from app.game.table_state import TableStateTracker, apply_patch, diff_state
+from tests.test_connection_manager import FakeWebSocket
+
+def test_patch_holds_only_changed_fields():
+    old = {"pot": 15, "players": {"1": {"balance": 990, "bet": 10}, "2": {"balance": 995, "bet": 5}},
+           "curr_player_id": 1}
+    new = {"pot": 30, "players": {"1": {"balance": 990, "bet": 10}, "2": {"balance": 980, "bet": 20}}}
+    patch = diff_state(old, new)
+    assert patch == {"pot": 30, "players": {"2": {"balance": 980, "bet": 20}}, "curr_player_id": None}
+    assert apply_patch(old, patch) == new
+    assert diff_state(new, new) == {}
+
+def test_client_catches_up_from_kept_patches_or_gets_the_full_state():
+    state = {"pot": 0}
+    tracker = TableStateTracker(lambda: dict(state), history=2)
+    frames = []
+    for pot in (10, 20, 30):
+        state["pot"] = pot
+        frames.append(tracker.update())
+    assert tracker.update() is None
+    assert tracker.version == 3
+
+    assert tracker.sync(1) == frames[1:]
+    assert tracker.sync(3) == []
+    full = json.loads(tracker.sync(0)[0])
+    assert full == {"STATE_FULL": {"version": 3, "state": {"pot": 30}}}
+    assert json.loads(tracker.sync(None)[0]) == full
+
+def test_subscribers_get_one_delta_per_step_instead_of_state_events():
+    async def scenario():
+        player = Player(1, "p1", 1000)
+        state = {"pot": 0}
+        manager = ConnectionManager(state_tracker=TableStateTracker(lambda: dict(state)))
+        events_client, delta_client = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(events_client, 1)
+        await manager.connect(delta_client, 2)
+        manager.subscribe_deltas(2)
+
+        state["pot"] = 15
+        manager.broadcast_frame(encode_event(GamePhase.POT, PotArgs(pot=15)))
+        manager.broadcast_frame(encode_event(GamePhase.TURN_HIGHLIGHT, TurnHighlightArgs(prev_player=player)))
+        manager.broadcast_frame(encode_frame({"LOG": "raised"}))
+        await asyncio.sleep(0.01)
+
+        assert [next(iter(m)) for m in events_client.sent] == ["POT", "TURN_HIGHLIGHT", "LOG"]
+        assert delta_client.sent == [{"STATE_FULL": {"version": 1, "state": {"pot": 0}}}, {"LOG": "raised"},
+                                     {"STATE_DELTA": {"version": 2, "patch": {"pot": 15}}}]
+        manager.disconnect(1)
+        manager.disconnect(2)
+        assert not manager.delta_ids
+    asyncio.run(scenario())
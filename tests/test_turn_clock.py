@@ -0,0 +1,66 @@
+import asyncio
+import json
+from app.game.connection_manager import ConnectionManager
+from app.game.game_schema import TurnRequestArgs, PlayerAction, TurnResponse
+from app.game.turn_clock import *
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, frame: str):
+        self.sent.append(json.loads(frame))
+
+def test_clock_fires_in_deadline_order_and_skips_cancelled():
+    async def scenario():
+        clock = TurnClock()
+        fired = []
+        clock.schedule(0.03, lambda: fired.append("late"))
+        cancelled = clock.schedule(0.01, lambda: fired.append("cancelled"))
+        clock.schedule(0.02, lambda: fired.append("early"))
+        cancelled.cancel()
+        await asyncio.sleep(0.05)
+        assert fired == ["early", "late"]
+        assert len(clock) == 0
+    asyncio.run(scenario())
+
+def test_expired_turn_checks_or_folds_and_spends_time_bank():
+    async def scenario():
+        turn_clock = TableTurnClock(action_timeout=0.02, time_bank=0.02, clock=TurnClock())
+        manager = ConnectionManager(turn_clock=turn_clock)
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, 1)
+
+        check_args = TurnRequestArgs(player_bet=0, prev_bet=0, prev_raise=5,
+                                     options=[PlayerAction.CHECK, PlayerAction.FOLD, PlayerAction.RAISE])
+        response = await asyncio.wait_for(manager.request_turn(1, check_args), timeout=1)
+        assert response.action == PlayerAction.CHECK
+        assert turn_clock.time_bank_of(1) == 0
+
+        await asyncio.sleep(0)
+        assert websocket.sent[0]["TURN_REQUEST"]["time_to_act"] == 0.02
+        assert websocket.sent[0]["TURN_REQUEST"]["time_bank"] == 0.02
+
+        call_args = TurnRequestArgs(player_bet=0, prev_bet=10, prev_raise=5,
+                                    options=[PlayerAction.CALL, PlayerAction.FOLD, PlayerAction.RAISE])
+        response = await asyncio.wait_for(manager.request_turn(1, call_args), timeout=1)
+        assert response.action == PlayerAction.FOLD
+        manager.disconnect(1)
+    asyncio.run(scenario())
+
+def test_answered_turn_keeps_time_bank():
+    async def scenario():
+        turn_clock = TableTurnClock(action_timeout=1, time_bank=5, clock=TurnClock())
+        manager = ConnectionManager(turn_clock=turn_clock)
+        await manager.connect(FakeWebSocket(), 1)
+        args = TurnRequestArgs(player_bet=0, prev_bet=10, prev_raise=5, options=[PlayerAction.CALL])
+        turn = asyncio.create_task(manager.request_turn(1, args))
+        await asyncio.sleep(0.01)
+        manager.process_turn_response(1, TurnResponse(action=PlayerAction.CALL, amount=10))
+        assert (await turn).action == PlayerAction.CALL
+        assert turn_clock.time_bank_of(1) == 5
+        manager.disconnect(1)
+    asyncio.run(scenario())